@@ -1,29 +1,41 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, make_response
-import os
-import google.generativeai as genai
+from flask import Flask, render_template, request, jsonify, make_response, url_for
+import sys
 from dotenv import load_dotenv
 import markdown
-import pdfkit
+from cache import cache_from_env, content_key, normalize_text
+from chunking import CHUNK_TOKENS, estimate_tokens, map_concurrently, merge_reports, split_schedule
+from jobs import queue_from_env
+from llm_clients import registry
+from llm_pool import LLMTimeout, PoolFull, get_pool
+from llm_router import get_router
+from pdf_render import get_renderer
+from serving import run_app
+from streaming import stream_markdown
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 
-# Configure Gemini API
+# Bump whenever the prompt below changes so cached reports are not reused; they are also
+# keyed by the router's backends (LLM_BACKENDS), so changing models does not reuse them either
+PROMPT_VERSION = 'analyze-v1'
+
+# Reports for inputs seen before; RESPONSE_CACHE_PATH shares them between workers
+response_cache = cache_from_env("RESPONSE_CACHE", maxsize=512, ttl=24 * 60 * 60)
+
+# Configure Gemini API (only redone when GEMINI_API_KEY changes); any other routed backend also counts
 def configure_genai():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return False
-    genai.configure(api_key=api_key)
-    return True
+    return registry.configure_gemini() or bool(get_router().ranked())
 
-# Initialize the  model
-def get_gemini_response(text_prompt):
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
-    
-    prompt = f"""
+def ask_model(prompt):
+    # The fastest healthy backend answers; see llm_router
+    return get_router().generate([{'role': 'user', 'content': prompt}])
+
+# Report prompt for the pasted schedule
+def build_prompt(text_prompt):
+    return f"""
     Analyze the following schedule data and generate a schedule evaluation report in this exact format:
 
     SCHEDULE EVALUATION REPORT 
@@ -53,14 +65,52 @@ def get_gemini_response(text_prompt):
     Schedule data to analyze:
     {text_prompt}
     """
+
+def analyze_in_parts(text_prompt):
+    # Inputs over the token budget are analyzed part by part, concurrently, and merged into one report
+    parts = split_schedule(text_prompt)
+    reports = map_concurrently(
+        lambda part: ask_model(build_prompt(f"Part of the schedule ({part[0]}):\n{part[1]}")), parts)
+    return merge_reports(zip([label for label, _ in parts], reports))
+
+# Initialize the  model
+def get_gemini_response(text_prompt):
+    cache_key = content_key(normalize_text(text_prompt), PROMPT_VERSION, get_router().spec)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    response = model.generate_content(prompt)
-    return response.text
+    if estimate_tokens(text_prompt) > CHUNK_TOKENS:
+        analysis = analyze_in_parts(text_prompt)
+    else:
+        analysis = ask_model(build_prompt(text_prompt))
+    response_cache.set(cache_key, analysis)
+    return analysis
+
+def stream_gemini_response(text_prompt):
+    """Yield the report text chunk by chunk as the model generates it"""
+    cache_key = content_key(normalize_text(text_prompt), PROMPT_VERSION, get_router().spec)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    
+    if estimate_tokens(text_prompt) > CHUNK_TOKENS:
+        # The merged report only exists once every part is done
+        analysis = analyze_in_parts(text_prompt)
+        yield analysis
+    else:
+        analysis = ''
+        for chunk in get_router().stream([{'role': 'user', 'content': build_prompt(text_prompt)}]):
+            analysis += chunk
+            yield chunk
+    response_cache.set(cache_key, analysis)
 
 @app.route('/')
 def index():
     api_configured = configure_genai()
-    return render_template('index.html', api_configured=api_configured)
+    return render_template('index.html', api_configured=api_configured,
+                           submit_url='/analyze', stream_url='/analyze/stream', field_name='text')
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -72,12 +122,82 @@ def analyze():
         return jsonify({'error': 'No text provided'}), 400
     
     try:
-        analysis = get_gemini_response(text)
+        analysis = get_pool().call(get_gemini_response, text)
         html_content = markdown.markdown(analysis)
         return jsonify({'analysis': analysis, 'html_content': html_content})
+    except PoolFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except LLMTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    if not configure_genai():
+        return jsonify({'error': 'Gemini API key not configured'}), 400
+    
+    text = request.form.get('text', '')
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    
+    try:
+        chunks = get_pool().iterate(stream_gemini_response, text)
+    except PoolFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    return stream_markdown(chunks, 'analysis')
+
+@app.route('/cache-stats')
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/pool-stats')
+def pool_stats():
+    return jsonify(get_pool().stats())
+
+@app.route('/pdf-stats')
+def pdf_stats():
+    return jsonify(get_renderer().stats())
+
+@app.route('/provider-stats')
+def provider_stats():
+    return jsonify(registry.stats())
+
+@app.route('/router-stats')
+def router_stats():
+    return jsonify(get_router().stats())
+
+# Create a styled HTML document for PDF conversion
+def styled_report(html_content):
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Text Analysis Report</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 20px; }}
+            h1 {{ color: #2c3e50; }}
+            h2 {{ color: #3498db; margin-top: 20px; }}
+            h3 {{ color: #2980b9; }}
+            p {{ line-height: 1.6; }}
+            ul, ol {{ margin-left: 20px; }}
+            .container {{ max-width: 800px; margin: 0 auto; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h1>Text Analysis Report</h1>
+            {html_content}
+        </div>
+    </body>
+    </html>
+    """
+
+def render_pdf(html_content):
+    """PDF bytes of the styled report, served from the PDF cache when rendered before"""
+    return get_renderer().render(styled_report(html_content))
+
 @app.route('/download-pdf', methods=['POST'])
 def download_pdf():
     try:
@@ -85,34 +205,8 @@ def download_pdf():
         if not html_content:
             return jsonify({'error': 'No content provided'}), 400
         
-        # Create a styled HTML document for PDF conversion
-        styled_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Text Analysis Report</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                h1 {{ color: #2c3e50; }}
-                h2 {{ color: #3498db; margin-top: 20px; }}
-                h3 {{ color: #2980b9; }}
-                p {{ line-height: 1.6; }}
-                ul, ol {{ margin-left: 20px; }}
-                .container {{ max-width: 800px; margin: 0 auto; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Text Analysis Report</h1>
-                {html_content}
-            </div>
-        </body>
-        </html>
-        """
-        
         # Convert HTML to PDF
-        pdf = pdfkit.from_string(styled_html, False)
+        pdf = render_pdf(html_content)
         
         # Create response with PDF
         response = make_response(pdf)
@@ -123,5 +217,66 @@ def download_pdf():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Background jobs: the model call or PDF render runs on a worker, the request returns at once
+def _analyze_job(payload):
+    analysis = get_pool().call(get_gemini_response, payload['text'])
+    return {'analysis': analysis, 'html_content': markdown.markdown(analysis)}
+
+def _pdf_job(payload):
+    return render_pdf(payload['html_content'])
+
+JOB_FIELDS = {'analyze': 'text', 'pdf': 'html_content'}
+job_queue = queue_from_env("ANALYZE_JOBS", {'analyze': _analyze_job, 'pdf': _pdf_job})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json(silent=True) or request.form.to_dict()
+    kind = data.pop('kind', None)
+    callback_url = data.pop('callback_url', None)
+    if kind not in JOB_FIELDS:
+        return jsonify({'error': f"kind must be one of {sorted(JOB_FIELDS)}"}), 400
+    if not data.get(JOB_FIELDS[kind]):
+        return jsonify({'error': f"No {JOB_FIELDS[kind]} provided"}), 400
+    if kind == 'analyze' and not configure_genai():
+        return jsonify({'error': 'Gemini API key not configured'}), 400
+    
+    try:
+        job_id = job_queue.submit(kind, data, callback_url)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] == 'done':
+        job['result_url'] = url_for('job_result', job_id=job_id)
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_queue.get(job_id, with_output=True)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    if job['output'] is None:
+        return jsonify(job['result'])
+    
+    response = make_response(bytes(job['output']))
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename=report_{job_id}.pdf'
+    return response
+
+@app.route('/job-stats')
+def job_stats():
+    return jsonify(job_queue.stats())
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # `python app.py worker` only processes jobs, for running workers separately
+    if sys.argv[1:] == ['worker']:
+        job_queue.work()
+    else:
+        run_app(app, on_start=job_queue.start)
\ No newline at end of file
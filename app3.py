@@ -1,35 +1,64 @@
-from flask import Flask, render_template, request, jsonify, make_response
+from flask import Flask, Response, render_template, request, jsonify, make_response, stream_with_context, url_for
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 import markdown
-import pdfkit
+import html
+import json
+import sys
+import tempfile
+import time
 import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime
+from cache import cache_from_env, content_key, normalize_text
+from chunking import CHUNK_TOKENS, estimate_tokens, map_concurrently, merge_reports, split_schedule
+from jobs import queue_from_env
+from llm_clients import registry
+from llm_pool import LLMTimeout, PoolFull, RateLimiter, get_pool
+from llm_router import get_router
+from pdf_render import export_filename, file_stream, get_renderer, merge_pdfs, render_all, zip_stream
+from schedule_parser import check_schedule
+from serving import run_app
+from streaming import stream_markdown
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 
-# Configure Gemini API
+# Bump whenever the prompt below changes so cached evaluations are not reused; they are also
+# keyed by the router's backends (LLM_BACKENDS), so changing models does not reuse them either
+PROMPT_VERSION = 'evaluate-v2'
+
+# Evaluations for schedules seen before; RESPONSE_CACHE_PATH shares them between workers
+response_cache = cache_from_env("RESPONSE_CACHE", maxsize=512, ttl=24 * 60 * 60)
+
+# Batch evaluation: items in flight per batch, calls per second across batches, items per request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 5000))
+batch_limiter = RateLimiter(float(os.getenv("BATCH_RATE_LIMIT", 5)))
+
+# Finished batch items, so an interrupted batch can be resumed; BATCH_STORE_PATH makes them durable
+batch_store = cache_from_env("BATCH_STORE", maxsize=100000, ttl=7 * 24 * 60 * 60)
+
+# Every evaluation by report ID, for exporting reports later; REPORT_STORE_PATH makes them durable
+report_store = cache_from_env("REPORT_STORE", maxsize=10000, ttl=30 * 24 * 60 * 60)
+EXPORT_MAX_REPORTS = int(os.getenv("EXPORT_MAX_REPORTS", 1000))
+# A merged PDF is assembled in memory before it is written out (see merge_pdfs), so it gets a lower cap
+EXPORT_MAX_MERGED_REPORTS = int(os.getenv("EXPORT_MAX_MERGED_REPORTS", 100))
+
+# Configure Gemini API (only redone when GEMINI_API_KEY changes); any other routed backend also counts
 def configure_genai():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return False
-    genai.configure(api_key=api_key)
-    return True
+    return registry.configure_gemini() or bool(get_router().ranked())
 
-# Initialize the Gemini model
-def get_schedule_evaluation(schedule_data):
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
-    
-    # Generate a unique ID for the report
-    report_id = str(uuid.uuid4())
-    # Get current date and time
-    current_datetime = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    
-    prompt = f"""
+def ask_model(prompt):
+    # The fastest healthy backend answers; see llm_router
+    return get_router().generate([{'role': 'user', 'content': prompt}])
+
+# Evaluation prompt for the schedule, stamped with the report's ID and time
+def build_prompt(schedule_data, report_id, current_datetime):
+    return f"""
     Analyze the following schedule data and generate a schedule evaluation report in this exact format:
 
     SCHEDULE EVALUATION REPORT 
@@ -59,14 +88,111 @@ def get_schedule_evaluation(schedule_data):
     Schedule data to analyze:
     {schedule_data}
     """
+
+def _new_report():
+    # Generate a unique ID for the report and get the current date and time
+    return str(uuid.uuid4()), datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+def _restamp(text, old_report, new_report):
+    # Swap one report's ID and time for another's
+    return text.replace(old_report[0], new_report[0]).replace(old_report[1], new_report[1])
+
+def _cached_evaluation(cache_key, report_id, current_datetime):
+    # A cached evaluation only needs this report's ID and time swapped in
+    cached = response_cache.get(cache_key)
+    if cached is None:
+        return None
+    return _restamp(cached['text'], (cached['report_id'], cached['generated_at']), (report_id, current_datetime))
+
+def _cache_evaluation(cache_key, text, report_id, current_datetime):
+    response_cache.set(cache_key, {
+        'text': text,
+        'report_id': report_id,
+        'generated_at': current_datetime,
+    })
+
+def _remember_report(report_id, current_datetime, text):
+    report_store.set(report_id, {'evaluation': text, 'generated_at': current_datetime})
+
+def _prepare(schedule_data, report_id, current_datetime):
+    # (finished report, None) when the rule checks decide the status on their own, otherwise
+    # (None, [(label, what to send the model)]): a compact summary, the raw text if it did not
+    # parse (after the summary if some columns were not recognized), or one part per chunk
+    # when the schedule is too big for a single prompt
+    checked = check_schedule(schedule_data)
+    if checked is not None and checked.decided:
+        return checked.report(report_id, current_datetime), None
+    if estimate_tokens(schedule_data) > CHUNK_TOKENS:
+        context = checked.summary(sessions=False) + '\n\n' if checked is not None else ''
+        return None, [(label, f"{context}Part of the schedule ({label}):\n{chunk}")
+                      for label, chunk in split_schedule(schedule_data)]
+    if checked is None:
+        return None, [('all', schedule_data)]
+    if checked.unmapped:
+        return None, [('all', f"{checked.summary(sessions=False)}\n\nSchedule:\n{schedule_data}")]
+    return None, [('all', checked.summary())]
+
+def _evaluate_parts(parts, report_id, current_datetime):
+    # Evaluate the parts of a large schedule concurrently and merge them into one report
+    reports = map_concurrently(lambda part: ask_model(build_prompt(part[1], report_id, current_datetime)), parts)
+    return merge_reports(zip([label for label, _ in parts], reports), report_id, current_datetime)
+
+# Initialize the Gemini model
+def get_schedule_evaluation(schedule_data, report=None):
+    report_id, current_datetime = report or _new_report()
+    decided, parts = _prepare(schedule_data, report_id, current_datetime)
+    if decided is not None:
+        _remember_report(report_id, current_datetime, decided)
+        return decided
+    
+    cache_key = content_key(normalize_text(schedule_data), PROMPT_VERSION, get_router().spec)
+    cached = _cached_evaluation(cache_key, report_id, current_datetime)
+    if cached is not None:
+        _remember_report(report_id, current_datetime, cached)
+        return cached
+    
+    if len(parts) > 1:
+        evaluation = _evaluate_parts(parts, report_id, current_datetime)
+    else:
+        evaluation = ask_model(build_prompt(parts[0][1], report_id, current_datetime))
+    _cache_evaluation(cache_key, evaluation, report_id, current_datetime)
+    _remember_report(report_id, current_datetime, evaluation)
+    return evaluation
+
+def stream_schedule_evaluation(schedule_data):
+    """Yield the evaluation text chunk by chunk as the model generates it"""
+    report_id, current_datetime = _new_report()
+    decided, parts = _prepare(schedule_data, report_id, current_datetime)
+    if decided is not None:
+        _remember_report(report_id, current_datetime, decided)
+        yield decided
+        return
     
-    response = model.generate_content(prompt)
-    return response.text
+    cache_key = content_key(normalize_text(schedule_data), PROMPT_VERSION, get_router().spec)
+    cached = _cached_evaluation(cache_key, report_id, current_datetime)
+    if cached is not None:
+        _remember_report(report_id, current_datetime, cached)
+        yield cached
+        return
+    
+    if len(parts) > 1:
+        # The merged report only exists once every part is done
+        evaluation = _evaluate_parts(parts, report_id, current_datetime)
+        yield evaluation
+    else:
+        evaluation = ''
+        prompt = build_prompt(parts[0][1], report_id, current_datetime)
+        for chunk in get_router().stream([{'role': 'user', 'content': prompt}]):
+            evaluation += chunk
+            yield chunk
+    _cache_evaluation(cache_key, evaluation, report_id, current_datetime)
+    _remember_report(report_id, current_datetime, evaluation)
 
 @app.route('/')
 def index():
     api_configured = configure_genai()
-    return render_template('index.html', api_configured=api_configured)
+    return render_template('index.html', api_configured=api_configured,
+                           submit_url='/evaluate', stream_url='/evaluate/stream', field_name='schedule_data')
 
 @app.route('/evaluate', methods=['POST'])
 def evaluate():
@@ -78,12 +204,238 @@ def evaluate():
         return jsonify({'error': 'No schedule data provided'}), 400
     
     try:
-        evaluation = get_schedule_evaluation(schedule_data)
+        evaluation = get_pool().call(get_schedule_evaluation, schedule_data)
         html_content = markdown.markdown(evaluation)
         return jsonify({'evaluation': evaluation, 'html_content': html_content})
+    except PoolFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except LLMTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/evaluate/stream', methods=['POST'])
+def evaluate_stream():
+    if not configure_genai():
+        return jsonify({'error': 'Gemini API key not configured'}), 400
+    
+    schedule_data = request.form.get('schedule_data', '')
+    if not schedule_data:
+        return jsonify({'error': 'No schedule data provided'}), 400
+    
+    try:
+        chunks = get_pool().iterate(stream_schedule_evaluation, schedule_data)
+    except PoolFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    return stream_markdown(chunks, 'evaluation')
+
+def _batch_request(req):
+    # (items, batch_id) from a JSON array, {"items": [...], "batch_id": ...} or JSONL,
+    # sent as the body or as a `file` upload; items are (id, schedule_data) pairs
+    upload = req.files.get('file')
+    text = (upload.read().decode('utf-8') if upload is not None else req.get_data(as_text=True)).strip()
+    if not text:
+        raise ValueError('No schedules provided')
+    batch_id = req.args.get('batch_id') or req.form.get('batch_id')
+    try:
+        records = json.loads(text)
+    except ValueError:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(records, dict) and 'items' in records:
+        batch_id = batch_id or records.get('batch_id')
+        records = records['items']
+    elif not isinstance(records, list):
+        records = [records]
+
+    items = []
+    for index, record in enumerate(records):
+        if isinstance(record, str):
+            record = {'schedule_data': record}
+        schedule_data = record.get('schedule_data') if isinstance(record, dict) else None
+        if not isinstance(schedule_data, str) or not schedule_data.strip():
+            raise ValueError(f'Item {index} has no schedule_data')
+        items.append((record.get('id', index), schedule_data))
+    if not items:
+        raise ValueError('No schedules provided')
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f'At most {BATCH_MAX_ITEMS} schedules per batch')
+    return items, batch_id
+
+def run_batch(batch_id, items):
+    """Evaluate the batch items concurrently, yielding each result as soon as it is ready.
+
+    Identical schedules are sent to the model once and every copy gets its
+    own report ID. Items already finished under this batch_id are yielded
+    straight from the batch store, which is what makes a batch resumable.
+    """
+    groups = {}
+    for index, (_, schedule_data) in enumerate(items):
+        stored = batch_store.get(f'batch:{batch_id}:{index}')
+        if stored is not None:
+            yield {**stored, 'resumed': True}
+            continue
+        groups.setdefault(content_key(normalize_text(schedule_data)), []).append(index)
+
+    def results(indexes, text=None, report=None, error=None):
+        for index in indexes:
+            record = {'index': index, 'id': items[index][0]}
+            if error is not None:
+                record.update(status='error', error=error)
+            else:
+                own_report = report if index == indexes[0] else _new_report()
+                evaluation = _restamp(text, report, own_report)
+                if own_report is not report:
+                    _remember_report(*own_report, evaluation)
+                record.update(status='done', report_id=own_report[0], generated_at=own_report[1],
+                              evaluation=evaluation, html_content=markdown.markdown(evaluation))
+                batch_store.set(f'batch:{batch_id}:{index}', record)
+            yield record
+
+    pool = get_pool()
+    waiting = deque(groups.values())
+    pending = {}
+    try:
+        while waiting or pending:
+            while waiting and len(pending) < BATCH_CONCURRENCY:
+                indexes = waiting[0]
+                report = _new_report()
+                batch_limiter.acquire()
+                try:
+                    future = pool.submit(get_schedule_evaluation, items[indexes[0]][1], report)
+                except PoolFull:
+                    break
+                waiting.popleft()
+                pending[future] = (indexes, report, time.monotonic() + pool.timeout)
+            if not pending:
+                # Other requests are holding the whole pool; try again shortly
+                time.sleep(1)
+                continue
+
+            next_deadline = min(deadline for _, _, deadline in pending.values())
+            wait(pending, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future, (indexes, report, deadline) in list(pending.items()):
+                if future.done():
+                    del pending[future]
+                    error = future.exception()
+                    if error is not None:
+                        yield from results(indexes, error=str(error))
+                    else:
+                        yield from results(indexes, future.result(), report)
+                elif deadline <= now:
+                    del pending[future]
+                    future.cancel()
+                    yield from results(indexes, error=f'The model did not respond within {pool.timeout:g} seconds')
+    finally:
+        # The client went away: drop whatever has not started yet
+        for future in pending:
+            future.cancel()
+
+@app.route('/evaluate/batch', methods=['POST'])
+def evaluate_batch():
+    if not configure_genai():
+        return jsonify({'error': 'Gemini API key not configured'}), 400
+
+    try:
+        items, batch_id = _batch_request(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    fingerprint = content_key(*(normalize_text(schedule_data) for _, schedule_data in items))
+    if batch_id:
+        manifest = batch_store.get(f'batch:{batch_id}')
+        if manifest is None:
+            return jsonify({'error': f'Unknown batch {batch_id}'}), 404
+        if manifest['fingerprint'] != fingerprint:
+            return jsonify({'error': 'These schedules do not match the batch being resumed'}), 409
+    else:
+        batch_id = str(uuid.uuid4())
+        batch_store.set(f'batch:{batch_id}', {
+            'total': len(items),
+            'fingerprint': fingerprint,
+            'created': datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+        })
+
+    def generate():
+        # One JSON object per line: a header, each item as it finishes, then a summary
+        yield json.dumps({'batch_id': batch_id, 'total': len(items)}) + '\n'
+        counts = {'done': 0, 'error': 0}
+        for record in run_batch(batch_id, items):
+            counts[record['status']] += 1
+            yield json.dumps(record) + '\n'
+        yield json.dumps({'batch_id': batch_id, 'finished': True, 'completed': counts['done'], 'failed': counts['error']}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/evaluate/batch/<batch_id>')
+def batch_status(batch_id):
+    manifest = batch_store.get(f'batch:{batch_id}')
+    if manifest is None:
+        return jsonify({'error': f'Unknown batch {batch_id}'}), 404
+
+    results = [batch_store.get(f'batch:{batch_id}:{index}') for index in range(manifest['total'])]
+    return jsonify({
+        'batch_id': batch_id,
+        'total': manifest['total'],
+        'created': manifest['created'],
+        'completed': sum(result is not None for result in results),
+        'missing': [index for index, result in enumerate(results) if result is None],
+        'results': [result for result in results if result is not None],
+    })
+
+@app.route('/cache-stats')
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/pool-stats')
+def pool_stats():
+    return jsonify(get_pool().stats())
+
+@app.route('/pdf-stats')
+def pdf_stats():
+    return jsonify(get_renderer().stats())
+
+@app.route('/provider-stats')
+def provider_stats():
+    return jsonify(registry.stats())
+
+@app.route('/router-stats')
+def router_stats():
+    return jsonify(get_router().stats())
+
+# Create a styled HTML document for PDF conversion
+def styled_report(html_content):
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Schedule Evaluation Report</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 20px; }}
+            h1 {{ color: #2c3e50; }}
+            h2 {{ color: #3498db; margin-top: 20px; }}
+            h3 {{ color: #2980b9; }}
+            p {{ line-height: 1.6; }}
+            ul, ol {{ margin-left: 20px; }}
+            .container {{ max-width: 800px; margin: 0 auto; }}
+            .critical {{ color: #e74c3c; font-weight: bold; }}
+            .status-unacceptable {{ color: #e74c3c; font-weight: bold; }}
+            .status-acceptable {{ color: #27ae60; font-weight: bold; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            {html_content}
+        </div>
+    </body>
+    </html>
+    """
+
+def render_pdf(html_content):
+    """PDF bytes of the styled report, served from the PDF cache when rendered before"""
+    return get_renderer().render(styled_report(html_content))
+
 @app.route('/download-pdf', methods=['POST'])
 def download_pdf():
     try:
@@ -91,36 +443,8 @@ def download_pdf():
         if not html_content:
             return jsonify({'error': 'No content provided'}), 400
         
-        # Create a styled HTML document for PDF conversion
-        styled_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Schedule Evaluation Report</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                h1 {{ color: #2c3e50; }}
-                h2 {{ color: #3498db; margin-top: 20px; }}
-                h3 {{ color: #2980b9; }}
-                p {{ line-height: 1.6; }}
-                ul, ol {{ margin-left: 20px; }}
-                .container {{ max-width: 800px; margin: 0 auto; }}
-                .critical {{ color: #e74c3c; font-weight: bold; }}
-                .status-unacceptable {{ color: #e74c3c; font-weight: bold; }}
-                .status-acceptable {{ color: #27ae60; font-weight: bold; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                {html_content}
-            </div>
-        </body>
-        </html>
-        """
-        
         # Convert HTML to PDF
-        pdf = pdfkit.from_string(styled_html, False)
+        pdf = render_pdf(html_content)
         
         # Create response with PDF
         response = make_response(pdf)
@@ -131,6 +455,133 @@ def download_pdf():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _render_contents(entries):
+    # Contents page for a merged export: one line per report with its first page
+    rows = ''.join(f"<tr><td>{html.escape(title)}</td><td>{page}</td></tr>" for title, page in entries)
+    return render_pdf(f"<h1>Contents</h1><table style=\"width: 100%\">{rows}</table>")
+
+@app.route('/export-pdf', methods=['POST'])
+def export_pdf():
+    # JSON {"html_contents": [...], "report_ids": [...], "format": "zip" | "merged"},
+    # or the same as repeated html_content / report_id form fields
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {
+            'html_contents': request.form.getlist('html_content'),
+            'report_ids': request.form.getlist('report_id'),
+            'format': request.form.get('format', 'zip'),
+        }
+    export_format = data.get('format', 'zip')
+    if export_format not in ('zip', 'merged'):
+        return jsonify({'error': "format must be 'zip' or 'merged'"}), 400
+    
+    documents = [(f"Report {i + 1}", content) for i, content in enumerate(data.get('html_contents') or [])]
+    for report_id in data.get('report_ids') or []:
+        stored = report_store.get(report_id)
+        if stored is None:
+            return jsonify({'error': f'Unknown report {report_id}'}), 404
+        documents.append((f"Report {report_id} ({stored['generated_at']})", markdown.markdown(stored['evaluation'])))
+    if not documents:
+        return jsonify({'error': 'No content provided'}), 400
+    if len(documents) > EXPORT_MAX_REPORTS:
+        return jsonify({'error': f'At most {EXPORT_MAX_REPORTS} reports per export'}), 400
+    if export_format == 'merged' and len(documents) > EXPORT_MAX_MERGED_REPORTS:
+        return jsonify({'error': f'At most {EXPORT_MAX_MERGED_REPORTS} reports per merged export; '
+                                 'use format=zip for more'}), 400
+    
+    # Renders run while the response streams, so find out now if they cannot run at all
+    try:
+        renderer = get_renderer()
+        renderer.check()
+    except Exception as e:
+        return jsonify({'error': f'PDF rendering is unavailable: {e}'}), 503
+    
+    titles = [title for title, _ in documents]
+    pdfs = render_all(render_pdf, [content for _, content in documents], workers=renderer.max_concurrency)
+    
+    if export_format == 'zip':
+        named_pdfs = ((export_filename(i + 1, title), pdf) for i, (title, pdf) in enumerate(zip(titles, pdfs)))
+        response = Response(stream_with_context(zip_stream(named_pdfs)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = 'attachment; filename=schedule_evaluation_reports.zip'
+        return response
+    
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return jsonify({'error': 'Merged export needs the pypdf package; use format=zip'}), 501
+    
+    def merged():
+        # The merged file is written to disk and streamed from there
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            merge_pdfs(zip(titles, pdfs), path, render_contents=_render_contents)
+        except Exception:
+            os.remove(path)
+            raise
+        yield from file_stream(path)
+    
+    response = Response(stream_with_context(merged()), mimetype='application/pdf')
+    response.headers['Content-Disposition'] = 'attachment; filename=schedule_evaluation_reports.pdf'
+    return response
+
+# Background jobs: the model call or PDF render runs on a worker, the request returns at once
+def _evaluate_job(payload):
+    evaluation = get_pool().call(get_schedule_evaluation, payload['schedule_data'])
+    return {'evaluation': evaluation, 'html_content': markdown.markdown(evaluation)}
+
+def _pdf_job(payload):
+    return render_pdf(payload['html_content'])
+
+JOB_FIELDS = {'evaluate': 'schedule_data', 'pdf': 'html_content'}
+job_queue = queue_from_env("EVALUATE_JOBS", {'evaluate': _evaluate_job, 'pdf': _pdf_job})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json(silent=True) or request.form.to_dict()
+    kind = data.pop('kind', None)
+    callback_url = data.pop('callback_url', None)
+    if kind not in JOB_FIELDS:
+        return jsonify({'error': f"kind must be one of {sorted(JOB_FIELDS)}"}), 400
+    if not data.get(JOB_FIELDS[kind]):
+        return jsonify({'error': f"No {JOB_FIELDS[kind]} provided"}), 400
+    if kind == 'evaluate' and not configure_genai():
+        return jsonify({'error': 'Gemini API key not configured'}), 400
+    
+    try:
+        job_id = job_queue.submit(kind, data, callback_url)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] == 'done':
+        job['result_url'] = url_for('job_result', job_id=job_id)
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_queue.get(job_id, with_output=True)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    if job['output'] is None:
+        return jsonify(job['result'])
+    
+    response = make_response(bytes(job['output']))
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename=report_{job_id}.pdf'
+    return response
+
+@app.route('/job-stats')
+def job_stats():
+    return jsonify(job_queue.stats())
+
 # New route to take a simple input from the user
 @app.route('/simple-input', methods=['GET', 'POST'])
 def simple_input():
@@ -140,4 +591,8 @@ def simple_input():
     return render_template('simple_input.html')
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # `python app3.py worker` only processes jobs, for running workers separately
+    if sys.argv[1:] == ['worker']:
+        job_queue.work()
+    else:
+        run_app(app, on_start=job_queue.start)
\ No newline at end of file
@@ -0,0 +1,117 @@
+# Benchmarks for PDF export.
+#
+#   python bench_pdf.py -o pdf_results.json
+#   python bench_pdf.py --engine weasyprint --processes 4 --concurrency 16
+#
+# Renders synthetic evaluation reports from --concurrency client threads and
+# records throughput and p50/p95 latency for three modes:
+#   baseline  pdfkit.from_string per request, as /download-pdf used to
+#   renderer  pdf_render.PDFRenderer with an empty cache
+#   cached    the same renderer again, every report already cached
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import markdown
+
+from pdf_render import PDFRenderer
+
+def make_report(index, rng):
+    """Styled HTML of a synthetic schedule evaluation report"""
+    problems = '\n'.join(f"- Clash between Subject {rng.randint(1, 50)} and Subject {rng.randint(1, 50)}"
+                         for _ in range(rng.randint(3, 12)))
+    actions = '\n'.join(f"- Move Subject {rng.randint(1, 50)} to day {rng.randint(1, 5)}"
+                        for _ in range(rng.randint(2, 8)))
+    body = markdown.markdown(
+        f"# SCHEDULE EVALUATION REPORT\n\nGeneration: #{index}\n\n"
+        f"## IDENTIFIED PROBLEMS\n\n{problems}\n\n## RECOMMENDED ACTIONS\n\n{actions}\n"
+    )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><title>Schedule Evaluation Report</title>
+<style>body {{ font-family: Arial, sans-serif; margin: 20px; }} h1 {{ color: #2c3e50; }}</style>
+</head><body><div class="container">{body}</div></body></html>"""
+
+def measure(render, documents, concurrency):
+    """Throughput and latency percentiles for rendering every document once"""
+    latencies = []
+
+    def timed(html):
+        start = time.perf_counter()
+        render(html)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, documents))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'documents': len(documents),
+        'seconds': elapsed,
+        'throughput': len(documents) / elapsed,
+        'p50_seconds': statistics.median(latencies),
+        'p95_seconds': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+def run(documents, concurrency, engine, processes, max_concurrency):
+    results = {}
+    if engine == 'wkhtmltopdf':
+        import pdfkit
+        results['baseline'] = measure(lambda html: pdfkit.from_string(html, False), documents, concurrency)
+
+    cache_dir = tempfile.mkdtemp(prefix='bench_pdf_')
+    try:
+        renderer = PDFRenderer(engine=engine, max_concurrency=max_concurrency, cache_dir=cache_dir,
+                               processes=processes)
+        results['renderer'] = measure(renderer.render, documents, concurrency)
+        results['cached'] = measure(renderer.render, documents, concurrency)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    for mode, result in results.items():
+        print(f"{mode:<10} {result['throughput']:8.2f} docs/s  p50 {result['p50_seconds'] * 1000:9.1f} ms"
+              f"  p95 {result['p95_seconds'] * 1000:9.1f} ms", flush=True)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF export")
+    parser.add_argument('-o', '--output', help="write machine readable results to this JSON file")
+    parser.add_argument('--documents', type=int, default=50, help="distinct reports to render")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads rendering at once")
+    parser.add_argument('--engine', default='wkhtmltopdf', choices=['wkhtmltopdf', 'weasyprint'])
+    parser.add_argument('--processes', type=int, default=0, help="warm WeasyPrint worker processes")
+    parser.add_argument('--max-concurrency', type=int, default=4, help="renders the renderer runs at once")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    documents = [make_report(i, rng) for i in range(args.documents)]
+    results = run(documents, args.concurrency, args.engine, args.processes, args.max_concurrency)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'engine': args.engine,
+                    'documents': args.documents,
+                    'concurrency': args.concurrency,
+                    'processes': args.processes,
+                    'max_concurrency': args.max_concurrency,
+                },
+                'results': results,
+            }, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# Benchmarks for the spreader engine.
+#
+#   python bench_spreader.py -o results.json                  # full grid
+#   python bench_spreader.py --quick --baseline results.json  # check for regressions
+#
+# Every case records wall time (best of --repeat runs), peak traced memory
+# and the final score. With --baseline the run fails when a case got slower
+# than the baseline by more than --threshold, or its score got worse.
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import spreader_engine
+from spreader_engine import calculate_spread, create_timetable, optimize_timetable
+
+SUBJECT_COUNTS = [5, 50, 500, 5000]
+DAY_COUNTS = [3, 5, 7, 14]
+PRACTICAL_RATIOS = [0.0, 0.5, 1.0]
+
+QUICK_SUBJECT_COUNTS = [5, 500]
+QUICK_DAY_COUNTS = [5, 14]
+QUICK_PRACTICAL_RATIOS = [0.5]
+
+def make_subjects(num_subjects, practical_ratio, seed=0, max_lectures=5):
+    """Synthetic subject list with a given share of subjects that have a practical"""
+    rng = random.Random(seed)
+    num_practicals = round(num_subjects * practical_ratio)
+    with_practical = set(rng.sample(range(num_subjects), num_practicals))
+    return [
+        {
+            "name": f"Subject {i + 1}",
+            "lectures": rng.randint(1, max_lectures),
+            "has_practical": i in with_practical,
+        }
+        for i in range(num_subjects)
+    ]
+
+def _cases(subject_counts, day_counts, practical_ratios):
+    for num_subjects in subject_counts:
+        for num_days in day_counts:
+            for ratio in practical_ratios:
+                yield num_subjects, num_days, ratio
+
+def _functions(subjects, num_days, iterations):
+    # Each tracked function returns the timetable it produced (or scored)
+    timetable = create_timetable(subjects, num_days, rng=random.Random(0))
+
+    def spread():
+        calculate_spread(timetable, 'lecture')
+        calculate_spread(timetable, 'practical')
+        return timetable
+
+    return {
+        'create_timetable': lambda: create_timetable(subjects, num_days, rng=random.Random(0)),
+        'calculate_spread': spread,
+        'optimize_timetable': lambda: optimize_timetable(subjects, num_days, iterations=iterations, seed=0),
+        'optimize_timetable_local': lambda: optimize_timetable(
+            subjects, num_days, iterations=iterations, seed=0, solver='local'),
+    }
+
+def measure(func, repeat):
+    """Best wall time over `repeat` runs, peak traced memory of one run and the result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(timings), statistics.median(timings), peak, result
+
+def run(subject_counts, day_counts, practical_ratios, repeat=3, iterations=50000, only=None):
+    results = []
+    for num_subjects, num_days, ratio in _cases(subject_counts, day_counts, practical_ratios):
+        subjects = make_subjects(num_subjects, ratio)
+        for name, func in _functions(subjects, num_days, iterations).items():
+            if only and name not in only:
+                continue
+            best, median, peak, timetable = measure(func, repeat)
+            results.append({
+                'case': f"{name}/s{num_subjects}-d{num_days}-p{ratio}",
+                'function': name,
+                'subjects': num_subjects,
+                'days': num_days,
+                'practical_ratio': ratio,
+                'seconds': best,
+                'median_seconds': median,
+                'peak_bytes': peak,
+                'score': timetable.score(),
+            })
+            print(f"{results[-1]['case']:<45} {best * 1000:10.2f} ms {peak / 1024:10.1f} KiB  score {results[-1]['score']:.4f}",
+                  flush=True)
+    return results
+
+def compare(results, baseline, threshold, min_seconds):
+    """List of human readable regressions against a baseline result file"""
+    previous = {r['case']: r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result['case'])
+        if old is None:
+            continue
+        # Ignore timing noise on cases that finish faster than min_seconds either way
+        if max(result['seconds'], old['seconds']) >= min_seconds and result['seconds'] > old['seconds'] * (1 + threshold):
+            regressions.append(
+                f"{result['case']}: {old['seconds'] * 1000:.2f} ms -> {result['seconds'] * 1000:.2f} ms "
+                f"(+{(result['seconds'] / old['seconds'] - 1) * 100:.0f}%)"
+            )
+        if result['score'] > old['score'] + spreader_engine.OPTIMALITY_TOLERANCE:
+            regressions.append(f"{result['case']}: score {old['score']:.4f} -> {result['score']:.4f}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the spreader engine")
+    parser.add_argument('-o', '--output', help="write machine readable results to this JSON file")
+    parser.add_argument('--quick', action='store_true', help="run a small subset of the grid")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case, the best one counts")
+    parser.add_argument('--iterations', type=int, default=50000, help="local search move budget")
+    parser.add_argument('--only', nargs='*', help="only benchmark these functions")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown, 0.25 means 25%%")
+    parser.add_argument('--min-seconds', type=float, default=0.001, help="ignore slowdowns of faster cases")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        grid = (QUICK_SUBJECT_COUNTS, QUICK_DAY_COUNTS, QUICK_PRACTICAL_RATIOS)
+    else:
+        grid = (SUBJECT_COUNTS, DAY_COUNTS, PRACTICAL_RATIOS)
+    results = run(*grid, repeat=args.repeat, iterations=args.iterations, only=args.only)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'repeat': args.repeat,
+                    'iterations': args.iterations,
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# Load test for the multi-session support server.
+#
+#   python bench_support.py --sessions 50 --turns 4 -o support_results.json
+#   python bench_support.py --fixtures recordings/ --model-latency 0.8 --audio-share 1
+#   python bench_support.py --url http://127.0.0.1:5000
+#
+# Each simulated user opens a session and asks --turns questions one after
+# the other, by text or by sending a recorded clip (--audio-share of them).
+# Without --url the server runs in this process with stub backends: speech
+# recognition returns the transcript recorded next to each clip, synthesis
+# is a local stub and the model is fake_provider with --model-latency, so
+# the numbers show the server's own queueing and concurrency rather than
+# Google's. Recordings come from --fixtures (WAV files plus transcripts.json
+# mapping file name to transcript) or are generated. Questions mix stock FAQ
+# ones, answered from the index, with ones that need the model.
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import wave
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "How do I add holidays to my timetable?",
+    "I'm getting an error message when exporting my schedule",
+    "How do I update my payment details?",
+    "How do I contact support?",
+    "How do I delete my account?",
+    "How do I reset my password?",
+    "Can I give one teacher fewer first periods than the others?",
+    "Our school runs a two week rotation, can Timelith handle that?",
+    "What happens to the timetable when a room is closed for repairs?",
+    "Is there a limit to how many class groups one timetable can have?",
+]
+
+def make_fixtures(path, questions=QUESTIONS, seconds=1.0, rate=16000):
+    """Write one distinct WAV clip per question and transcripts.json listing them"""
+    transcripts = {}
+    for i, question in enumerate(questions):
+        name = f"question_{i:02d}.wav"
+        frequency = 220.0 * (1 + i / 4)
+        samples = (int(8000 * math.sin(2 * math.pi * frequency * n / rate)) for n in range(int(seconds * rate)))
+        with wave.open(os.path.join(path, name), 'wb') as clip:
+            clip.setnchannels(1)
+            clip.setsampwidth(2)
+            clip.setframerate(rate)
+            clip.writeframes(b''.join(struct.pack('<h', sample) for sample in samples))
+        transcripts[name] = question
+    with open(os.path.join(path, 'transcripts.json'), 'w', encoding='utf-8') as f:
+        json.dump(transcripts, f, indent=2)
+
+def load_fixtures(path):
+    """[(audio bytes, transcript)] for the clips listed in <path>/transcripts.json"""
+    with open(os.path.join(path, 'transcripts.json'), encoding='utf-8') as f:
+        listing = json.load(f)
+    clips = []
+    for name, text in listing.items():
+        with open(os.path.join(path, name), 'rb') as f:
+            clips.append((f.read(), text))
+    return clips
+
+def start_local_server(fixtures, model_latency):
+    """Serve support_server with stub backends and a fake model in this process; returns its URL"""
+    from fake_provider import start_fake_provider
+    _, model_url, _ = start_fake_provider(latency=model_latency, jitter=model_latency / 4,
+                                          reply="Timelith can do that. Open the settings for the timetable "
+                                                "and adjust the option there. Let me know if you need more help.")
+    os.environ.update({
+        'SUPPORT_BACKENDS': 'stub',
+        'SUPPORT_STUB_FIXTURES': fixtures,
+        'LLM_BACKENDS': f"openai:fake@{model_url}",
+        'TTS_CACHE_DIR': '',
+    })
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from support_server import app
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def _request(method, url, body=None, content_type='application/json'):
+    if isinstance(body, dict):
+        body = json.dumps(body).encode('utf-8')
+    request = urllib.request.Request(url, data=body, method=method,
+                                     headers={'Content-Type': content_type} if body is not None else {})
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            data = response.read()
+            return response.status, json.loads(data) if data else None
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except OSError:
+        return 'connection error', None
+
+def simulate_user(base_url, clips, turns, audio_share, rng):
+    """Open a session, ask `turns` questions in a row, close it; returns one record per turn"""
+    status, session = _request('POST', f"{base_url}/sessions", {})
+    if status != 201:
+        return [{'status': status, 'seconds': 0.0, 'kind': 'session', 'source': None}]
+    records = []
+    for _ in range(turns):
+        audio, text = rng.choice(clips)
+        kind = 'audio' if rng.random() < audio_share else 'text'
+        start = time.perf_counter()
+        if kind == 'audio':
+            status, result = _request('POST', f"{base_url}{session['messages_url']}", audio, 'audio/wav')
+        else:
+            status, result = _request('POST', f"{base_url}{session['messages_url']}", {'text': text})
+        records.append({
+            'status': status,
+            'seconds': time.perf_counter() - start,
+            'kind': kind,
+            'source': result['source'] if result else None,
+            'first_sentence_seconds': result['seconds'].get('first_sentence') if result else None,
+            'heard_correctly': result['heard'] == text if result and kind == 'audio' else None,
+        })
+    _request('DELETE', f"{base_url}/sessions/{session['session_id']}")
+    return records
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50_seconds': statistics.median(values),
+        'p95_seconds': values[min(len(values) - 1, int(len(values) * 0.95))],
+        'max_seconds': values[-1],
+    }
+
+def run(base_url, clips, sessions, turns, audio_share, seed):
+    rng = random.Random(seed)
+    seeds = [rng.random() for _ in range(sessions)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        records = [record for user in executor.map(
+            lambda s: simulate_user(base_url, clips, turns, audio_share, random.Random(s)), seeds) for record in user]
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in records if r['status'] == 200]
+    results = {
+        'sessions': sessions,
+        'turns': len(records),
+        'seconds': elapsed,
+        'throughput': len(ok) / elapsed,
+        'statuses': dict(Counter(str(r['status']) for r in records)),
+        'all': _percentiles([r['seconds'] for r in ok]),
+        'first_sentence': _percentiles([r['first_sentence_seconds'] for r in ok if r['first_sentence_seconds']]),
+        'misheard': sum(r['heard_correctly'] is False for r in ok),
+    }
+    for kind in ('text', 'audio'):
+        results[kind] = _percentiles([r['seconds'] for r in ok if r['kind'] == kind])
+    for source in ('faq', 'model', 'fallback'):
+        results[source] = _percentiles([r['seconds'] for r in ok if r['source'] == source])
+    _, results['server'] = _request('GET', f"{base_url}/support-stats")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the multi-session support server")
+    parser.add_argument('--url', help="server to test; by default one is started here with stub backends")
+    parser.add_argument('--fixtures', help="directory of recorded clips and transcripts.json; generated if omitted")
+    parser.add_argument('--sessions', type=int, default=50, help="concurrent simulated users")
+    parser.add_argument('--turns', type=int, default=4, help="questions per user")
+    parser.add_argument('--audio-share', type=float, default=0.5, help="share of questions sent as audio")
+    parser.add_argument('--model-latency', type=float, default=0.5, help="seconds per fake model reply")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    fixtures = args.fixtures or tempfile.mkdtemp(prefix='bench_support_')
+    if not args.fixtures:
+        make_fixtures(fixtures)
+    base_url = args.url or start_local_server(fixtures, args.model_latency)
+    results = run(base_url, load_fixtures(fixtures), args.sessions, args.turns, args.audio_share, args.seed)
+    results['python'] = sys.version.split()[0]
+
+    print(f"{results['turns']} turns from {args.sessions} sessions in {results['seconds']:.1f}s "
+          f"({results['throughput']:.1f} turns/s), statuses {results['statuses']}")
+    for name in ('all', 'first_sentence', 'text', 'audio', 'faq', 'model', 'fallback'):
+        stats = results[name]
+        if stats['count']:
+            print(f"  {name:15} n={stats['count']:4}  p50 {stats['p50_seconds'] * 1000:7.1f} ms  "
+                  f"p95 {stats['p95_seconds'] * 1000:7.1f} ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# Small result caches shared by the spreader engine and the report apps.
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def normalize_text(text):
+    """Canonical form of user input: unified line endings, no trailing or repeated blanks"""
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n')]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+def content_key(*parts):
+    """SHA-256 hex digest identifying the given parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+class SQLiteStore:
+    """Persistent key/value store in a local SQLite file.
+
+    Values must be JSON serializable. Several processes can share the same
+    file, and several stores can share it under different `table` names.
+    Once it holds more than `max_entries` rows the least recently used ones
+    are dropped; with a `ttl` (seconds) entries older than that are misses.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=None, table='cache'):
+        if not re.fullmatch(r'\w+', table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL,"
+                " created REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if 'created' not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN created REAL NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        """(value, seconds since it was set) for a live key, else None"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), now - row[1]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, last_used, created) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f" SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with hit/miss counters.
+
+    With a `ttl` (seconds) entries expire that long after they were set.
+    With a `store` (such as SQLiteStore) every value is also written through
+    to it, and memory misses fall back to it, so results survive restarts
+    and can be shared between processes.
+    """
+
+    def __init__(self, maxsize=256, store=None, ttl=None):
+        self.maxsize = maxsize
+        self.store = store
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                value, expires = self._data[key]
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+        entry = self.store.get_entry(key) if self.store is not None else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # Promoted entries expire when the stored one does, not a full TTL from now
+            value, age = entry
+            ttls = [ttl for ttl in (self.ttl, self.store.ttl) if ttl is not None]
+            self._remember(key, value, min(ttls) - age if ttls else None)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if self.store is not None:
+            self.store.set(key, value)
+
+    def _remember(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Hit/miss counters and current in-memory size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'backend': 'sqlite' if isinstance(self.store, SQLiteStore) else 'memory',
+            }
+
+def cache_from_env(prefix, maxsize=256, ttl=None):
+    """LRUCache configured from <prefix>_SIZE, <prefix>_TTL and <prefix>_PATH.
+
+    Setting <prefix>_PATH adds a shared SQLite store at that path.
+    """
+    maxsize = int(os.getenv(f"{prefix}_SIZE", maxsize))
+    ttl = os.getenv(f"{prefix}_TTL", ttl)
+    ttl = float(ttl) if ttl not in (None, '') else None
+    path = os.getenv(f"{prefix}_PATH")
+    store = SQLiteStore(path, ttl=ttl, table=prefix.lower()) if path else None
+    return LRUCache(maxsize=maxsize, store=store, ttl=ttl)
@@ -0,0 +1,240 @@
+# Bounded chat history for long-running support sessions.
+#
+# A plain Conversation re-sends every earlier turn with each message, so a
+# kiosk that runs all day gets slower and dearer with every question. A
+# ChatHistory keeps its prompt under CHAT_MAX_TOKENS: the last
+# CHAT_KEEP_TURNS exchanges stay verbatim and older ones are folded into a
+# rolling summary by the model, in the background after a reply so the
+# next question does not wait for it. If summarizing fails the oldest turns
+# are dropped instead. Each user gets their own history through
+# ChatSessions; idle sessions are forgotten after CHAT_IDLE_MINUTES.
+import os
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+
+from chunking import estimate_tokens
+from llm_router import Conversation
+
+SUMMARY_PROMPT = """Update the summary of this support conversation for the assistant's own reference.
+Keep what the user is trying to do, details they gave (names, settings, error messages), what
+was already answered and anything still open. Write at most {words} words, no preamble.
+
+Summary so far:
+{summary}
+
+Earlier exchanges to fold in:
+{transcript}"""
+
+def _message_tokens(message):
+    # Content plus a few tokens for the role and message framing
+    return estimate_tokens(message['content']) + 4
+
+class ChatHistory(Conversation):
+    """Conversation kept within a token budget: recent turns verbatim, older ones summarized"""
+
+    def __init__(self, router, system_prompt=None, budget_tokens=2000, keep_turns=3, summary_tokens=256,
+                 background=True, **options):
+        self.router = router
+        self.options = options
+        self.system = [{'role': 'system', 'content': system_prompt}] if system_prompt else []
+        # The prompt budget; the model's own max_tokens (reply length) stays in options
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.background = background
+        self.summary = ''
+        self.turns = []
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._started = None
+        self._prompt_tokens = deque(maxlen=50)
+        self._latencies = deque(maxlen=50)
+        self._counters = {'turns': 0, 'compactions': 0, 'compaction_failures': 0, 'turns_summarized': 0,
+                          'turns_dropped': 0, 'compaction_seconds': 0.0,
+                          # What the prompt would be if every turn were still sent verbatim
+                          'full_history_tokens': sum(_message_tokens(m) for m in self.system)}
+
+    @staticmethod
+    def _turn_messages(text, reply):
+        return [{'role': 'user', 'content': text}, {'role': 'assistant', 'content': reply}]
+
+    def _context(self):
+        messages = list(self.system)
+        if self.summary:
+            messages.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{self.summary}"})
+        return messages
+
+    @property
+    def messages(self):
+        """What the model currently sees of the conversation"""
+        with self._lock:
+            return self._context() + [m for turn in self.turns for m in self._turn_messages(*turn)]
+
+    def prompt(self, text, context=None):
+        with self._lock:
+            extra = [{'role': 'system', 'content': context}] if context else []
+            head = self._context() + extra + [{'role': 'user', 'content': text}]
+            budget = self.budget_tokens - sum(_message_tokens(m) for m in head)
+            # Newest turns first until the budget is spent; older ones wait for the summary
+            recent = []
+            for turn in reversed(self.turns):
+                messages = self._turn_messages(*turn)
+                tokens = sum(_message_tokens(m) for m in messages)
+                if recent and tokens > budget:
+                    break
+                recent[:0] = messages
+                budget -= tokens
+            messages = head[:-1] + recent + head[-1:]
+            self._prompt_tokens.append(sum(_message_tokens(m) for m in messages))
+            self._started = time.perf_counter()
+        return messages
+
+    def add_turn(self, text, reply):
+        with self._lock:
+            if self._started is not None:
+                self._latencies.append(time.perf_counter() - self._started)
+                self._started = None
+            self.turns.append((text, reply))
+            self._counters['turns'] += 1
+            self._counters['full_history_tokens'] += sum(_message_tokens(m) for m in self._turn_messages(text, reply))
+            old = self._due_for_compaction()
+        if old:
+            if self.background:
+                threading.Thread(target=self._compact, args=(old,), name='chat-summary', daemon=True).start()
+            else:
+                self._compact(old)
+
+    def _due_for_compaction(self):
+        # Called with the lock held; returns the turns to fold into the summary, if any
+        if self._compacting or len(self.turns) <= self.keep_turns:
+            return None
+        tokens = sum(_message_tokens(m) for m in self._context())
+        tokens += sum(_message_tokens(m) for turn in self.turns for m in self._turn_messages(*turn))
+        if tokens <= self.budget_tokens:
+            return None
+        self._compacting = True
+        return self.turns[:len(self.turns) - self.keep_turns]
+
+    def _compact(self, old):
+        start = time.perf_counter()
+        transcript = '\n'.join(f"User: {text}\nAssistant: {reply}" for text, reply in old)
+        try:
+            summary = self.router.generate(
+                [{'role': 'user', 'content': SUMMARY_PROMPT.format(
+                    words=int(self.summary_tokens * 0.75), summary=self.summary or '(none yet)',
+                    transcript=transcript)}],
+                max_tokens=self.summary_tokens, temperature=0.2,
+            ).strip()
+        except Exception as e:
+            print(f"Could not summarize the conversation, dropping the oldest turns: {e}")
+            summary = None
+        with self._lock:
+            if summary:
+                self.summary = summary
+                self._counters['compactions'] += 1
+                self._counters['turns_summarized'] += len(old)
+            else:
+                self._counters['compaction_failures'] += 1
+                self._counters['turns_dropped'] += len(old)
+            # Turns added meanwhile are after `old`, so dropping from the front is safe
+            del self.turns[:len(old)]
+            self._counters['compaction_seconds'] += time.perf_counter() - start
+            self._compacting = False
+
+    def stats(self):
+        """Turn and compaction counters, and recent prompt sizes and reply latencies"""
+        with self._lock:
+            prompts, latencies = list(self._prompt_tokens), list(self._latencies)
+            return {
+                **self._counters,
+                'verbatim_turns': len(self.turns),
+                'summary_tokens': estimate_tokens(self.summary),
+                'prompt_tokens_last': prompts[-1] if prompts else 0,
+                'prompt_tokens_max': max(prompts) if prompts else 0,
+                'prompt_tokens_p50': statistics.median(prompts) if prompts else 0,
+                'latency_seconds_p50': statistics.median(latencies) if latencies else None,
+                'latency_seconds_last': latencies[-1] if latencies else None,
+            }
+
+class ChatSessions:
+    """One ChatHistory per user, created on first use and forgotten after being idle"""
+
+    def __init__(self, factory, max_sessions=1000, idle_timeout=30 * 60):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+
+    def _expire(self, now):
+        while self._sessions:
+            user_id, (_, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_used < self.idle_timeout:
+                break
+            del self._sessions[user_id]
+            self.expired += 1
+
+    def get(self, user_id):
+        """The user's history, new if they have none or it expired"""
+        now = time.monotonic()
+        with self._lock:
+            history, last_used = self._sessions.pop(user_id, (None, now))
+            if history is not None and now - last_used >= self.idle_timeout:
+                history = None
+                self.expired += 1
+            if history is None:
+                history = self.factory()
+                self.created += 1
+            self._sessions[user_id] = (history, now)
+            self._expire(now)
+            return history
+
+    def __contains__(self, user_id):
+        with self._lock:
+            self._expire(time.monotonic())
+            return user_id in self._sessions
+
+    def reset(self, user_id):
+        """Forget the user's history"""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """Session counts plus turn, compaction and prompt size totals across live sessions"""
+        with self._lock:
+            self._expire(time.monotonic())
+            histories = [history for history, _ in self._sessions.values()]
+        per_session = [history.stats() for history in histories]
+        prompts = [stats['prompt_tokens_last'] for stats in per_session if stats['turns']]
+        return {
+            'sessions': len(histories),
+            'created': self.created,
+            'expired': self.expired,
+            'turns': sum(stats['turns'] for stats in per_session),
+            'compactions': sum(stats['compactions'] for stats in per_session),
+            'turns_dropped': sum(stats['turns_dropped'] for stats in per_session),
+            'prompt_tokens_p50': statistics.median(prompts) if prompts else 0,
+            'prompt_tokens_max': max((stats['prompt_tokens_max'] for stats in per_session), default=0),
+            'full_history_tokens_max': max((stats['full_history_tokens'] for stats in per_session), default=0),
+        }
+
+def sessions_from_env(router, system_prompt, **options):
+    """Per-user bounded histories, configured from the CHAT_* environment variables"""
+    return ChatSessions(
+        lambda: ChatHistory(
+            router, system_prompt,
+            budget_tokens=int(os.getenv("CHAT_MAX_TOKENS", 2000)),
+            keep_turns=int(os.getenv("CHAT_KEEP_TURNS", 3)),
+            summary_tokens=int(os.getenv("CHAT_SUMMARY_TOKENS", 256)),
+            **options,
+        ),
+        max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", 1000)),
+        idle_timeout=float(os.getenv("CHAT_IDLE_MINUTES", 30)) * 60,
+    )
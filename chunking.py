@@ -0,0 +1,204 @@
+# Token budgeting and map-reduce over inputs too large for one prompt.
+#
+# Inputs over the budget are split into chunks that each fit: tables and
+# JSON schedules are grouped by department, student group or day (in that
+# order of preference) with the header repeated in every chunk, other text
+# by paragraphs. The
+# chunks are analyzed concurrently, so latency follows the slowest chunk
+# rather than the total input size, and the partial SCHEDULE EVALUATION
+# REPORTs are merged section by section into one.
+import csv
+import io
+import json
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from schedule_parser import REPORT_SECTIONS, canonical_column, format_report, format_time, parse_schedule, split_rows
+
+# Rough size of a token for English text and tables; no tokenizer needed
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 6000))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", 4))
+
+# Columns a table is split along, most preferred first
+SPLIT_COLUMNS = ('department', 'group', 'day')
+
+def estimate_tokens(text):
+    """Approximate prompt tokens for a piece of text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _pack(pieces, max_tokens, join):
+    # Greedily pack (label, text) pieces into chunks of at most max_tokens, keeping their order
+    chunks, labels, texts, size = [], [], [], 0
+    for label, text in pieces:
+        tokens = estimate_tokens(text)
+        if texts and size + tokens > max_tokens:
+            chunks.append((', '.join(dict.fromkeys(labels)), join(texts)))
+            labels, texts, size = [], [], 0
+        labels.append(label)
+        texts.append(text)
+        size += tokens
+    if texts:
+        chunks.append((', '.join(dict.fromkeys(labels)), join(texts)))
+    return chunks
+
+def split_text(text, max_tokens=CHUNK_TOKENS):
+    """(label, text) chunks of free text, split at paragraphs, then lines, then characters"""
+    if estimate_tokens(text) <= max_tokens:
+        return [('all', text)]
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        if not paragraph.strip():
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            pieces.extend(line[i:i + max_chars] for i in range(0, len(line), max_chars))
+    chunks = _pack([('', piece) for piece in pieces], max_tokens, '\n\n'.join)
+    return [(f"part {i + 1} of {len(chunks)}", chunk) for i, (_, chunk) in enumerate(chunks)]
+
+def _to_csv(rows):
+    out = io.StringIO()
+    csv.writer(out, lineterminator='\n').writerows(rows)
+    return out.getvalue()
+
+def _split_table(header, body, max_tokens):
+    # CSV chunks of a table with the header repeated, grouped by the first SPLIT_COLUMNS column present
+    columns = [canonical_column(cell) for cell in header]
+    key_index = next((columns.index(column) for column in SPLIT_COLUMNS if column in columns), None)
+
+    groups = {}
+    for row in body:
+        key = row[key_index].strip() if key_index is not None and key_index < len(row) else ''
+        groups.setdefault(key or 'other', []).append(row)
+
+    header_tokens = estimate_tokens(_to_csv([header]))
+    budget = max(1, max_tokens - header_tokens)
+    pieces = []
+    for key, group_rows in groups.items():
+        group_text = _to_csv(group_rows)
+        if estimate_tokens(group_text) <= budget:
+            pieces.append((key, group_text))
+            continue
+        # One group alone is over the budget: split it into row blocks
+        part = [(key, _to_csv([row])) for row in group_rows]
+        for i, (_, block) in enumerate(_pack(part, budget, ''.join)):
+            pieces.append((f"{key} (part {i + 1})", block))
+    header_text = _to_csv([header])
+    return [(label, header_text + chunk) for label, chunk in _pack(pieces, budget, ''.join)]
+
+def _split_sessions(sessions, ambiguous, max_tokens):
+    # Chunks of a parsed JSON schedule: its sessions as a table, then any records that did not parse
+    header = ['Day', 'Start', 'End', 'Subject', 'Teacher', 'Room', 'Group']
+    body = [[s.day, format_time(s.start), format_time(s.end), s.subject, s.teacher or '', s.room or '',
+             s.group or ''] for s in sessions]
+    chunks = _split_table(header, body, max_tokens)
+    if ambiguous:
+        unparsed = split_text('\n'.join(ambiguous), max_tokens)
+        chunks += [('unparsed records' if label == 'all' else f"unparsed records, {label}", chunk)
+                   for label, chunk in unparsed]
+    return chunks
+
+def split_schedule(text, max_tokens=CHUNK_TOKENS):
+    """(label, text) chunks of a schedule, grouped by department, group or day.
+
+    Tables become CSV chunks that each repeat the original header; JSON
+    schedules are split by their sessions. Anything not recognized as a
+    schedule (prose, other JSON) is split with split_text, unchanged.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [('all', text)]
+    parsed = parse_schedule(text)
+    if text.strip()[:1] in '[{':
+        try:
+            json.loads(text)
+        except ValueError:
+            pass
+        else:
+            return _split_sessions(parsed.sessions, parsed.ambiguous, max_tokens) if parsed is not None else split_text(text, max_tokens)
+    rows = split_rows(text)
+    if len(rows) < 3:
+        return split_text(text, max_tokens)
+    columns = [canonical_column(cell) for cell in rows[0]]
+    # Reading prose as a table would rewrite it, so only real tables take this path
+    if parsed is None and not any(column in columns for column in SPLIT_COLUMNS):
+        return split_text(text, max_tokens)
+    return _split_table(rows[0], rows[1:], max_tokens)
+
+def map_concurrently(fn, items, max_workers=CHUNK_CONCURRENCY):
+    """[fn(item) for item in items], run on up to max_workers threads"""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix='chunk') as executor:
+        return list(executor.map(fn, items))
+
+_HEADINGS = {
+    'CRITICAL ISSUES': 'critical',
+    'IDENTIFIED PROBLEMS': 'problems',
+    'VALID SCHEDULE ELEMENTS': 'valid',
+    'PRIORITY RESOLUTION': 'priority',
+    'SECONDARY ADJUSTMENTS': 'secondary',
+    'NEXT STEPS': 'next_steps',
+}
+
+def parse_report(text):
+    """(status, {section: [items]}) from a SCHEDULE EVALUATION REPORT written by the model"""
+    sections = {name: [] for name in REPORT_SECTIONS}
+    status, current = None, None
+    for raw in text.splitlines():
+        line = re.sub(r'^[#>*_\s]+|[*_\s]+$', '', raw)
+        if not line:
+            continue
+        bare = re.sub(r'^\d+[.)]\s*', '', line).upper().rstrip(':')
+        if bare.startswith('SCHEDULE STATUS'):
+            found = re.search(r'UNACCEPTABLE|ACCEPTABLE', bare)
+            status = found.group(0).capitalize() if found else status
+            current = None
+            continue
+        if bare.startswith(('SCHEDULE EVALUATION REPORT', 'GENERATION', 'DATE/TIME', 'RECOMMENDED ACTIONS')):
+            current = 'priority' if bare.startswith('RECOMMENDED ACTIONS') else None
+            continue
+        heading = next((name for heading, name in _HEADINGS.items() if bare.startswith(heading)), None)
+        if heading:
+            current = heading
+            continue
+        if current:
+            item = re.sub(r'^(?:[•\-*+]|\d+[.)])\s*', '', line).strip()
+            if item and item.lower().rstrip('.') not in ('none', 'n/a', 'no critical issues'):
+                sections[current].append(item)
+    return status, sections
+
+def merge_reports(parts, report_id='', current_datetime=''):
+    """One SCHEDULE EVALUATION REPORT from (label, report text) pairs.
+
+    Items are tagged with the chunk they came from and deduplicated; the
+    schedule is Unacceptable when any chunk is, and Undetermined when
+    otherwise some chunk's report gave no status.
+    """
+    statuses, unjudged = [], []
+    merged = {name: [] for name in REPORT_SECTIONS}
+    for label, text in parts:
+        status, sections = parse_report(text)
+        statuses.append(status)
+        if status is None:
+            unjudged.append(label)
+        for name, items in sections.items():
+            for item in items:
+                # Next steps usually repeat across chunks; keep them untagged so they dedupe
+                entry = item if name == 'next_steps' or not label or label == 'all' else f"[{label}] {item}"
+                if entry not in merged[name]:
+                    merged[name].append(entry)
+    if 'Unacceptable' in statuses or merged['critical']:
+        status = 'Unacceptable'
+    elif unjudged:
+        # A chunk without a status was never judged, so it cannot count as acceptable
+        status = 'Undetermined'
+        merged['next_steps'].append(f"Evaluate again: no status was given for {', '.join(unjudged)}")
+    else:
+        status = 'Acceptable'
+    return format_report(report_id, current_datetime, status, merged)
@@ -0,0 +1,122 @@
+# Local stand-in for an OpenAI-compatible chat completions API.
+#
+#   python fake_provider.py --port 8099 --latency 0.5 --error-rate 0.1
+#   LLM_BACKENDS=openai:fake@http://127.0.0.1:8099/v1 python app3.py
+#
+# Replies echo the last user message (or --reply) after the configured
+# latency, and fail with HTTP 500 at the configured rate, so routing,
+# hedging and failover can be exercised without network access or keys.
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeBehaviour:
+    """How a fake server answers; attributes can be changed while it runs"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, reply=None, chunk_words=3, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reply = reply
+        self.chunk_words = chunk_words
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next(self, messages):
+        """(delay, reply text or None for a failure) for one request"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            return delay, None
+        if self.reply is not None:
+            return delay, self.reply
+        last = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+        return delay, f"Echo: {last}"
+
+def _handler(behaviour):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                return self._json(404, {'error': {'message': 'Not found'}})
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            delay, reply = behaviour.next(request.get('messages', []))
+            time.sleep(delay)
+            if reply is None:
+                return self._json(500, {'error': {'message': 'Injected failure'}})
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get('model', 'fake')
+            if not request.get('stream'):
+                return self._json(200, {
+                    'id': completion_id,
+                    'object': 'chat.completion',
+                    'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply},
+                                 'finish_reason': 'stop'}],
+                })
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            words = reply.split(' ')
+            for i in range(0, len(words), behaviour.chunk_words):
+                piece = ' '.join(words[i:i + behaviour.chunk_words]) + (' ' if i + behaviour.chunk_words < len(words) else '')
+                chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'model': model,
+                         'choices': [{'index': 0, 'delta': {'content': piece}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return Handler
+
+def start_fake_provider(host='127.0.0.1', port=0, **behaviour):
+    """Start a fake server in a background thread; returns (server, base_url, behaviour)"""
+    behaviour = FakeBehaviour(**behaviour)
+    server = ThreadingHTTPServer((host, port), _handler(behaviour))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1", behaviour
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before each reply")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random +/- seconds added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument('--reply', help="fixed reply text instead of echoing the last user message")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    behaviour = FakeBehaviour(args.latency, args.jitter, args.error_rate, args.reply, seed=args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), _handler(behaviour))
+    print(f"Fake provider on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Local TF-IDF index over the Timelith FAQ.
+#
+# Stock questions ("How do I add holidays to my timetable?") are answered
+# straight from the index in well under a millisecond with no network call:
+# when the best match's similarity reaches FAQ_THRESHOLD its answer is used
+# as is. Below the threshold the best passages are handed to the model as
+# context instead, so it answers from the same knowledge base.
+#
+# The bundled faq.json only holds answers the system prompt itself gives
+# (holidays, export errors and the cases to escalate). Product how-tos are
+# maintained by support staff in their own file, FAQ_EXTRA_PATH, in the same
+# format; its entries are added, replacing bundled ones with the same id.
+#
+# Each entry has an id, a question, optional alternate phrasings and an
+# answer. An entry answers a query as well as its closest phrasing matches
+# it; the answer text also counts when picking context passages.
+import json
+import math
+import os
+import re
+import statistics
+import threading
+import time
+from collections import Counter, namedtuple
+
+FAQ_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faq.json')
+
+Match = namedtuple('Match', 'entry score')
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from have how i i'm in is it it's me my of on or
+our please so that the there this to us was what when where which why will with would you your
+""".split())
+
+def _stem(word):
+    # Just enough folding that "holidays", "holiday" and "exporting", "export" meet
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text):
+    """Lower-case, stemmed content words of the text"""
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+def _normalize(weights):
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {term: w / norm for term, w in weights.items()} if norm else {}
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+def load_entries(*paths):
+    """Entries of the FAQ files in order; a later entry replaces an earlier one with the same id"""
+    entries = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for entry in json.load(f):
+                entries[entry.get('id') or entry['question']] = entry
+    return list(entries.values())
+
+class FAQIndex:
+    """Cosine similarity over TF-IDF vectors of the FAQ entries"""
+
+    def __init__(self, entries, threshold=0.75):
+        self.entries = list(entries)
+        self.threshold = threshold
+        phrasings = [(i, tokenize(phrasing)) for i, e in enumerate(self.entries)
+                     for phrasing in [e['question'], *e.get('alternates', [])]]
+        passages = [[] for _ in self.entries]
+        for i, terms in phrasings:
+            passages[i] += terms
+        for i, e in enumerate(self.entries):
+            passages[i] += tokenize(e['answer'])
+        document_frequency = Counter(term for doc in passages for term in set(doc))
+        count = len(self.entries)
+        self.idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self._unknown_idf = statistics.median(self.idf.values()) if self.idf else 1.0
+        self._phrasings = [(i, self._vector(terms)) for i, terms in phrasings]
+        self._passages = [self._vector(doc) for doc in passages]
+        self._lock = threading.Lock()
+        self._counters = {'lookups': 0, 'answered': 0, 'lookup_seconds': 0.0}
+
+    @classmethod
+    def from_file(cls, path=FAQ_PATH, threshold=0.75):
+        return cls(load_entries(path), threshold)
+
+    def _vector(self, terms):
+        # Sublinear term frequency. Words the FAQ never uses get the highest weight, so a
+        # query about something else ("delete my timetable") does not ride on one shared word
+        counts = Counter(terms)
+        return _normalize({term: (1 + math.log(n)) * self.idf.get(term, self._unknown_idf)
+                           for term, n in counts.items()})
+
+    def search(self, query, k=3, passages=False):
+        """The k best matching entries, best first, with their similarity"""
+        vector = self._vector(tokenize(query))
+        best = [0.0] * len(self.entries)
+        for i, v in (enumerate(self._passages) if passages else self._phrasings):
+            best[i] = max(best[i], _cosine(vector, v))
+        ranked = sorted(range(len(best)), key=best.__getitem__, reverse=True)
+        return [Match(self.entries[i], best[i]) for i in ranked[:k] if best[i] > 0]
+
+    def lookup(self, query, k=3):
+        """(answer, passages): the answer if a question matches confidently, else None and context passages"""
+        start = time.perf_counter()
+        best = self.search(query, k=1)
+        confident = bool(best) and best[0].score >= self.threshold
+        passages = best if confident else self.search(query, k=k, passages=True)
+        with self._lock:
+            self._counters['lookups'] += 1
+            self._counters['answered'] += confident
+            self._counters['lookup_seconds'] += time.perf_counter() - start
+        return (best[0].entry['answer'] if confident else None), passages
+
+    @staticmethod
+    def context(passages, min_score=0.1):
+        """Passages formatted as reference material for the model, or '' if none are relevant"""
+        relevant = [m for m in passages if m.score >= min_score]
+        if not relevant:
+            return ''
+        body = '\n\n'.join(f"Q: {m.entry['question']}\nA: {m.entry['answer']}" for m in relevant)
+        return ("Timelith knowledge base entries that may be relevant. Answer from them where they apply; "
+                f"if they do not cover the question, follow your instructions.\n\n{body}")
+
+    def stats(self):
+        """Lookups, share answered from the index and average lookup time"""
+        with self._lock:
+            lookups = self._counters['lookups']
+            return {
+                **self._counters,
+                'entries': len(self.entries),
+                'threshold': self.threshold,
+                'answer_rate': self._counters['answered'] / lookups if lookups else 0.0,
+                'average_lookup_ms': 1000 * self._counters['lookup_seconds'] / lookups if lookups else 0.0,
+            }
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+def get_faq_index():
+    """The process-wide index over FAQ_PATH plus FAQ_EXTRA_PATH, with FAQ_THRESHOLD"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            paths = [os.getenv("FAQ_PATH", FAQ_PATH), os.getenv("FAQ_EXTRA_PATH")]
+            _shared_index = FAQIndex(load_entries(*filter(None, paths)),
+                                     threshold=float(os.getenv("FAQ_THRESHOLD", 0.75)))
+        return _shared_index
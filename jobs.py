@@ -0,0 +1,266 @@
+# Background jobs for the report apps, kept in a local SQLite file.
+#
+# Submitting a job only writes a row and returns its ID, so slow model calls
+# and PDF renders no longer hold a web worker. Worker threads claim queued
+# jobs, run the handler registered for the job's kind and store the result
+# (JSON, or raw bytes for files) for polling, optionally POSTing a
+# notification to a callback URL on an allowed host (<PREFIX>_CALLBACK_HOSTS).
+# A claimed job holds a lease; if its worker dies (restart, crash) the lease
+# runs out and the job is picked up again, until it has used its attempts.
+#
+# Workers can run inside the web process (<PREFIX>_WORKERS threads) or in
+# separate processes sharing the same file, e.g. `python app3.py worker`.
+import json
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+class JobQueue:
+    """Persistent job queue with local worker threads.
+
+    `handlers` maps a job kind to a function taking the payload dict and
+    returning a JSON-serializable result or bytes. A job whose handler
+    raises is retried until it has been tried `max_attempts` times.
+    Callback URLs must use one of `callback_schemes` and a host (or
+    host:port) in `callback_hosts`; with no hosts, callbacks are refused.
+    """
+
+    def __init__(self, path, handlers, table='jobs', lease=600, max_attempts=3, poll_interval=0.5, workers=0,
+                 callback_hosts=(), callback_schemes=('https',)):
+        if not re.fullmatch(r'\w+', table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        self.path = path
+        self.handlers = handlers
+        self.table = table
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.workers = workers
+        self.callback_hosts = {host.lower() for host in callback_hosts}
+        self.callback_schemes = set(callback_schemes)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._created = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        # The file and table are created on first use, not when an app imports the queue
+        if not self._created:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+                " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT, output BLOB, error TEXT, callback_url TEXT, worker TEXT,"
+                " created REAL NOT NULL, started REAL, finished REAL, lease_expires REAL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_status ON {self.table} (status, created)")
+            self._created = True
+        return conn
+
+    def callback_allowed(self, url):
+        """Whether jobs may POST their notification to `url`"""
+        parts = urllib.parse.urlsplit(url)
+        try:
+            port = parts.port
+        except ValueError:
+            return False
+        if parts.scheme not in self.callback_schemes or not parts.hostname:
+            return False
+        host = parts.hostname.lower()
+        return host in self.callback_hosts or (port is not None and f"{host}:{port}" in self.callback_hosts)
+
+    def submit(self, kind, payload, callback_url=None):
+        """Queue a job and return its ID"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of {sorted(self.handlers)}")
+        if callback_url and not self.callback_allowed(callback_url):
+            raise ValueError("callback_url must be an allowed host "
+                             f"({', '.join(sorted(self.callback_schemes))}: {', '.join(sorted(self.callback_hosts)) or 'none'})")
+        job_id = str(uuid.uuid4())
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO {self.table} (id, kind, payload, status, callback_url, created)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, callback_url, time.time()),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id, with_output=False):
+        """The job as a dict, or None; `output` (file bytes) is only loaded when asked for"""
+        columns = "id, kind, status, attempts, result, error, created, started, finished"
+        if with_output:
+            columns += ", output"
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute(f"SELECT {columns} FROM {self.table} WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def claim(self):
+        """Take the oldest runnable job (queued, or running on an expired lease), or None.
+
+        An expired job that has used all its attempts is failed instead, so a
+        job that keeps killing its worker is not retried forever. Each claim
+        gets its own worker token, so only that claim can finish the job.
+        """
+        now = time.time()
+        worker = f"{self.worker_id}:{uuid.uuid4().hex[:12]}"
+        job, abandoned = None, []
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            while job is None:
+                row = conn.execute(
+                    f"SELECT id, kind, payload, attempts, status, callback_url FROM {self.table}"
+                    " WHERE status = ? OR (status = ? AND lease_expires < ?)"
+                    " ORDER BY created LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    break
+                job_id, kind, payload, attempts, status, callback_url = row
+                if status == RUNNING and attempts >= self.max_attempts:
+                    error = f"Worker stopped before finishing, {attempts} attempts used"
+                    conn.execute(
+                        f"UPDATE {self.table} SET status = ?, error = ?, finished = ?, lease_expires = NULL"
+                        " WHERE id = ?",
+                        (FAILED, error, now, job_id),
+                    )
+                    abandoned.append((callback_url, {'job_id': job_id, 'kind': kind, 'status': FAILED, 'error': error}))
+                    continue
+                conn.execute(
+                    f"UPDATE {self.table} SET status = ?, attempts = ?, worker = ?, started = ?, lease_expires = ?"
+                    " WHERE id = ?",
+                    (RUNNING, attempts + 1, worker, now, now + self.lease, job_id),
+                )
+                job = {'id': job_id, 'kind': kind, 'payload': json.loads(payload),
+                       'attempts': attempts + 1, 'worker': worker}
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        for callback_url, body in abandoned:
+            if callback_url:
+                self._notify(callback_url, body)
+        return job
+
+    def _finish(self, job, result=None, error=None):
+        if error is not None and job['attempts'] < self.max_attempts:
+            status = QUEUED
+        else:
+            status = FAILED if error is not None else DONE
+        output = result if isinstance(result, (bytes, bytearray)) else None
+        result = json.dumps(result) if output is None and error is None else None
+        with self._connect() as conn:
+            updated = conn.execute(
+                f"UPDATE {self.table} SET status = ?, result = ?, output = ?, error = ?, finished = ?,"
+                " lease_expires = NULL WHERE id = ? AND worker = ? AND status = ?",
+                (status, result, output, error, time.time(), job['id'], job['worker'], RUNNING),
+            ).rowcount
+            if not updated:
+                # The lease ran out and the job was claimed again or failed; that claim owns it now
+                return
+            callback_url = conn.execute(
+                f"SELECT callback_url FROM {self.table} WHERE id = ?", (job['id'],)
+            ).fetchone()[0]
+        if status != QUEUED and callback_url:
+            self._notify(callback_url, {'job_id': job['id'], 'kind': job['kind'], 'status': status, 'error': error})
+
+    def _notify(self, url, body):
+        # Best effort: a dead callback endpoint must not fail the job. Redirects are
+        # not followed, so a callback cannot bounce the request to another host
+        if not self.callback_allowed(url):
+            return
+        try:
+            req = urllib.request.Request(
+                url, data=json.dumps(body).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}, method='POST',
+            )
+            urllib.request.build_opener(_NoRedirect).open(req, timeout=10).close()
+        except Exception:
+            pass
+
+    def run_one(self):
+        """Claim and run a single job; False when there was nothing to do"""
+        job = self.claim()
+        if job is None:
+            return False
+        try:
+            result = self.handlers[job['kind']](job['payload'])
+        except Exception as e:
+            self._finish(job, error=str(e))
+        else:
+            self._finish(job, result=result)
+        return True
+
+    def work(self):
+        """Process jobs until stop() is called"""
+        while not self._stop.is_set():
+            if not self.run_one():
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def start(self, workers=None):
+        """Run `workers` (by default self.workers) worker threads in the background"""
+        for i in range(self.workers if workers is None else workers):
+            thread = threading.Thread(target=self.work, name=f'{self.table}-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def stats(self):
+        """Job counts per status"""
+        with self._connect() as conn:
+            counts = dict(conn.execute(f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status").fetchall())
+        return {
+            **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            'local_workers': len(self._threads),
+        }
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def _env_list(name, default=''):
+    return [item.strip() for item in os.getenv(name, default).split(',') if item.strip()]
+
+def queue_from_env(prefix, handlers, workers=2):
+    """JobQueue configured from <prefix>_PATH (default jobs.db) and <prefix>_WORKERS.
+
+    start() runs <prefix>_WORKERS threads in this process; the apps call it
+    when they start serving, so importing them starts nothing. Set it to 0
+    when jobs are handled by separate worker processes. Callbacks are only
+    sent to the comma-separated hosts in <prefix>_CALLBACK_HOSTS, over the
+    schemes in <prefix>_CALLBACK_SCHEMES (default https).
+    """
+    return JobQueue(
+        os.getenv(f"{prefix}_PATH", "jobs.db"),
+        handlers,
+        table=prefix.lower(),
+        lease=float(os.getenv(f"{prefix}_LEASE", 600)),
+        workers=int(os.getenv(f"{prefix}_WORKERS", workers)),
+        callback_hosts=_env_list(f"{prefix}_CALLBACK_HOSTS"),
+        callback_schemes=_env_list(f"{prefix}_CALLBACK_SCHEMES", 'https'),
+    )
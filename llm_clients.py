@@ -0,0 +1,100 @@
+# Process-wide registry of configured model clients.
+#
+# Gemini models and Groq clients are created once and reused by every
+# request (the Groq client keeps its HTTP connection pool alive between
+# calls). They are only rebuilt when the API key in the environment, or the
+# one passed in, changes. Setup time is recorded so /provider-stats can show
+# how much per-request work is saved.
+import os
+import threading
+import time
+
+class ProviderRegistry:
+    """Create configured clients once per API key and hand out the same instance"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gemini_key = None
+        self._gemini_models = {}
+        self._groq_clients = {}
+        self._stats = {}
+
+    def _record(self, kind, created, seconds=0.0):
+        entry = self._stats.setdefault(kind, {'created': 0, 'reused': 0, 'setup_seconds': 0.0})
+        if created:
+            entry['created'] += 1
+            entry['setup_seconds'] += seconds
+        else:
+            entry['reused'] += 1
+
+    def configure_gemini(self):
+        """Configure the Gemini SDK from GEMINI_API_KEY; False when no key is set"""
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return False
+        with self._lock:
+            if api_key != self._gemini_key:
+                import google.generativeai as genai
+                start = time.perf_counter()
+                genai.configure(api_key=api_key)
+                self._record('gemini_configure', True, time.perf_counter() - start)
+                # Models built with the old key must not be reused
+                self._gemini_models.clear()
+                self._gemini_key = api_key
+            else:
+                self._record('gemini_configure', False)
+        return True
+
+    def gemini_model(self, model_name, generation_config=None, safety_settings=None):
+        """A GenerativeModel for these settings, created on first use"""
+        if not self.configure_gemini():
+            raise RuntimeError("Gemini API key not configured")
+        cache_key = (model_name, repr(generation_config), repr(safety_settings))
+        with self._lock:
+            model = self._gemini_models.get(cache_key)
+            if model is None:
+                import google.generativeai as genai
+                start = time.perf_counter()
+                model = genai.GenerativeModel(
+                    model_name=model_name,
+                    generation_config=generation_config,
+                    safety_settings=safety_settings,
+                )
+                self._gemini_models[cache_key] = model
+                self._record('gemini_model', True, time.perf_counter() - start)
+            else:
+                self._record('gemini_model', False)
+            return model
+
+    def groq_client(self, api_key=None):
+        """A Groq client for the key (default GROQ_API_KEY), or None without a key"""
+        api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not api_key:
+            return None
+        with self._lock:
+            client = self._groq_clients.get(api_key)
+            if client is None:
+                from groq import Groq
+                start = time.perf_counter()
+                client = Groq(api_key=api_key)
+                # Keep one client per process; a rotated key replaces the old one
+                self._groq_clients = {api_key: client}
+                self._record('groq_client', True, time.perf_counter() - start)
+            else:
+                self._record('groq_client', False)
+            return client
+
+    def stats(self):
+        """Clients created and reused per kind, with the setup time reuse avoided"""
+        with self._lock:
+            report = {}
+            for kind, entry in self._stats.items():
+                average = entry['setup_seconds'] / entry['created'] if entry['created'] else 0.0
+                report[kind] = {
+                    **entry,
+                    'average_setup_seconds': average,
+                    'estimated_seconds_saved': average * entry['reused'],
+                }
+            return report
+
+registry = ProviderRegistry()
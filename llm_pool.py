@@ -0,0 +1,182 @@
+# Process-wide bounded pool for blocking LLM calls.
+#
+# Request threads hand their generate_content / chat.completions calls to
+# the pool and wait on the result. At most LLM_MAX_CONCURRENCY calls run at
+# once, up to LLM_MAX_QUEUE more wait their turn, and anything beyond that is
+# rejected straight away with PoolFull so the web layer can answer 503
+# instead of piling up threads. Every call has a deadline (LLM_TIMEOUT).
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+class PoolFull(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+class LLMTimeout(Exception):
+    """Raised when a model call does not finish within its deadline"""
+
+_DONE = object()
+
+class LLMPool:
+    """Run blocking model calls with bounded concurrency, a bounded queue and timeouts
+
+    Any other blocking backend (speech recognition, synthesis) can use one
+    too; `name` is what error messages call it.
+    """
+
+    def __init__(self, max_concurrency=8, max_queue=64, timeout=60.0, name='model'):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._slots = threading.BoundedSemaphore(max_concurrency + max_queue)
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timed_out': 0}
+        self._in_flight = 0
+        self._running = 0
+        self._total_wait = 0.0
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return its Future, or raise PoolFull"""
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise PoolFull(f"Too many requests are waiting for the {self.name}, please retry shortly")
+        queued_at = time.perf_counter()
+
+        def run():
+            with self._lock:
+                self._running += 1
+                self._total_wait += time.perf_counter() - queued_at
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        def finished(future):
+            with self._lock:
+                self._in_flight -= 1
+                self._counters['failed' if future.cancelled() or future.exception() else 'completed'] += 1
+            self._slots.release()
+
+        with self._lock:
+            self._in_flight += 1
+            self._counters['submitted'] += 1
+        future = self._executor.submit(run)
+        future.add_done_callback(finished)
+        return future
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Run fn in the pool and wait for its result, raising LLMTimeout after the deadline"""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeout:
+            # A call that already started keeps its worker until the client returns
+            future.cancel()
+            self._count('timed_out')
+            raise LLMTimeout(f"The {self.name} did not respond within {timeout or self.timeout:g} seconds")
+
+    def iterate(self, fn, *args, timeout=None, **kwargs):
+        """Run the generator function fn in the pool and return an iterator over its items.
+
+        The pool slot is taken immediately, so PoolFull is raised here rather
+        than on the first item. The deadline applies to the whole stream.
+        """
+        items = queue.Queue()
+        abandoned = threading.Event()
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    if abandoned.is_set():
+                        return
+                    items.put((item, None))
+            except Exception as e:
+                items.put((_DONE, e))
+                raise
+            items.put((_DONE, None))
+
+        self.submit(produce)
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        def consume():
+            try:
+                while True:
+                    try:
+                        item, error = items.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        self._count('timed_out')
+                        raise LLMTimeout(f"The {self.name} did not finish within {timeout or self.timeout:g} seconds")
+                    if item is _DONE:
+                        if error is not None:
+                            raise error
+                        return
+                    yield item
+            finally:
+                # Stop the producer if the client went away or the deadline passed
+                abandoned.set()
+
+        return consume()
+
+    def stats(self):
+        """Current load and lifetime counters"""
+        with self._lock:
+            started = self._counters['submitted'] - (self._in_flight - self._running)
+            return {
+                **self._counters,
+                'running': self._running,
+                'queued': self._in_flight - self._running,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'timeout': self.timeout,
+                'average_queue_wait': self._total_wait / started if started else 0.0,
+            }
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second with bursts of up to `burst`; rate 0 means no limit"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+def get_pool():
+    """The process-wide pool, configured from LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE and LLM_TIMEOUT"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = LLMPool(
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+                max_queue=int(os.getenv("LLM_MAX_QUEUE", 64)),
+                timeout=float(os.getenv("LLM_TIMEOUT", 60)),
+            )
+        return _shared_pool
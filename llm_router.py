@@ -0,0 +1,435 @@
+# One interface over every model backend, routed by measured latency.
+#
+# Backends come from LLM_BACKENDS, a comma separated list of
+#   gemini:<model>              Google Gemini (GEMINI_API_KEY)
+#   groq:<model>                Groq (GROQ_API_KEY)
+#   openai:<model>@<base_url>   any OpenAI-compatible endpoint, such as
+#                               fake_provider.py (OPENAI_API_KEY, optional)
+# Each call goes to the healthy backend with the lowest recent median
+# latency; backends without measurements yet are tried first, in list
+# order. If that backend has not answered after LLM_HEDGE_AFTER seconds the
+# same request is also sent to the next one and the first answer wins. A
+# backend that fails is skipped for the rest of the call, and one that keeps
+# failing is benched for a cooldown period.
+#
+# Messages use the OpenAI shape: [{"role": "system"|"user"|"assistant", "content": ...}].
+import json
+import os
+import queue
+import statistics
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_clients import registry
+
+DEFAULT_BACKENDS = "gemini:gemini-2.0-flash-exp,gemini:gemini-1.5-pro,groq:mixtral-8x7b-32768"
+
+class AllBackendsFailed(Exception):
+    """Raised when no backend is available or every one of them failed"""
+
+class Provider:
+    """A model behind the router; subclasses implement generate and stream"""
+
+    kind = None
+
+    def __init__(self, model):
+        self.model = model
+        self.name = f"{self.kind}:{model}"
+
+    def available(self):
+        return True
+
+    def generate(self, messages, **options):
+        """The complete reply text"""
+        raise NotImplementedError
+
+    def stream(self, messages, **options):
+        """Yield the reply text piece by piece"""
+        yield self.generate(messages, **options)
+
+class GeminiProvider(Provider):
+    """Gemini through the shared registry; system messages become a leading user turn"""
+
+    kind = 'gemini'
+
+    def available(self):
+        return bool(os.getenv("GEMINI_API_KEY"))
+
+    def _request(self, messages, options):
+        contents = []
+        system = '\n\n'.join(m['content'] for m in messages if m['role'] == 'system')
+        if system:
+            contents += [{'role': 'user', 'parts': [system]}, {'role': 'model', 'parts': ['Understood.']}]
+        contents += [
+            {'role': 'model' if m['role'] == 'assistant' else 'user', 'parts': [m['content']]}
+            for m in messages if m['role'] != 'system'
+        ]
+        config = {key: options[key] for key in ('temperature', 'top_p', 'top_k') if key in options}
+        if 'max_tokens' in options:
+            config['max_output_tokens'] = options['max_tokens']
+        kwargs = {'generation_config': config} if config else {}
+        if options.get('safety_settings'):
+            kwargs['safety_settings'] = options['safety_settings']
+        return registry.gemini_model(self.model), contents, kwargs
+
+    def generate(self, messages, **options):
+        model, contents, kwargs = self._request(messages, options)
+        return model.generate_content(contents, **kwargs).text
+
+    def stream(self, messages, **options):
+        model, contents, kwargs = self._request(messages, options)
+        for chunk in model.generate_content(contents, stream=True, **kwargs):
+            yield chunk.text
+
+def _chat_options(options):
+    return {key: options[key] for key in ('temperature', 'top_p', 'max_tokens') if key in options}
+
+class GroqProvider(Provider):
+    """Groq chat completions through the shared, connection-pooled client"""
+
+    kind = 'groq'
+
+    def __init__(self, model, api_key=None):
+        super().__init__(model)
+        self.api_key = api_key
+
+    def available(self):
+        return bool(self.api_key or os.getenv("GROQ_API_KEY"))
+
+    def generate(self, messages, **options):
+        client = registry.groq_client(self.api_key)
+        response = client.chat.completions.create(model=self.model, messages=messages, **_chat_options(options))
+        return response.choices[0].message.content
+
+    def stream(self, messages, **options):
+        client = registry.groq_client(self.api_key)
+        for chunk in client.chat.completions.create(
+                model=self.model, messages=messages, stream=True, **_chat_options(options)):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+class OpenAICompatibleProvider(Provider):
+    """Any /chat/completions endpoint in the OpenAI format, over plain HTTP"""
+
+    kind = 'openai'
+
+    def __init__(self, model, base_url, api_key=None, timeout=60):
+        super().__init__(model)
+        self.name = f"{self.kind}:{model}@{base_url}"
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def _open(self, messages, options, stream):
+        body = {'model': self.model, 'messages': messages, 'stream': stream, **_chat_options(options)}
+        headers = {'Content-Type': 'application/json'}
+        api_key = self.api_key or os.getenv("OPENAI_API_KEY")
+        if api_key:
+            headers['Authorization'] = f"Bearer {api_key}"
+        req = urllib.request.Request(f"{self.base_url}/chat/completions",
+                                     data=json.dumps(body).encode('utf-8'), headers=headers, method='POST')
+        return urllib.request.urlopen(req, timeout=self.timeout)
+
+    def generate(self, messages, **options):
+        with self._open(messages, options, stream=False) as response:
+            return json.load(response)['choices'][0]['message']['content']
+
+    def stream(self, messages, **options):
+        with self._open(messages, options, stream=True) as response:
+            for raw in response:
+                line = raw.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    return
+                delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                if delta:
+                    yield delta
+
+PROVIDERS = {'gemini': GeminiProvider, 'groq': GroqProvider, 'openai': OpenAICompatibleProvider}
+
+def parse_backends(spec, groq_api_key=None):
+    """Providers for a LLM_BACKENDS style spec"""
+    providers = []
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, model = entry.partition(':')
+        if kind not in PROVIDERS or not model:
+            raise ValueError(f"Invalid backend {entry!r}, expected one of {sorted(PROVIDERS)} as kind:model")
+        if kind == 'openai':
+            model, _, base_url = model.partition('@')
+            providers.append(OpenAICompatibleProvider(model, base_url or "http://127.0.0.1:8099/v1"))
+        elif kind == 'groq':
+            providers.append(GroqProvider(model, api_key=groq_api_key))
+        else:
+            providers.append(PROVIDERS[kind](model))
+    return providers
+
+class BackendStats:
+    """Rolling latency and error window for one backend"""
+
+    def __init__(self, window=50):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.hedges_won = 0
+        self.consecutive_failures = 0
+        self.benched_until = 0.0
+
+    def median(self):
+        return statistics.median(self.latencies) if self.latencies else None
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+class LLMRouter:
+    """Send each request to the fastest healthy backend, hedging slow ones and failing over on errors"""
+
+    def __init__(self, providers, hedge_after=4.0, window=50, max_error_rate=0.5,
+                 max_consecutive_failures=3, cooldown=30.0):
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown = cooldown
+        self._stats = {provider.name: BackendStats(window) for provider in self.providers}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='router')
+        self.hedges = 0
+
+    @property
+    def spec(self):
+        """The configured backends in order, e.g. for keying cached replies to the models that can give them"""
+        return ','.join(provider.name for provider in self.providers)
+
+    def _record(self, provider, seconds, ok):
+        with self._lock:
+            stats = self._stats[provider.name]
+            stats.calls += 1
+            stats.outcomes.append(ok)
+            if ok:
+                stats.latencies.append(seconds)
+                stats.consecutive_failures = 0
+            else:
+                stats.errors += 1
+                stats.consecutive_failures += 1
+                if stats.consecutive_failures >= self.max_consecutive_failures:
+                    stats.benched_until = time.monotonic() + self.cooldown
+
+    def _healthy(self, stats, now):
+        return (stats.benched_until <= now
+                and not (len(stats.outcomes) >= 5 and stats.error_rate() > self.max_error_rate))
+
+    def ranked(self):
+        """Available providers, healthy ones first, fastest first; unmeasured ones count as fastest"""
+        now = time.monotonic()
+        with self._lock:
+            def rank(item):
+                index, provider = item
+                stats = self._stats[provider.name]
+                median = stats.median()
+                return (not self._healthy(stats, now), median if median is not None else 0.0, index)
+            candidates = [(i, p) for i, p in enumerate(self.providers) if p.available()]
+            return [provider for _, provider in sorted(candidates, key=rank)]
+
+    def _timed(self, provider, messages, options):
+        start = time.perf_counter()
+        try:
+            result = provider.generate(messages, **options)
+        except Exception:
+            self._record(provider, time.perf_counter() - start, ok=False)
+            raise
+        self._record(provider, time.perf_counter() - start, ok=True)
+        return result
+
+    def generate(self, messages, **options):
+        """The reply text from whichever backend answers first"""
+        order = self.ranked()
+        if not order:
+            raise AllBackendsFailed("No model backend is configured")
+        errors = []
+        pending = {}
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            provider = order[next_index]
+            next_index += 1
+            pending[self._executor.submit(self._timed, provider, messages, options)] = provider
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after else None
+        while pending:
+            can_hedge = hedge_at is not None and next_index < len(order)
+            done, _ = wait(pending, timeout=max(0.0, hedge_at - time.monotonic()) if can_hedge else None,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # The first backend is slow: ask the next one as well
+                hedge_at = None
+                with self._lock:
+                    self.hedges += 1
+                launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+                    continue
+                if provider is not order[0]:
+                    with self._lock:
+                        self._stats[provider.name].hedges_won += 1
+                return result
+            if not pending and next_index < len(order):
+                launch()
+        raise AllBackendsFailed("; ".join(errors))
+
+    def stream(self, messages, **options):
+        """Yield the reply from whichever backend produces its first piece first"""
+        order = self.ranked()
+        if not order:
+            raise AllBackendsFailed("No model backend is configured")
+        events = queue.Queue()
+        stops = []
+        errors = []
+        running = set()
+
+        def pump(index, provider, stop):
+            start = time.perf_counter()
+            first = True
+            try:
+                for piece in provider.stream(messages, **options):
+                    if first:
+                        # Streams are ranked by time to first piece
+                        self._record(provider, time.perf_counter() - start, ok=True)
+                        first = False
+                    if stop.is_set():
+                        return
+                    events.put((index, 'piece', piece))
+            except Exception as e:
+                if first:
+                    self._record(provider, time.perf_counter() - start, ok=False)
+                events.put((index, 'error', e))
+                return
+            if first:
+                self._record(provider, time.perf_counter() - start, ok=True)
+            events.put((index, 'done', None))
+
+        def launch():
+            index = len(stops)
+            stops.append(threading.Event())
+            running.add(index)
+            self._executor.submit(pump, index, order[index], stops[index])
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after else None
+        winner = None
+        try:
+            while True:
+                can_hedge = winner is None and hedge_at is not None and len(stops) < len(order)
+                try:
+                    index, kind, value = events.get(
+                        timeout=max(0.0, hedge_at - time.monotonic()) if can_hedge else None)
+                except queue.Empty:
+                    hedge_at = None
+                    with self._lock:
+                        self.hedges += 1
+                    launch()
+                    continue
+                if winner is None:
+                    if kind == 'error':
+                        running.discard(index)
+                        errors.append(f"{order[index].name}: {value}")
+                        if not running:
+                            if len(stops) == len(order):
+                                raise AllBackendsFailed("; ".join(errors))
+                            launch()
+                        continue
+                    winner = index
+                    if index > 0:
+                        with self._lock:
+                            self._stats[order[index].name].hedges_won += 1
+                    for i, stop in enumerate(stops):
+                        if i != winner:
+                            stop.set()
+                if index != winner:
+                    continue
+                if kind == 'piece':
+                    yield value
+                elif kind == 'done':
+                    return
+                else:
+                    raise value
+        finally:
+            for stop in stops:
+                stop.set()
+
+    def stats(self):
+        """Per backend latency, error rate and health, plus the number of hedged requests"""
+        now = time.monotonic()
+        with self._lock:
+            backends = {}
+            for provider in self.providers:
+                stats = self._stats[provider.name]
+                latencies = sorted(stats.latencies)
+                backends[provider.name] = {
+                    'available': provider.available(),
+                    'healthy': self._healthy(stats, now),
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'error_rate': stats.error_rate(),
+                    'median_seconds': stats.median(),
+                    'p95_seconds': latencies[int(len(latencies) * 0.95)] if latencies else None,
+                    'hedges_won': stats.hedges_won,
+                }
+            return {'backends': backends, 'hedges': self.hedges, 'hedge_after': self.hedge_after}
+
+class Conversation:
+    """A chat whose whole history is sent through the router on every message"""
+
+    def __init__(self, router, system_prompt=None, history=None, **options):
+        self.router = router
+        self.options = options
+        self.messages = [{'role': 'system', 'content': system_prompt}] if system_prompt else []
+        self.messages += history or []
+
+    def prompt(self, text, context=None):
+        """Messages sent to the model for the user's next message, with context for this turn only"""
+        extra = [{'role': 'system', 'content': context}] if context else []
+        return self.messages + extra + [{'role': 'user', 'content': text}]
+
+    def add_turn(self, text, reply):
+        self.messages += [{'role': 'user', 'content': text}, {'role': 'assistant', 'content': reply}]
+
+    def send_message(self, text, context=None):
+        """Add the user's message and return the reply text"""
+        reply = self.router.generate(self.prompt(text, context), **self.options)
+        self.add_turn(text, reply)
+        return reply
+
+    def stream_message(self, text, context=None):
+        """Add the user's message and yield the reply piece by piece"""
+        reply = ''
+        for piece in self.router.stream(self.prompt(text, context), **self.options):
+            reply += piece
+            yield piece
+        self.add_turn(text, reply)
+
+_shared_router = None
+_shared_lock = threading.Lock()
+
+def get_router():
+    """The process-wide router, configured from LLM_BACKENDS and LLM_HEDGE_AFTER"""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = LLMRouter(
+                parse_backends(os.getenv("LLM_BACKENDS", DEFAULT_BACKENDS)),
+                hedge_after=float(os.getenv("LLM_HEDGE_AFTER", 4)) or None,
+            )
+        return _shared_router
@@ -1,7 +1,8 @@
 # app.py
 import streamlit as st
-from groq import Groq
 import os
+from chunking import CHUNK_TOKENS, estimate_tokens, map_concurrently, split_text
+from llm_router import LLMRouter, parse_backends
 
 # App configuration
 st.set_page_config(
@@ -10,34 +11,63 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize Groq client
-def get_groq_client():
-    api_key = st.secrets.get("GROQ_API_KEY") or os.getenv("GROQ_API_KEY")
-    if not api_key:
-        st.error("GROQ_API_KEY not found in secrets or environment variables")
+MODEL = "mixtral-8x7b-32768"
+
+# Model router, shared across reruns and sessions until the key changes
+@st.cache_resource
+def _build_router(groq_api_key):
+    # Groq is tried first until latency measurements favour another backend
+    backends = os.getenv("LLM_BACKENDS", f"groq:{MODEL},gemini:gemini-2.0-flash-exp")
+    return LLMRouter(parse_backends(backends, groq_api_key=groq_api_key),
+                     hedge_after=float(os.getenv("LLM_HEDGE_AFTER", 4)) or None)
+
+def get_router():
+    router = _build_router(st.secrets.get("GROQ_API_KEY") or os.getenv("GROQ_API_KEY"))
+    if not router.ranked():
+        st.error("GROQ_API_KEY (or GEMINI_API_KEY) not found in secrets or environment variables")
         return None
-    return Groq(api_key=api_key)
+    return router
 
-# Analysis function
-def analyze_timetable(client, text):
-    system_prompt = """You are an expert academic scheduler. Analyze this timetable score explanation and provide:
+SYSTEM_PROMPT = """You are an expert academic scheduler. Analyze this timetable score explanation and provide:
     1. Constraints breakdown (hard/medium/soft)
     2. Top 3 issues with counts
     3. Specific improvement recommendations
     4. Overall quality assessment
     
     Use markdown formatting with headings, bullet points, and emojis."""
-    
-    response = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Analyze this timetable:\n{text}"}
+
+# Room for the combined answer when a long explanation was analyzed in parts
+MERGE_MAX_TOKENS = 2048
+
+def _complete(router, user_content, max_tokens=1024):
+    return router.generate(
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_content}
         ],
-        model="mixtral-8x7b-32768",
         temperature=0.3,
-        max_tokens=1024
+        max_tokens=max_tokens
+    )
+
+# Analysis function
+def analyze_timetable(router, text):
+    if estimate_tokens(text) <= CHUNK_TOKENS:
+        return _complete(router, f"Analyze this timetable:\n{text}")
+    
+    # Too long for one prompt: analyze the parts concurrently, then combine the partial analyses
+    parts = split_text(text)
+    partials = map_concurrently(
+        lambda part: _complete(router, f"Analyze this part ({part[0]}) of a timetable score explanation:\n{part[1]}"),
+        parts,
+    )
+    combined = "\n\n".join(f"## Analysis of {label}\n{partial}" for (label, _), partial in zip(parts, partials))
+    return _complete(
+        router,
+        "These are analyses of consecutive parts of one timetable score explanation. "
+        "Combine them into a single analysis of the whole timetable, adding up counts "
+        f"and merging duplicate issues:\n\n{combined}",
+        max_tokens=MERGE_MAX_TOKENS,
     )
-    return response.choices[0].message.content
 
 # Main UI
 def main():
@@ -73,13 +103,13 @@ def main():
             st.warning("Please provide a longer score explanation for meaningful analysis")
             return
             
-        client = get_groq_client()
-        if not client:
+        router = get_router()
+        if not router:
             return
             
         with st.spinner("Analyzing timetable..."):
             try:
-                result = analyze_timetable(client, input_text)
+                result = analyze_timetable(router, input_text)
                 st.session_state.analysis_result = result
                 st.experimental_rerun()
             except Exception as e:
@@ -0,0 +1,266 @@
+# Shared PDF renderer for the report apps.
+#
+#   PDF_RENDERER=wkhtmltopdf  pdfkit, as before (default)
+#   PDF_RENDERER=weasyprint   WeasyPrint, in process or in PDF_RENDER_PROCESSES
+#                             warm worker processes that import it once
+#
+# wkhtmltopdf has no server mode, so every render still starts one process;
+# what is saved is the per-call binary lookup (the pdfkit configuration is
+# built once, on the first render) and, above all, rendering at all: finished PDFs are cached on
+# disk under PDF_CACHE_DIR keyed by a hash of the styled HTML, so repeat
+# downloads of a report are a file read. At most PDF_MAX_CONCURRENCY renders
+# run at once so a burst of exports cannot fork a process per request.
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+
+from cache import content_key
+
+ENGINES = ('wkhtmltopdf', 'weasyprint')
+
+def _render_weasyprint(html):
+    from weasyprint import HTML
+    return HTML(string=html).write_pdf()
+
+def _warm_weasyprint():
+    # Process pool initializer: pay WeasyPrint's import cost once per worker
+    import weasyprint  # noqa: F401
+
+class PDFRenderer:
+    """Render HTML to PDF bytes with bounded concurrency and an on-disk result cache.
+
+    With a `cache_dir` the cache is trimmed back to `cache_max_bytes`,
+    least recently used files first.
+    """
+
+    def __init__(self, engine='wkhtmltopdf', max_concurrency=4, cache_dir=None,
+                 cache_max_bytes=500 * 1024 * 1024, processes=0, options=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown PDF renderer {engine!r}, expected one of {ENGINES}")
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.options = options or {'quiet': ''}
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._counters = {'renders': 0, 'cache_hits': 0, 'render_seconds': 0.0, 'cache_bytes_served': 0}
+        self._configuration = None
+        self._executor = None
+        if engine == 'weasyprint' and processes:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=processes, initializer=_warm_weasyprint)
+
+    def _pdfkit_configuration(self):
+        # Looked up on first use, so a missing wkhtmltopdf fails renders, not the renderer itself
+        with self._lock:
+            if self._configuration is None:
+                import pdfkit
+                self._configuration = pdfkit.configuration()
+            return self._configuration
+
+    def check(self):
+        """Raise if this engine cannot render here, e.g. wkhtmltopdf or WeasyPrint's libraries are missing"""
+        if self.engine == 'wkhtmltopdf':
+            self._pdfkit_configuration()
+        else:
+            import weasyprint  # noqa: F401
+
+    def _cache_path(self, html):
+        return os.path.join(self.cache_dir, content_key(self.engine, html) + '.pdf')
+
+    def _render(self, html):
+        if self.engine == 'wkhtmltopdf':
+            import pdfkit
+            return pdfkit.from_string(html, False, configuration=self._pdfkit_configuration(), options=self.options)
+        if self._executor is not None:
+            return self._executor.submit(_render_weasyprint, html).result()
+        return _render_weasyprint(html)
+
+    def render(self, html):
+        """PDF bytes for a complete HTML document"""
+        path = self._cache_path(html) if self.cache_dir else None
+        if path is not None:
+            try:
+                with open(path, 'rb') as f:
+                    pdf = f.read()
+                os.utime(path)
+                with self._lock:
+                    self._counters['cache_hits'] += 1
+                    self._counters['cache_bytes_served'] += len(pdf)
+                return pdf
+            except FileNotFoundError:
+                pass
+
+        with self._slots:
+            start = time.perf_counter()
+            pdf = self._render(html)
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self._counters['renders'] += 1
+            self._counters['render_seconds'] += elapsed
+
+        if path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename, so concurrent readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf)
+            os.replace(tmp_path, path)
+            self._trim_cache()
+        return pdf
+
+    def _trim_cache(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        """Render and cache counters"""
+        with self._lock:
+            renders = self._counters['renders']
+            lookups = renders + self._counters['cache_hits']
+            return {
+                **self._counters,
+                'engine': self.engine,
+                'max_concurrency': self.max_concurrency,
+                'average_render_seconds': self._counters['render_seconds'] / renders if renders else 0.0,
+                'cache_hit_rate': self._counters['cache_hits'] / lookups if lookups else 0.0,
+                'cache_dir': self.cache_dir,
+            }
+
+_shared_renderer = None
+_shared_lock = threading.Lock()
+
+def get_renderer():
+    """The process-wide renderer, configured from the PDF_* environment variables"""
+    global _shared_renderer
+    with _shared_lock:
+        if _shared_renderer is None:
+            _shared_renderer = PDFRenderer(
+                engine=os.getenv("PDF_RENDERER", "wkhtmltopdf"),
+                max_concurrency=int(os.getenv("PDF_MAX_CONCURRENCY", 4)),
+                cache_dir=os.getenv("PDF_CACHE_DIR", "pdf_cache") or None,
+                cache_max_bytes=int(float(os.getenv("PDF_CACHE_MAX_MB", 500)) * 1024 * 1024),
+                processes=int(os.getenv("PDF_RENDER_PROCESSES", 0)),
+            )
+        return _shared_renderer
+
+# Bulk export helpers
+
+def render_all(render, documents, workers=4):
+    """Render documents in parallel, yielding the PDFs in input order.
+
+    At most 2 * `workers` finished PDFs are held ahead of the consumer, so a
+    slow download does not pile up every rendered report in memory.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf') as executor:
+        try:
+            for document in documents:
+                pending.append(executor.submit(render, document))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+def export_filename(index, title):
+    """Safe file name for the index-th report in an archive"""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', title).strip('_')[:60] or 'report'
+    return f"{index:03d}_{slug}.pdf"
+
+class _ZipSink:
+    # Write-only, unseekable sink: zipfile then streams entries with data
+    # descriptors instead of seeking back to patch headers
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def zip_stream(named_pdfs):
+    """Yield a ZIP archive of (file name, PDF bytes) pairs piece by piece"""
+    sink = _ZipSink()
+    # PDFs are already compressed; storing them keeps the export CPU bound on rendering only
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, pdf in named_pdfs:
+            archive.writestr(name, pdf)
+            yield sink.drain()
+    yield sink.drain()
+
+def merge_pdfs(titled_pdfs, path, render_contents=None):
+    """Write (title, PDF bytes) pairs to `path` as one PDF with a bookmark per report.
+
+    `render_contents([(title, first_page), ...])` returns the PDF of a
+    contents page, which is put in front; page numbers are 1-based and
+    already account for the contents pages themselves. Needs pypdf.
+
+    Unlike the ZIP export this is not streamed: pypdf's writer holds every
+    report until the file is written, so memory grows with the export and
+    callers should cap the number of reports (app3 uses
+    EXPORT_MAX_MERGED_REPORTS).
+    """
+    import io
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter()
+    entries = []
+    for title, pdf in titled_pdfs:
+        entries.append((title, len(writer.pages)))
+        writer.append(PdfReader(io.BytesIO(pdf)))
+
+    offset = 0
+    if render_contents is not None and entries:
+        # Contents pages shift every report, so render again if the guess of one page was wrong
+        offset = 1
+        while True:
+            contents = PdfReader(io.BytesIO(render_contents([(title, start + offset + 1) for title, start in entries])))
+            if len(contents.pages) == offset:
+                break
+            offset = len(contents.pages)
+        for i, page in enumerate(contents.pages):
+            writer.insert_page(page, i)
+
+    for title, start in entries:
+        writer.add_outline_item(title, start + offset)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+def file_stream(path, chunk_size=64 * 1024, remove=True):
+    """Yield a file in chunks, deleting it afterwards"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            os.remove(path)
@@ -1,17 +1,10 @@
 from flask import Flask, request, jsonify
-import os
-from groq import Groq
+from llm_pool import LLMTimeout, PoolFull, get_pool
+from llm_router import get_router
+from serving import run_app
 
 app = Flask(__name__)
 
-# Load Groq API key from environment variable or request argument
-GROQ_API_KEY = request.args.get("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")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY environment variable not set or api_key argument not provided")
-
-# Initialize Groq client
-client = Groq(api_key=GROQ_API_KEY)
-
 @app.route('/')
 def home():
     return "Groq JSON Report Generator API is running!"
@@ -22,6 +15,11 @@ def generate_report():
         return jsonify({"error": "Request must be in JSON format"}), 400
     data = request.get_json()
 
+    # Shared model router; Groq and Gemini clients are built once per key
+    router = get_router()
+    if not router.ranked():
+        return jsonify({"error": "GROQ_API_KEY (or GEMINI_API_KEY) environment variable not set"}), 500
+
     try:
         user_name = data.get("user_name", "User")
         topic = data.get("topic", "no topic provided")
@@ -43,26 +41,28 @@ def generate_report():
 Provide the summary in a format that is easy for a non-technical user to understand.
         """
 
-        # Call Groq LLM (using Mixtral model)
-        response = client.chat.completions.create(
-            model="mixtral-8x7b-32768",  # or llama3-8b-8192 / gemma-7b-it
-            messages=[
+        # Call the fastest healthy backend (LLM_BACKENDS, Groq Mixtral by default among them)
+        llm_reply = get_pool().call(
+            router.generate,
+            [
                 {"role": "system", "content": "You are a helpful report generator."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7
         )
 
-        llm_reply = response.choices[0].message.content
-
         return jsonify({
             "status": "success",
             "generated_report": llm_reply
         })
 
+    except PoolFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except LLMTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    run_app(app)
 
@@ -0,0 +1,506 @@
+# Local parsing and rule checks for pasted schedules.
+#
+# Schedule text (CSV/TSV, markdown or whitespace tables, a wide
+# "Time | Monday | Tuesday" grid, or JSON such as spreader output) is parsed
+# into sessions, then checked for clashes (a teacher, room or student group
+# booked twice at once; without a group column the whole schedule counts as
+# one group), idle gaps, missing days and overloaded days. When the rules
+# settle the outcome on their own (a clash makes the schedule Unacceptable; a
+# schedule whose every column and row was understood and that has no findings
+# is Acceptable) the report is written here without a model call; otherwise
+# only a compact summary and the rows that could not be parsed go to the model.
+import csv
+import io
+import json
+import re
+from collections import defaultdict, namedtuple
+
+MAX_GAP_MINUTES = 120
+MAX_TEACHER_SESSIONS_PER_DAY = 6
+MAX_GROUP_SESSIONS_PER_DAY = 8
+DEFAULT_DURATION = 60
+# Sessions listed in the summary sent to the model; the rest are only counted
+MAX_SUMMARY_SESSIONS = 200
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+COLUMN_ALIASES = {
+    'day': ('day', 'weekday', 'date'),
+    'time': ('time', 'timeslot', 'time slot', 'hours'),
+    'start': ('start', 'start time', 'from', 'begins'),
+    'end': ('end', 'end time', 'to', 'until', 'ends'),
+    'period': ('period', 'slot', 'lesson', 'hour'),
+    'subject': ('subject', 'course', 'module', 'class', 'lecture', 'activity', 'name'),
+    'teacher': ('teacher', 'instructor', 'lecturer', 'faculty', 'professor', 'staff', 'tutor'),
+    'room': ('room', 'venue', 'location', 'hall', 'lab'),
+    'group': ('group', 'section', 'batch', 'cohort', 'division', 'year'),
+    'department': ('department', 'dept', 'school', 'programme', 'program'),
+}
+
+# Words that only qualify a column name: "Teacher Name", "Room No", "Subject Code"
+COLUMN_QUALIFIERS = ('name', 'names', 'no', 'num', 'number', 'id', 'code', 'title')
+
+Session = namedtuple('Session', 'day start end subject teacher room group')
+# Sessions, raw rows that could not be parsed and non-empty headers that were not recognized
+ParsedSchedule = namedtuple('ParsedSchedule', 'sessions ambiguous unmapped')
+Issue = namedtuple('Issue', 'severity kind message action')
+
+def normalize_day(value):
+    """Canonical day name ("Monday", "Day 3"), or None"""
+    if isinstance(value, int):
+        return f"Day {value + 1}"
+    text = str(value).strip().lower()
+    for day in WEEKDAYS:
+        if text[:3] == day[:3].lower() and day.lower().startswith(text[:len(day)]):
+            return day
+    match = re.fullmatch(r'(?:day|d)\s*(\d+)', text)
+    return f"Day {int(match.group(1))}" if match else None
+
+def _day_order(day):
+    if day in WEEKDAYS:
+        return (0, WEEKDAYS.index(day))
+    return (1, int(day.split()[1]))
+
+_TIME = re.compile(r'^(\d{1,2})(?:[:.h](\d{2}))?\s*([ap])?\.?\s*m?\.?$', re.I)
+
+def parse_time(text):
+    """Minutes after midnight for "9", "9:30", "09.30", "2pm", "14:00"; None otherwise"""
+    match = _TIME.match(str(text).strip())
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), (match.group(3) or '').lower()
+    if meridiem == 'p' and hour < 12:
+        hour += 12
+    elif meridiem == 'a' and hour == 12:
+        hour = 0
+    elif not meridiem and 1 <= hour < 7:
+        # Bare "1:00" in a timetable means the afternoon
+        hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+def parse_time_range(text):
+    """(start, end) in minutes for "9:00-10:30", "9am to 11am" or a single start time"""
+    parts = [p for p in re.split(r'\s*(?:-|–|—|\bto\b)\s*', str(text).strip(), flags=re.I) if p]
+    if not 1 <= len(parts) <= 2:
+        return None
+    start = parse_time(parts[0])
+    if start is None:
+        return None
+    if len(parts) == 1:
+        return start, start + DEFAULT_DURATION
+    end = parse_time(parts[1])
+    if end is None:
+        return None
+    if end <= start and end + 12 * 60 > start:
+        end += 12 * 60
+    return (start, end) if end > start else None
+
+def parse_period(text):
+    """(start, end) for period number n, as the n-th hour so gaps count in periods"""
+    match = re.fullmatch(r'(?:p|period|slot|lesson)?\s*(\d+)', str(text).strip(), re.I)
+    if not match:
+        return None
+    n = int(match.group(1))
+    return n * 60, n * 60 + 60
+
+def format_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def _alias_column(name):
+    for column, aliases in COLUMN_ALIASES.items():
+        if name in aliases:
+            return column
+    return None
+
+def canonical_column(header):
+    """Canonical column name for a header ("Teacher Name" -> "teacher"), or None"""
+    header = re.sub(r'[^a-z ]', '', str(header).strip().lower()).strip()
+    column = _alias_column(header)
+    if column or not header:
+        return column
+    # Otherwise the last word that names a column decides, as in "Class Teacher" or "Rooms"
+    words = [word for word in header.split() if word not in COLUMN_QUALIFIERS]
+    for word in reversed(words):
+        column = _alias_column(word) or (_alias_column(word[:-1]) if word.endswith('s') else None)
+        if column:
+            return column
+    return None
+
+def _session(record):
+    # Session from a dict keyed by canonical column names, or None when day or time is missing
+    day = normalize_day(record['day']) if record.get('day') not in (None, '') else None
+    interval = None
+    if record.get('start') not in (None, ''):
+        start = parse_time(record['start'])
+        end = parse_time(record['end']) if record.get('end') not in (None, '') else None
+        if start is not None:
+            interval = (start, end if end is not None and end > start else start + DEFAULT_DURATION)
+    elif record.get('time') not in (None, ''):
+        interval = parse_time_range(record['time'])
+    elif record.get('period') not in (None, ''):
+        interval = parse_period(record['period'])
+    if day is None or interval is None:
+        return None
+
+    def text(column):
+        value = record.get(column)
+        return str(value).strip() or None if value is not None else None
+
+    return Session(day, interval[0], interval[1], text('subject') or 'Session', text('teacher'), text('room'), text('group'))
+
+def split_rows(text):
+    """Rows of cells for markdown/pipe tables, delimited text or whitespace-aligned tables"""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return []
+    if sum('|' in line for line in lines) >= len(lines) / 2:
+        rows = []
+        for line in lines:
+            if re.fullmatch(r'[\s|:+-]+', line):
+                continue  # markdown separator row
+            rows.append([cell.strip() for cell in line.strip().strip('|').split('|')])
+        return rows
+    try:
+        dialect = csv.Sniffer().sniff('\n'.join(lines[:20]), delimiters=',;\t')
+        rows = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO('\n'.join(lines)), dialect)]
+        if len(rows[0]) > 1:
+            return rows
+    except csv.Error:
+        pass
+    return [re.split(r'\s{2,}|\t', line.strip()) for line in lines]
+
+def _parse_rows(rows):
+    # ParsedSchedule from a header row plus data rows, or None
+    if len(rows) < 2:
+        return None
+    header = rows[0]
+    columns = [canonical_column(cell) for cell in header]
+    day_columns = [i for i, cell in enumerate(header) if normalize_day(cell) and canonical_column(cell) is None]
+    sessions, ambiguous = [], []
+
+    if len(day_columns) >= 2:
+        # Wide grid: one time column, one column per day, subjects in the cells
+        time_index = next((i for i, column in enumerate(columns) if column in ('time', 'period', 'start')), 0)
+        unmapped = [cell for i, cell in enumerate(header)
+                    if cell.strip() and i != time_index and i not in day_columns]
+        for row in rows[1:]:
+            if time_index >= len(row):
+                continue
+            interval = parse_time_range(row[time_index]) or parse_period(row[time_index])
+            for i in day_columns:
+                cell = row[i].strip() if i < len(row) else ''
+                if not cell or cell in ('-', '—'):
+                    continue
+                if interval is None:
+                    ambiguous.append(f"{header[i]} {row[time_index]}: {cell}")
+                    continue
+                sessions.append(Session(normalize_day(header[i]), interval[0], interval[1], cell, None, None, None))
+        return ParsedSchedule(sessions, ambiguous, unmapped)
+
+    if 'day' not in columns or not {'time', 'start', 'period'} & set(columns):
+        return None
+    unmapped = [cell for cell, column in zip(header, columns) if cell.strip() and column is None]
+    for row in rows[1:]:
+        record = {column: row[i] for i, column in enumerate(columns) if column and i < len(row)}
+        session = _session(record)
+        if session is None:
+            ambiguous.append(' | '.join(row))
+        else:
+            sessions.append(session)
+    return ParsedSchedule(sessions, ambiguous, unmapped)
+
+def _parse_json(data):
+    # ParsedSchedule from JSON records, a {day: [records]} map or spreader output
+    if isinstance(data, dict):
+        for key in ('sessions', 'timetable', 'schedule', 'events'):
+            if key in data:
+                return _parse_json(data[key])
+        if all(normalize_day(day) and isinstance(items, list) for day, items in data.items()):
+            data = [{**item, 'day': day} for day, items in data.items() for item in items if isinstance(item, dict)]
+        else:
+            return None
+    if not isinstance(data, list):
+        return None
+    if data and all(isinstance(day, list) for day in data):
+        # Spreader output: a list of days, each a list of events
+        data = [{**event, 'day': event.get('day', d)} for d, events in enumerate(data) for event in events]
+
+    sessions, ambiguous, unmapped = [], [], {}
+    for item in data:
+        if not isinstance(item, dict):
+            return None
+        record = {}
+        for key, value in item.items():
+            column = canonical_column(key)
+            if column is None and str(key).strip():
+                unmapped[key] = True
+            elif column and column not in record:
+                record[column] = value
+        if isinstance(record.get('day'), int):
+            record['day'] = f"Day {record['day'] + 1}"
+        session = _session(record)
+        if session is None:
+            ambiguous.append(json.dumps(item))
+        else:
+            sessions.append(session)
+    return ParsedSchedule(sessions, ambiguous, list(unmapped))
+
+def parse_schedule(text):
+    """ParsedSchedule for schedule text, or None when it is not a recognizable table"""
+    text = text.strip()
+    if not text:
+        return None
+    if text[0] in '[{':
+        try:
+            parsed = _parse_json(json.loads(text))
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            # Valid schedule JSON with no usable session ({}, [], {"sessions": []}) is not a schedule either
+            return parsed if parsed.sessions else None
+    parsed = _parse_rows(split_rows(text))
+    if parsed is None or not parsed.sessions:
+        return None
+    return parsed
+
+def _describe(session):
+    details = ', '.join(filter(None, [session.teacher, session.room, session.group]))
+    return (f"{session.day} {format_time(session.start)}-{format_time(session.end)} {session.subject}"
+            + (f" ({details})" if details else ''))
+
+def _overlaps(sessions, key):
+    # (key, day, earlier session, later session) for every pair of overlapping sessions sharing a key
+    by_key = defaultdict(list)
+    for session in sessions:
+        if key(session):
+            by_key[(key(session), session.day)].append(session)
+    for (value, day), booked in by_key.items():
+        booked.sort(key=lambda s: s.start)
+        active = []
+        for session in booked:
+            active = [other for other in active if other.end > session.start]
+            for other in active:
+                yield value, day, other, session
+            active.append(session)
+
+def _times(session):
+    return f"{session.subject} ({format_time(session.start)}-{format_time(session.end)})"
+
+def _clashes(sessions, attribute, label):
+    return [
+        Issue('critical', f'{attribute}_clash',
+              f"{label} {key} is double-booked on {day}: {_times(other)} and {_times(session)}",
+              f"Move {session.subject} on {day} to a slot where {label.lower()} {key} is free")
+        for key, day, other, session in _overlaps(sessions, lambda s: getattr(s, attribute))
+    ]
+
+def _schedule_clashes(sessions):
+    # Without a group column the schedule is one group's. Overlaps are clashes, unless teachers
+    # or rooms are given, when they may be parallel classes and only the model can tell
+    parallel = any(session.teacher or session.room for session in sessions)
+    return [
+        Issue('warning' if parallel else 'critical', 'overlap',
+              f"Sessions overlap on {day}: {_times(other)} and {_times(session)}",
+              f"Move {session.subject} on {day} to a free slot" + (" unless it is for a different group"
+                                                                     if parallel else ''))
+        for _, day, other, session in _overlaps(sessions, lambda s: 'all')
+    ]
+
+def check_sessions(sessions):
+    """Rule findings for parsed sessions, critical ones first"""
+    issues = []
+    issues += _clashes(sessions, 'teacher', 'Teacher')
+    issues += _clashes(sessions, 'room', 'Room')
+    if any(session.group for session in sessions):
+        issues += _clashes(sessions, 'group', 'Group')
+    else:
+        issues += _schedule_clashes(sessions)
+    issues.sort(key=lambda issue: issue.severity != 'critical')
+
+    days = {session.day for session in sessions}
+    if days and all(day in WEEKDAYS for day in days):
+        expected = [day for day in WEEKDAYS[:5]] + [day for day in WEEKDAYS[5:] if day in days]
+    else:
+        numbers = [_day_order(day)[1] for day in days if day not in WEEKDAYS]
+        expected = [f"Day {n}" for n in range(1, max(numbers) + 1)] if numbers else []
+    for day in expected:
+        if day not in days:
+            issues.append(Issue('warning', 'missing_day', f"No sessions are scheduled on {day}",
+                                f"Use {day} to take load off the busiest days"))
+
+    by_group_day = defaultdict(list)
+    for session in sessions:
+        by_group_day[(session.group or 'all', session.day)].append(session)
+    for (group, day), booked in sorted(by_group_day.items(), key=lambda item: (item[0][0], _day_order(item[0][1]))):
+        booked.sort(key=lambda s: s.start)
+        latest_end = booked[0].end
+        for session in booked[1:]:
+            if session.start - latest_end > MAX_GAP_MINUTES:
+                who = 'the schedule' if group == 'all' else f"group {group}"
+                issues.append(Issue(
+                    'warning', 'gap',
+                    f"{who[0].upper() + who[1:]} has a {(session.start - latest_end) / 60:g} hour gap on {day} "
+                    f"between {format_time(latest_end)} and {format_time(session.start)}",
+                    f"Move {session.subject} on {day} earlier to close the gap",
+                ))
+            latest_end = max(latest_end, session.end)
+        if group != 'all' and len(booked) > MAX_GROUP_SESSIONS_PER_DAY:
+            issues.append(Issue('warning', 'overload',
+                                f"Group {group} has {len(booked)} sessions on {day}",
+                                f"Spread group {group}'s {day} sessions over lighter days"))
+
+    by_teacher_day = defaultdict(int)
+    for session in sessions:
+        if session.teacher:
+            by_teacher_day[(session.teacher, session.day)] += 1
+    for (teacher, day), count in sorted(by_teacher_day.items(), key=lambda item: (item[0][0], _day_order(item[0][1]))):
+        if count > MAX_TEACHER_SESSIONS_PER_DAY:
+            issues.append(Issue('warning', 'overload', f"Teacher {teacher} teaches {count} sessions on {day}",
+                                f"Move some of {teacher}'s {day} sessions to lighter days"))
+    return issues
+
+REPORT_SECTIONS = ('critical', 'problems', 'valid', 'priority', 'secondary', 'next_steps')
+
+def format_report(report_id, current_datetime, status, sections):
+    """SCHEDULE EVALUATION REPORT text from a status and bullet lists keyed by REPORT_SECTIONS"""
+    def bullets(name):
+        lines = sections.get(name) or []
+        return '\n'.join(f"- {line}" for line in lines) if lines else "- None"
+
+    generation = f"#{report_id}" if report_id else ''
+    return f"""SCHEDULE EVALUATION REPORT
+
+Generation: {generation}
+
+Date/Time: {current_datetime}
+
+CRITICAL ISSUES
+
+{bullets('critical')}
+
+SCHEDULE STATUS: {status}
+
+IDENTIFIED PROBLEMS
+
+{bullets('problems')}
+
+VALID SCHEDULE ELEMENTS
+
+{bullets('valid')}
+
+RECOMMENDED ACTIONS
+
+1. Priority Resolution
+
+{bullets('priority')}
+
+2. Secondary Adjustments
+
+{bullets('secondary')}
+
+NEXT STEPS
+
+{bullets('next_steps')}
+"""
+
+class ScheduleCheck:
+    """Parsed sessions, the rows and columns that could not be parsed and the rule findings"""
+
+    def __init__(self, sessions, ambiguous, issues, unmapped=()):
+        self.sessions = sessions
+        self.ambiguous = ambiguous
+        self.issues = issues
+        self.unmapped = list(unmapped)
+
+    @property
+    def critical(self):
+        return [issue for issue in self.issues if issue.severity == 'critical']
+
+    @property
+    def decided(self):
+        """True when the rules alone settle the status: any clash, or a fully parsed clean schedule.
+
+        Fully parsed means every row became a session and every column was
+        recognized, so the clash checks saw everything the schedule says.
+        """
+        if not self.sessions:
+            return False
+        return bool(self.critical) or (not self.issues and not self.ambiguous and not self.unmapped)
+
+    @property
+    def status(self):
+        return 'Unacceptable' if self.critical else 'Acceptable'
+
+    def _valid_elements(self):
+        kinds = {issue.kind for issue in self.issues}
+        days = sorted({session.day for session in self.sessions}, key=_day_order)
+        valid = [f"{len(self.sessions)} sessions across {len(days)} days ({', '.join(days)})"]
+        checks = [
+            ('teacher_clash', 'teacher', "No teacher is double-booked"),
+            ('room_clash', 'room', "No room is double-booked"),
+            ('group_clash', 'group', "No student group has overlapping sessions"),
+        ]
+        for kind, attribute, text in checks:
+            if kind not in kinds and any(getattr(session, attribute) for session in self.sessions):
+                valid.append(text)
+        if 'overlap' not in kinds and not any(session.group for session in self.sessions):
+            valid.append("No sessions overlap")
+        if 'gap' not in kinds:
+            valid.append(f"No idle gaps longer than {MAX_GAP_MINUTES / 60:g} hours")
+        if 'missing_day' not in kinds:
+            valid.append("Every working day is used")
+        if 'overload' not in kinds:
+            valid.append("No teacher or group has an overloaded day")
+        return valid
+
+    def report(self, report_id, current_datetime):
+        """The evaluation report, in the same format the model is asked for"""
+        critical = self.critical
+        secondary = [issue for issue in self.issues if issue.severity != 'critical']
+        return format_report(report_id, current_datetime, self.status, {
+            'critical': [issue.message for issue in critical],
+            'problems': [issue.message for issue in self.issues],
+            'valid': self._valid_elements(),
+            'priority': list(dict.fromkeys(issue.action for issue in critical)),
+            'secondary': list(dict.fromkeys(issue.action for issue in secondary)),
+            'next_steps': (["Resolve the clashes above and evaluate the schedule again"] if critical else
+                           ["Keep the schedule as is and re-check it after any change"]),
+        })
+
+    def summary(self, sessions=True):
+        """Compact description of the schedule and the rule findings, for the model prompt"""
+        days = sorted({session.day for session in self.sessions}, key=_day_order)
+        teachers = {session.teacher for session in self.sessions if session.teacher}
+        rooms = {session.room for session in self.sessions if session.room}
+        groups = {session.group for session in self.sessions if session.group}
+        lines = [
+            f"Parsed {len(self.sessions)} sessions over {len(days)} days, {len(teachers)} teachers, "
+            f"{len(rooms)} rooms and {len(groups)} groups.",
+            "Sessions per day: " + ', '.join(
+                f"{day} {sum(session.day == day for session in self.sessions)}" for day in days),
+            "",
+            "Automatic checks found:" if self.issues else "Automatic checks found no clashes, gaps or overloads.",
+        ]
+        lines += [f"- [{issue.severity}] {issue.message}" for issue in self.issues]
+        if self.unmapped:
+            lines += ["", "Columns not checked automatically: " + ', '.join(map(str, self.unmapped))]
+        if self.ambiguous:
+            lines += ["", "Rows that could not be parsed automatically (please interpret them):"]
+            lines += [f"  {row}" for row in self.ambiguous]
+        if not sessions:
+            return '\n'.join(lines)
+        lines += ["", "Sessions:"]
+        ordered = sorted(self.sessions, key=lambda s: (_day_order(s.day), s.start))
+        lines += [f"  {_describe(session)}" for session in ordered[:MAX_SUMMARY_SESSIONS]]
+        if len(ordered) > MAX_SUMMARY_SESSIONS:
+            lines.append(f"  ... and {len(ordered) - MAX_SUMMARY_SESSIONS} more sessions")
+        return '\n'.join(lines)
+
+def check_schedule(text):
+    """ScheduleCheck for schedule text, or None when the text could not be parsed"""
+    parsed = parse_schedule(text)
+    if parsed is None:
+        return None
+    return ScheduleCheck(parsed.sessions, parsed.ambiguous, check_sessions(parsed.sessions), parsed.unmapped)
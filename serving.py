@@ -0,0 +1,41 @@
+# Pick how the Flask apps are served.
+#
+#   APP_SERVER=dev       Flask's debug server (default, as before)
+#   APP_SERVER=waitress  production WSGI server with APP_THREADS request threads
+#                        (an optional dependency: pip install waitress)
+#
+# Model calls run in the bounded llm_pool, so request threads mostly sit
+# waiting on a future; a few hundred of them are cheap and let one process
+# hold hundreds of concurrent evaluations, while llm_pool caps how many
+# actually hit the model and turns the overflow away with 503.
+import os
+
+def run_app(app, on_start=None):
+    """Serve a Flask app with the server selected by APP_SERVER.
+
+    on_start (such as starting job workers) runs once, in the process that
+    serves requests: not at import, and not in the debug reloader's parent.
+    """
+    server = os.getenv("APP_SERVER", "dev")
+    host = os.getenv("APP_HOST", "127.0.0.1")
+    port = int(os.getenv("APP_PORT", 5000))
+    if server not in ("dev", "waitress"):
+        raise ValueError(f"Unknown APP_SERVER {server!r}, expected 'dev' or 'waitress'")
+    if on_start and (server != "dev" or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+        on_start()
+    if server == "dev":
+        app.run(debug=True, host=host, port=port)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            raise RuntimeError("APP_SERVER=waitress needs the waitress package: pip install waitress") from None
+        threads = int(os.getenv("APP_THREADS", 256))
+        serve(
+            app,
+            host=host,
+            port=port,
+            threads=threads,
+            connection_limit=int(os.getenv("APP_CONNECTION_LIMIT", threads * 4)),
+            channel_timeout=int(os.getenv("APP_CHANNEL_TIMEOUT", 300)),
+        )
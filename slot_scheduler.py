@@ -0,0 +1,295 @@
+# Period-level scheduling on top of the spreader engine.
+#
+# Every event gets a day, a period (slot) and a room. Teachers, student
+# groups and rooms can only be in one place per slot, rooms must be big
+# enough and of the right type, and teachers are only booked when they are
+# available; these are hard constraints. Spreading lectures and practicals
+# evenly over the days stays the soft objective, scored exactly like
+# spreader_engine.optimize_timetable.
+#
+# Occupancy is kept as one bitset (a Python int with num_days * slots_per_day
+# bits) per teacher, group and room, so finding the free slots shared by a
+# teacher, a group and a set of rooms is a handful of AND/OR operations.
+import random
+
+from spreader_engine import (
+    EVENT_TYPES,
+    LECTURE,
+    PRACTICAL,
+    TimetableModel,
+    lower_bound,
+)
+
+class SlotTimetable:
+    """Events placed on (day, slot, room), held as parallel integer arrays.
+
+    Subjects, teachers, groups and rooms are integer coded by their index in
+    the matching name list; a room or teacher code of -1 means none.
+    """
+
+    def __init__(self, num_days, slots_per_day, subjects, teachers, groups, rooms, events):
+        import numpy as np
+        self.num_days = num_days
+        self.slots_per_day = slots_per_day
+        self.subjects = subjects
+        self.teachers = teachers
+        self.groups = groups
+        self.rooms = rooms
+        columns = list(zip(*events)) if events else [()] * 7
+        (self.ev_subject, self.ev_type, self.ev_teacher, self.ev_group,
+         self.ev_day, self.ev_slot, self.ev_room) = (np.array(c, dtype=np.int32) for c in columns)
+        self.info = {}
+
+    @property
+    def placed(self):
+        """Boolean mask of the events that got a slot"""
+        return self.ev_day >= 0
+
+    def to_model(self):
+        """Day-level TimetableModel of the placed events, for scoring and the Streamlit views"""
+        import numpy as np
+        model = TimetableModel(self.subjects, self.num_days)
+        placed = self.placed
+        np.add.at(model.counts, (self.ev_type[placed], self.ev_day[placed], self.ev_subject[placed]), 1)
+        return model
+
+    def score(self):
+        return self.to_model().score()
+
+    def to_events(self):
+        """Export as a list of days, each a list of event dicts sorted by slot"""
+        timetable = [[] for _ in range(self.num_days)]
+        for i in self.placed.nonzero()[0]:
+            timetable[self.ev_day[i]].append({
+                'subject': self.subjects[self.ev_subject[i]],
+                'type': EVENT_TYPES[self.ev_type[i]],
+                'day': int(self.ev_day[i]),
+                'slot': int(self.ev_slot[i]),
+                'room': self.rooms[self.ev_room[i]] if self.ev_room[i] >= 0 else None,
+                'teacher': self.teachers[self.ev_teacher[i]] if self.ev_teacher[i] >= 0 else None,
+                'group': self.groups[self.ev_group[i]],
+            })
+        for day_events in timetable:
+            day_events.sort(key=lambda e: e['slot'])
+        return timetable
+
+    def unplaced_events(self):
+        """Events no slot could be found for, as event dicts without a day"""
+        return [
+            {
+                'subject': self.subjects[self.ev_subject[i]],
+                'type': EVENT_TYPES[self.ev_type[i]],
+                'teacher': self.teachers[self.ev_teacher[i]] if self.ev_teacher[i] >= 0 else None,
+                'group': self.groups[self.ev_group[i]],
+            }
+            for i in (~self.placed).nonzero()[0]
+        ]
+
+def _slot_mask(slots, num_days, slots_per_day):
+    # Bitset of (day, slot) pairs; a slot of None means the whole day
+    mask = 0
+    for entry in slots:
+        day, slot = (list(entry) + [None])[:2]
+        if not 0 <= day < num_days:
+            continue
+        if slot is None:
+            mask |= ((1 << slots_per_day) - 1) << (day * slots_per_day)
+        elif 0 <= slot < slots_per_day:
+            mask |= 1 << (day * slots_per_day + slot)
+    return mask
+
+def schedule_slots(subjects_data, num_days, slots_per_day, rooms=None, teachers=None, seed=None, rebalance_rounds=2):
+    """Place every lecture and practical on a day, a slot and a room.
+
+    Subjects take the usual `name`, `lectures` and `has_practical` keys plus
+    optional `teacher`, `group` (student group, default one shared group)
+    and `students` (class size, default 0). `rooms` is a list of
+    {"name", "capacity", "type"} dicts where type is "lecture",
+    "practical" or None for both; without rooms there is no room
+    constraint. `teachers` maps a teacher name to {"unavailable": [[day,
+    slot], [day], ...]}, where a bare day blocks the whole day.
+
+    Events are placed most constrained first on the feasible day with the
+    fewest events of their type, then single events are moved from busy to
+    quiet days while that stays feasible. Events that cannot be placed are
+    left unplaced and listed in `info["unplaced"]`.
+    """
+    rng = random.Random(seed)
+    rooms = rooms or []
+    teachers = teachers or {}
+    total_slots = num_days * slots_per_day
+    everything = (1 << total_slots) - 1
+    day_masks = [((1 << slots_per_day) - 1) << (d * slots_per_day) for d in range(num_days)]
+
+    subject_names = list(dict.fromkeys(subj["name"] for subj in subjects_data))
+    teacher_names = list(dict.fromkeys(
+        [name for name in teachers] + [subj["teacher"] for subj in subjects_data if subj.get("teacher")]
+    ))
+    group_names = list(dict.fromkeys(subj.get("group", "all") for subj in subjects_data)) or ["all"]
+    subject_codes = {name: i for i, name in enumerate(subject_names)}
+    teacher_codes = {name: i for i, name in enumerate(teacher_names)}
+    group_codes = {name: i for i, name in enumerate(group_names)}
+
+    # Free-slot bitsets; a set bit means the slot is still free
+    teacher_free = [
+        everything & ~_slot_mask(teachers.get(name, {}).get("unavailable", []), num_days, slots_per_day)
+        for name in teacher_names
+    ]
+    group_free = [everything] * len(group_names)
+    room_free = [everything] * len(rooms)
+
+    # Candidate rooms per (event type, class size), smallest first for best fit
+    rooms_by_capacity = sorted(range(len(rooms)), key=lambda r: rooms[r].get("capacity", 0))
+    room_candidates = {}
+
+    def candidate_rooms(t, size):
+        key = (t, size)
+        if key not in room_candidates:
+            room_candidates[key] = [
+                r for r in rooms_by_capacity
+                if rooms[r].get("capacity", 0) >= size and rooms[r].get("type") in (None, EVENT_TYPES[t])
+            ]
+        return room_candidates[key]
+
+    # Expand subjects into events: (subject, type, teacher, group, size)
+    events = []
+    lecture_totals = [0] * len(subject_names)
+    for subj in subjects_data:
+        s = subject_codes[subj["name"]]
+        teacher = teacher_codes[subj["teacher"]] if subj.get("teacher") else -1
+        group = group_codes[subj.get("group", "all")]
+        size = subj.get("students", 0)
+        lecture_totals[s] += subj["lectures"]
+        events.extend((s, LECTURE, teacher, group, size) for _ in range(subj["lectures"]))
+        if subj["has_practical"]:
+            events.append((s, PRACTICAL, teacher, group, size))
+    lecture_caps = [max(1, -(-total // num_days)) for total in lecture_totals]
+
+    # Most constrained first: fewest rooms, then least available teacher, then biggest class
+    def tightness(event):
+        s, t, teacher, group, size = event
+        num_rooms = len(candidate_rooms(t, size)) if rooms else 0
+        teacher_slots = bin(teacher_free[teacher]).count("1") if teacher >= 0 else total_slots
+        return (num_rooms, teacher_slots, -size, rng.random())
+    order = sorted(range(len(events)), key=lambda i: tightness(events[i]))
+
+    loads = [[0] * num_days for _ in EVENT_TYPES]
+    subject_lecture_days = [[0] * num_days for _ in subject_names]
+    placement = [(-1, -1, -1)] * len(events)
+
+    def free_slots(i, exclude_day=None):
+        # Bitset of slots where event i could go, and its candidate rooms
+        s, t, teacher, group, size = events[i]
+        free = group_free[group]
+        if teacher >= 0:
+            free &= teacher_free[teacher]
+        candidates = candidate_rooms(t, size) if rooms else None
+        if candidates is not None:
+            room_union = 0
+            for r in candidates:
+                room_union |= room_free[r]
+            free &= room_union
+        if t == LECTURE:
+            for d in range(num_days):
+                if subject_lecture_days[s][d] >= lecture_caps[s] and d != exclude_day:
+                    free &= ~day_masks[d]
+        return free, candidates
+
+    def book(i, day, slot, room):
+        s, t, teacher, group, _ = events[i]
+        bit = 1 << (day * slots_per_day + slot)
+        group_free[group] &= ~bit
+        if teacher >= 0:
+            teacher_free[teacher] &= ~bit
+        if room >= 0:
+            room_free[room] &= ~bit
+        loads[t][day] += 1
+        if t == LECTURE:
+            subject_lecture_days[s][day] += 1
+        placement[i] = (day, slot, room)
+
+    def release(i):
+        s, t, teacher, group, _ = events[i]
+        day, slot, room = placement[i]
+        bit = 1 << (day * slots_per_day + slot)
+        group_free[group] |= bit
+        if teacher >= 0:
+            teacher_free[teacher] |= bit
+        if room >= 0:
+            room_free[room] |= bit
+        loads[t][day] -= 1
+        if t == LECTURE:
+            subject_lecture_days[s][day] -= 1
+        placement[i] = (-1, -1, -1)
+
+    def pick(day_free, candidates):
+        # Earliest free slot of the day and the smallest room free in it
+        slot_bit = day_free & -day_free
+        index = slot_bit.bit_length() - 1
+        room = -1
+        if candidates is not None:
+            room = next(r for r in candidates if room_free[r] & slot_bit)
+        return index % slots_per_day, room
+
+    # Greedy placement on the least loaded feasible day
+    for i in order:
+        t = events[i][1]
+        free, candidates = free_slots(i)
+        if not free:
+            continue
+        days = sorted(range(num_days), key=lambda d: (loads[t][d], rng.random()))
+        for day in days:
+            day_free = free & day_masks[day]
+            if day_free:
+                slot, room = pick(day_free, candidates)
+                book(i, day, slot, room)
+                break
+
+    # Even out the days: move events from the busiest days to quieter ones
+    for _ in range(rebalance_rounds):
+        moved = False
+        for t in range(len(EVENT_TYPES)):
+            by_day = {}
+            for i, (day, _, _) in enumerate(placement):
+                if day >= 0 and events[i][1] == t:
+                    by_day.setdefault(day, []).append(i)
+            for hi in sorted(range(num_days), key=lambda d: -loads[t][d]):
+                for i in by_day.get(hi, []):
+                    if placement[i][0] != hi:
+                        continue
+                    quiet = [d for d in range(num_days) if loads[t][d] + 1 < loads[t][hi]]
+                    if not quiet:
+                        break
+                    free, candidates = free_slots(i, exclude_day=hi)
+                    for day in sorted(quiet, key=lambda d: loads[t][d]):
+                        day_free = free & day_masks[day]
+                        if day_free:
+                            release(i)
+                            slot, room = pick(day_free, candidates)
+                            book(i, day, slot, room)
+                            moved = True
+                            break
+        if not moved:
+            break
+
+    result = SlotTimetable(
+        num_days,
+        slots_per_day,
+        subject_names,
+        teacher_names,
+        group_names,
+        [room["name"] for room in rooms],
+        [event[:4] + placement[i] for i, event in enumerate(events)],
+    )
+    score = result.score()
+    bound = lower_bound(subjects_data, num_days)
+    unplaced = result.unplaced_events()
+    result.info = {
+        'solver': 'slots',
+        'score': score,
+        'lower_bound': bound,
+        'gap': max(0.0, score - bound),
+        'placed': len(events) - len(unplaced),
+        'unplaced': unplaced,
+    }
+    return result
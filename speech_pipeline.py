@@ -0,0 +1,300 @@
+# Staged speech pipeline for the voice support bot.
+#
+# Each stage runs on its own thread and hands work to the next through a
+# queue:
+#
+#   audio -> recognize -> respond (streamed) -> sentences -> synthesize -> play
+#
+# The reply is split at sentence boundaries while it is still being
+# generated, so the first sentence is synthesized and playing while the
+# rest is still being written and synthesized. Time to the first spoken
+# word is then about one sentence of generation and synthesis instead of
+# the whole round trip.
+#
+# Every stage is a plain callable, so any of them can be replaced by the
+# stubs at the bottom of this file to run the pipeline offline:
+#
+#   python speech_pipeline.py "How do I add holidays?" "How do I export?"
+import argparse
+import queue
+import re
+import statistics
+import threading
+import time
+
+# Sentence ends: . ! or ? (plus closing quotes or brackets) before whitespace, or a line break
+_BOUNDARY = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n+')
+_STOP = object()
+_END = object()
+
+def speakable(text):
+    """Text with markdown markup removed, for reading aloud"""
+    text = re.sub(r'\[([^\]]+)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'[*_`#>]+', '', text)
+    text = re.sub(r'^\s*(?:[-•]|\d+[.)])\s+', '', text, flags=re.M)
+    return ' '.join(text.split())
+
+class SentenceSplitter:
+    """Turn streamed text into complete sentences as soon as each one ends"""
+
+    def __init__(self, min_chars=20):
+        # Shorter sentences ("Sure!") are joined with the next so synthesis is not too choppy
+        self.min_chars = min_chars
+        self.buffer = ''
+
+    def feed(self, text):
+        """Sentences completed by this piece of text"""
+        self.buffer += text
+        sentences, start = [], 0
+        for match in _BOUNDARY.finditer(self.buffer):
+            sentence = self.buffer[start:match.end()].strip()
+            if len(sentence) < self.min_chars:
+                continue
+            sentences.append(sentence)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Whatever is left once the reply is complete"""
+        rest, self.buffer = self.buffer.strip(), ''
+        return [rest] if rest else []
+
+def spoken_sentences(text, min_chars=20):
+    """The speakable sentences the pipeline would synthesize for a reply"""
+    splitter = SentenceSplitter(min_chars)
+    return [s for s in map(speakable, splitter.feed(text) + splitter.flush()) if s]
+
+class SpeechPipeline:
+    """Recognize, answer, synthesize and play on separate threads, sentence by sentence.
+
+    recognize(audio) returns the text heard, None when nothing was
+    understood (the fallback is spoken instead) or '' to skip the utterance. respond(text) yields the
+    reply in pieces. synthesize(sentence) returns something play() accepts.
+    """
+
+    def __init__(self, recognize, respond, synthesize, play, fallback=None, stop_words=(),
+                 on_heard=None, on_reply=None, on_stop=None, on_error=None, min_sentence_chars=20,
+                 synthesize_ahead=2):
+        self.recognize = recognize
+        self.respond = respond
+        self.synthesize = synthesize
+        self.play = play
+        self.fallback = fallback
+        self.stop_words = {word.lower() for word in stop_words}
+        self.on_heard = on_heard
+        self.on_reply = on_reply
+        self.on_stop = on_stop
+        self.on_error = on_error or (lambda stage, e: print(f"Error in {stage}: {e}"))
+        self.min_sentence_chars = min_sentence_chars
+
+        self._audio = queue.Queue()
+        self._texts = queue.Queue()
+        self._sentences = queue.Queue()
+        # Bounded so synthesis runs only a few sentences ahead of playback
+        self._clips = queue.Queue(maxsize=synthesize_ahead)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._turns = []
+        self._stopping = False
+
+    def start(self):
+        for name, target in (('stt', self._recognize_stage), ('llm', self._respond_stage),
+                             ('tts', self._synthesize_stage), ('playback', self._play_stage)):
+            thread = threading.Thread(target=target, name=f"speech-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, audio):
+        """Queue one recorded utterance"""
+        self._audio.put(audio)
+
+    def say(self, text):
+        """Speak fixed text in turn with the replies, without asking the model"""
+        self._texts.put(('say', text, self._new_turn(text)))
+
+    def close(self, timeout=None):
+        """Finish what is queued, then stop every stage"""
+        self._audio.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @property
+    def stopping(self):
+        return self._stopping
+
+    def _new_turn(self, text):
+        turn = {'text': text, 'heard_at': time.perf_counter(), 'first_audio_at': None, 'done_at': None}
+        with self._lock:
+            self._turns.append(turn)
+        return turn
+
+    def _recognize_stage(self):
+        while True:
+            audio = self._audio.get()
+            if audio is _STOP:
+                self._texts.put(_STOP)
+                return
+            if self._stopping:
+                continue
+            try:
+                text = self.recognize(audio)
+            except Exception as e:
+                self.on_error('speech recognition', e)
+                continue
+            if text is None:
+                if self.fallback:
+                    self.say(self.fallback)
+                continue
+            if not text:
+                continue
+            if self.on_heard:
+                self.on_heard(text)
+            if text.strip().lower() in self.stop_words:
+                self._stopping = True
+                if self.on_stop:
+                    self.on_stop()
+                continue
+            self._texts.put(('ask', text, self._new_turn(text)))
+
+    def _respond_stage(self):
+        while True:
+            item = self._texts.get()
+            if item is _STOP:
+                self._sentences.put(_STOP)
+                return
+            kind, text, turn = item
+            if kind == 'say':
+                self._sentences.put((turn, text))
+                self._sentences.put((turn, _END))
+                continue
+            splitter = SentenceSplitter(self.min_sentence_chars)
+            reply = ''
+            try:
+                for piece in self.respond(text):
+                    reply += piece
+                    for sentence in splitter.feed(piece):
+                        self._sentences.put((turn, sentence))
+            except Exception as e:
+                self.on_error('model response', e)
+            for sentence in splitter.flush():
+                self._sentences.put((turn, sentence))
+            if self.on_reply and reply:
+                self.on_reply(reply)
+            self._sentences.put((turn, _END))
+
+    def _synthesize_stage(self):
+        while True:
+            item = self._sentences.get()
+            if item is _STOP:
+                self._clips.put(_STOP)
+                return
+            turn, sentence = item
+            if sentence is _END:
+                self._clips.put(item)
+                continue
+            text = speakable(sentence)
+            if not text:
+                continue
+            try:
+                self._clips.put((turn, self.synthesize(text)))
+            except Exception as e:
+                self.on_error('text-to-speech', e)
+
+    def _play_stage(self):
+        while True:
+            item = self._clips.get()
+            if item is _STOP:
+                return
+            turn, clip = item
+            if clip is _END:
+                turn['done_at'] = time.perf_counter()
+                continue
+            if turn['first_audio_at'] is None:
+                turn['first_audio_at'] = time.perf_counter()
+            try:
+                self.play(clip)
+            except Exception as e:
+                self.on_error('playback', e)
+
+    def stats(self):
+        """Turns handled and how long each took to its first spoken word and to the end"""
+        with self._lock:
+            done = [turn for turn in self._turns if turn['done_at'] is not None]
+        first = [turn['first_audio_at'] - turn['heard_at'] for turn in done if turn['first_audio_at'] is not None]
+        total = [turn['done_at'] - turn['heard_at'] for turn in done]
+        return {
+            'turns': len(done),
+            'first_word_seconds_p50': statistics.median(first) if first else None,
+            'first_word_seconds_max': max(first) if first else None,
+            'turn_seconds_p50': statistics.median(total) if total else None,
+        }
+
+# Offline stand-ins for each stage
+
+def text_recognizer(audio):
+    """Recognizer for tests: the "audio" already is the text"""
+    return audio
+
+def stub_responder(reply, seconds_per_word=0.0):
+    """respond() that streams a fixed reply word by word"""
+    def respond(text):
+        for word in reply.format(question=text).split(' '):
+            time.sleep(seconds_per_word)
+            yield word + ' '
+    return respond
+
+def stub_synthesizer(seconds_per_char=0.0):
+    """synthesize() that returns the sentence as bytes after a delay"""
+    def synthesize(sentence):
+        time.sleep(seconds_per_char * len(sentence))
+        return sentence.encode('utf-8')
+    return synthesize
+
+class StubPlayer:
+    """play() that records what was played and takes time proportional to its length"""
+
+    def __init__(self, seconds_per_byte=0.0):
+        self.seconds_per_byte = seconds_per_byte
+        self.played = []
+
+    def __call__(self, clip):
+        self.played.append(clip)
+        time.sleep(self.seconds_per_byte * len(clip))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the speech pipeline offline with stub stages")
+    parser.add_argument('questions', nargs='*', default=["How do I add holidays to my timetable?"])
+    parser.add_argument('--word-delay', type=float, default=0.03, help="model seconds per word")
+    parser.add_argument('--tts-delay', type=float, default=0.002, help="synthesis seconds per character")
+    parser.add_argument('--play-delay', type=float, default=0.004, help="playback seconds per character")
+    args = parser.parse_args(argv)
+
+    reply = ("To answer \"{question}\": open the Calendar tab and select Add Event. "
+             "Choose Holiday and set the dates you need. The timetable is regenerated around them. "
+             "If you have more questions, feel free to ask!")
+    respond = stub_responder(reply, args.word_delay)
+    synthesize = stub_synthesizer(args.tts_delay)
+    player = StubPlayer(args.play_delay)
+
+    # Everything in sequence, as before: whole reply, whole synthesis, then playback
+    sequential = []
+    for question in args.questions:
+        start = time.perf_counter()
+        clip = synthesize(speakable(''.join(respond(question))))
+        sequential.append(time.perf_counter() - start)
+        player(clip)
+
+    # One question at a time, so no turn waits behind the previous one
+    pipelined = []
+    for question in args.questions:
+        pipeline = SpeechPipeline(text_recognizer, respond, synthesize, player).start()
+        pipeline.submit(question)
+        pipeline.close()
+        pipelined.append(pipeline.stats()['first_word_seconds_p50'])
+    print(f"sequential first word: {statistics.median(sequential):.3f}s")
+    print(f"pipelined first word:  {statistics.median(pipelined):.3f}s")
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,28 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import itertools
-import random
+from cache import LRUCache, SQLiteStore
+from spreader_engine import (
+    LECTURE,
+    as_model,
+    cached_optimize_timetable,
+    calculate_spread,
+    day_labels,
+    reoptimize_timetable,
+    subject_diff,
+)
 
 st.set_page_config(page_title="Period even spread dis", layout="wide")
 
+# Optimization results shared by every session of this server; set
+# SPREADER_CACHE_PATH to also keep them in a SQLite file across restarts
+@st.cache_resource
+def get_result_cache():
+    path = os.getenv("SPREADER_CACHE_PATH")
+    return LRUCache(maxsize=256, store=SQLiteStore(path) if path else None)
+
 st.title("Period even spread dis")
 st.write("Thinking : https://drive.google.com/file/d/1dgIcYXi2eigJurvcrTRKxoJ6PeL1JjzV/view?usp=drivesdk")
 st.write("Code : https://github.com/404reese/timelith-agent/blob/main/spreader.py")
@@ -14,11 +30,19 @@ st.write("Code : https://github.com/404reese/timelith-agent/blob/main/spreader.p
 # Sidebar for inputs
 with st.sidebar:
     st.header("Timetable Settings")
-    num_days = st.slider("Number of Working Days", min_value=3, max_value=6, value=5)
+    num_days = st.slider("Number of Working Days", min_value=3, max_value=14, value=5)
+    
+    # Optimizer inputs
+    st.subheader("Optimizer")
+    solver = st.selectbox("Solver", ["auto", "exact", "local"])
+    n_workers = st.number_input("Parallel Workers", min_value=1, max_value=os.cpu_count() or 1, value=1)
+    seed = st.number_input("Random Seed", min_value=0, value=0)
+    keep_stable = st.checkbox("Only update changed subjects", value=True,
+                              help="Reuse the last timetable and re-place only the subjects you edited")
     
     # Subject inputs
     st.subheader("Subject Configuration")
-    num_subjects = st.number_input("Number of Subjects", min_value=1, max_value=10, value=5)
+    num_subjects = st.number_input("Number of Subjects", min_value=1, max_value=500, value=5)
     
     subjects_data = []
     for i in range(num_subjects):
@@ -37,114 +61,52 @@ with st.sidebar:
             "has_practical": has_practical
         })
 
-def create_timetable(subjects_data, num_days):
-    """Generate a timetable based on subject requirements"""
-    # Initialize empty timetable
-    timetable = [[] for _ in range(num_days)]
-    
-    # First, distribute practicals evenly
-    practical_subjects = [subj for subj in subjects_data if subj["has_practical"]]
-    
-    # Try to distribute practicals as evenly as possible
-    practical_days = list(range(num_days))
-    random.shuffle(practical_days)
-    
-    for i, subject in enumerate(practical_subjects):
-        day = practical_days[i % num_days]
-        timetable[day].append({
-            'subject': subject["name"],
-            'type': 'practical',
-            'day': day
-        })
-    
-    # Now distribute lectures
-    for subject in subjects_data:
-        # Get days that need fewer lectures (for balancing)
-        day_loads = [len([e for e in day if e['type'] == 'lecture']) for day in timetable]
-        
-        # For each lecture of this subject
-        for _ in range(subject["lectures"]):
-            # Choose the day with the least lectures
-            candidate_days = sorted(range(num_days), key=lambda d: day_loads[d])
-            
-            # Find days that don't already have this subject as a lecture
-            available_days = [
-                day for day in candidate_days 
-                if not any(e['subject'] == subject["name"] and e['type'] == 'lecture' for e in timetable[day])
-            ]
-            
-            # If we've used all days for this subject's lectures already, just use the least loaded day
-            if not available_days:
-                chosen_day = candidate_days[0]
-            else:
-                chosen_day = available_days[0]
-            
-            # Add the lecture
-            timetable[chosen_day].append({
-                'subject': subject["name"],
-                'type': 'lecture',
-                'day': chosen_day
-            })
-            
-            # Update the load count for this day
-            day_loads[chosen_day] += 1
-    
-    return timetable
-
-def calculate_spread(timetable, event_type):
-    """Calculate the distribution statistics for events in the timetable"""
-    counts = [sum(1 for event in day if event['type'] == event_type) for day in timetable]
-    if len(counts) == 0:
-        return {'counts': counts, 'variance': 0, 'average': 0}
-    average = sum(counts) / len(counts)
-    variance = sum((x - average) ** 2 for x in counts) / len(counts)
-    return {'counts': counts, 'variance': variance, 'average': average}
-
-def optimize_timetable(subjects_data, num_days, iterations=100):
-    """Generate multiple timetables and select the best one based on variance"""
-    best_timetable = None
-    best_score = float('inf')
-    
-    for _ in range(iterations):
-        timetable = create_timetable(subjects_data, num_days)
-        
-        # Calculate spread stats
-        lecture_stats = calculate_spread(timetable, 'lecture')
-        practical_stats = calculate_spread(timetable, 'practical')
-        
-        # Combined score favoring even distribution (lower is better)
-        total_score = lecture_stats['variance'] * 2 + practical_stats['variance']
-        
-        if total_score < best_score:
-            best_score = total_score
-            best_timetable = timetable
-    
-    return best_timetable
-
 def display_timetable(timetable):
     """Create a DataFrame representation of the timetable"""
-    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"][:len(timetable)]
+    model = as_model(timetable)
+    days = day_labels(model.num_days)
     
     # Create lecture and practical rows for each day
     data = []
-    for day_idx, day_events in enumerate(timetable):
-        lectures = [e['subject'] for e in day_events if e['type'] == 'lecture']
-        practicals = [e['subject'] for e in day_events if e['type'] == 'practical']
-        
+    for day_idx in range(model.num_days):
         data.append({
             'Day': days[day_idx],
-            'Lectures': ', '.join(lectures),
-            'Practicals': ', '.join(practicals)
+            'Lectures': ', '.join(model.day_subjects(day_idx, 'lecture')),
+            'Practicals': ', '.join(model.day_subjects(day_idx, 'practical'))
         })
     
     return pd.DataFrame(data)
 
+def subject_allocation(timetable):
+    """Create a DataFrame of the days each subject is taught on"""
+    model = as_model(timetable)
+    day_names = np.array(day_labels(model.num_days), dtype=object)
+    lecture_days = model.subject_days('lecture')
+    practical_days = model.subject_days('practical')
+    lecture_totals = model.counts[LECTURE].sum(axis=0)
+    
+    subject_summary = []
+    for s, subject in enumerate(model.subjects):
+        if not lecture_days[:, s].any() and not practical_days[:, s].any():
+            continue
+        practical_days_names = day_names[practical_days[:, s]]
+        subject_summary.append({
+            'Subject': subject,
+            'Lecture Days': ', '.join(day_names[lecture_days[:, s]]),
+            'Practical Days': ', '.join(practical_days_names) if len(practical_days_names) else 'None',
+            'Total Lectures': int(lecture_totals[s]),
+            'Has Practical': bool(len(practical_days_names))
+        })
+    
+    return pd.DataFrame(subject_summary)
+
 def plot_distribution(timetable):
     """Plot the distribution of lectures and practicals"""
-    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat"][:len(timetable)]
+    model = as_model(timetable)
+    days = day_labels(model.num_days, short=True)
     
-    lecture_counts = [sum(1 for e in day if e['type'] == 'lecture') for day in timetable]
-    practical_counts = [sum(1 for e in day if e['type'] == 'practical') for day in timetable]
+    lecture_counts = model.day_loads('lecture')
+    practical_counts = model.day_loads('practical')
     
     fig, ax = plt.subplots(figsize=(10, 5))
     
@@ -170,8 +132,18 @@ if st.button("Generate Optimized Timetable"):
         st.error("Please add at least one subject")
     else:
         with st.spinner("Optimizing timetable..."):
-            # Generate and optimize timetable
-            timetable = optimize_timetable(subjects_data, num_days, iterations=200)
+            # Generate and optimize timetable, reusing the last one when only some subjects
+            # changed under the same optimizer settings; anything else is a fresh (cached) run
+            previous = st.session_state.get("timetable")
+            settings = (num_days, solver, n_workers, seed)
+            if (keep_stable and previous is not None and st.session_state.get("timetable_settings") == settings
+                    and any(subject_diff(previous, subjects_data))):
+                timetable = reoptimize_timetable(previous, subjects_data, time_limit=5, seed=seed)
+            else:
+                timetable = cached_optimize_timetable(subjects_data, num_days, get_result_cache(), seed=seed,
+                                                      time_limit=5, n_workers=n_workers, solver=solver)
+            st.session_state.timetable = timetable
+            st.session_state.timetable_settings = settings
             
             # Display the timetable
             timetable_df = display_timetable(timetable)
@@ -189,6 +161,9 @@ if st.button("Generate Optimized Timetable"):
                 practical_stats = calculate_spread(timetable, 'practical')
                 
                 st.subheader("Distribution Analysis")
+                info = timetable.info
+                status = "proven optimal" if info['optimal'] else f"optimality gap {info['gap']:.4f}"
+                st.write(f"Solver: {info['solver']} — score {info['score']:.4f}, lower bound {info['lower_bound']:.4f} ({status})")
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -205,25 +180,7 @@ if st.button("Generate Optimized Timetable"):
                 
                 # Subject allocation summary
                 st.subheader("Subject Allocation")
-                subject_summary = []
-                
-                for subject in set(e['subject'] for day in timetable for e in day):
-                    lecture_days = [i for i, day in enumerate(timetable) if any(e['subject'] == subject and e['type'] == 'lecture' for e in day)]
-                    practical_days = [i for i, day in enumerate(timetable) if any(e['subject'] == subject and e['type'] == 'practical' for e in day)]
-                    
-                    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"][:num_days]
-                    lecture_days_names = [day_names[d] for d in lecture_days]
-                    practical_days_names = [day_names[d] for d in practical_days]
-                    
-                    subject_summary.append({
-                        'Subject': subject,
-                        'Lecture Days': ', '.join(lecture_days_names),
-                        'Practical Days': ', '.join(practical_days_names) if practical_days_names else 'None',
-                        'Total Lectures': len(lecture_days),
-                        'Has Practical': len(practical_days) > 0
-                    })
-                
-                st.dataframe(pd.DataFrame(subject_summary), use_container_width=True)
+                st.dataframe(subject_allocation(timetable), use_container_width=True)
 
 # Footer
 st.markdown("---")
\ No newline at end of file
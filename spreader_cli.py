@@ -0,0 +1,142 @@
+# Batch timetable generation without Streamlit.
+#
+#   python spreader_cli.py departments.jsonl -o timetables.jsonl --processes 8
+#
+# Input is a JSON object, a JSON list of objects or JSONL with one object per
+# line. Each object describes one instance:
+#   {"id": "physics", "num_days": 5, "seed": 1,
+#    "subjects": [{"name": "Optics", "lectures": 3, "has_practical": true}]}
+# Adding "slots_per_day" (and optionally "rooms" and "teachers", see
+# slot_scheduler.schedule_slots) schedules periods and rooms as well.
+# Output is JSONL with one result per instance, in input order. Instances
+# that cannot be read or solved get an "error" field instead of a timetable
+# and the rest of the batch still runs.
+import argparse
+import json
+import sys
+
+from slot_scheduler import schedule_slots
+from spreader_engine import optimize_timetable
+
+def read_configs(path):
+    """Yield instance configurations from a JSON or JSONL file ('-' for stdin)
+
+    A JSONL line that is not valid JSON is yielded as its JSONDecodeError so
+    it becomes an error record rather than ending the batch.
+    """
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    with stream:
+        text = stream.read()
+    stripped = text.lstrip()
+    if not stripped:
+        return
+    if stripped[0] == '[':
+        yield from json.loads(text)
+        return
+    try:
+        yield json.loads(text)
+    except json.JSONDecodeError:
+        # Not a single JSON document, so treat it as JSONL
+        for number, line in enumerate(text.splitlines(), 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield json.JSONDecodeError(f"line {number}: {e.msg}", e.doc, e.pos)
+
+def solve_config(config, options):
+    """Optimize one instance and return its output record"""
+    instance_id = config.get('id') if isinstance(config, dict) else None
+    try:
+        if isinstance(config, json.JSONDecodeError):
+            raise config
+        if not isinstance(config, dict):
+            raise TypeError(f"an instance must be a JSON object, not {type(config).__name__}")
+        subjects = config['subjects']
+        num_days = int(config['num_days'])
+        if num_days < 1:
+            raise ValueError("'num_days' must be at least 1")
+        if not isinstance(subjects, list):
+            raise TypeError("'subjects' must be a list")
+        for subject in subjects:
+            if not isinstance(subject, dict):
+                raise TypeError(f"every subject must be a JSON object, not {type(subject).__name__}")
+            subject.setdefault('has_practical', False)
+            if 'name' not in subject or 'lectures' not in subject:
+                raise ValueError("every subject needs a 'name' and 'lectures'")
+        if 'slots_per_day' in config:
+            model = schedule_slots(
+                subjects,
+                num_days,
+                int(config['slots_per_day']),
+                rooms=config.get('rooms'),
+                teachers=config.get('teachers'),
+                seed=config.get('seed', options['seed']),
+            )
+        else:
+            model = optimize_timetable(
+                subjects,
+                num_days,
+                iterations=options['iterations'],
+                time_limit=options['time_limit'],
+                seed=config.get('seed', options['seed']),
+                n_workers=options['workers'],
+                solver=config.get('solver', options['solver']),
+            )
+    except (KeyError, TypeError, ValueError) as e:
+        return {'id': instance_id, 'error': f"{type(e).__name__}: {e}"}
+    return {
+        'id': instance_id,
+        'num_days': num_days,
+        'info': model.info,
+        'timetable': model.to_events(),
+    }
+
+def _solve_star(args):
+    return solve_config(*args)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate evenly spread timetables in bulk")
+    parser.add_argument('input', help="JSON or JSONL file with instance configurations, '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output file, '-' for stdout")
+    parser.add_argument('--solver', default='auto', choices=['auto', 'exact', 'local'])
+    parser.add_argument('--iterations', type=int, default=50000, help="local search move budget per instance")
+    parser.add_argument('--time-limit', type=float, default=None, help="local search seconds per instance")
+    parser.add_argument('--seed', type=int, default=0, help="seed for instances that do not set one")
+    parser.add_argument('--workers', type=int, default=1, help="local search processes per instance")
+    parser.add_argument('--processes', type=int, default=1, help="instances solved in parallel")
+    args = parser.parse_args(argv)
+
+    options = {
+        'solver': args.solver,
+        'iterations': args.iterations,
+        'time_limit': args.time_limit,
+        'seed': args.seed,
+        'workers': args.workers,
+    }
+    configs = read_configs(args.input)
+    tasks = ((config, options) for config in configs)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    failures = 0
+    with output:
+        if args.processes > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                results = pool.map(_solve_star, tasks, chunksize=16)
+                for result in results:
+                    failures += 'error' in result
+                    output.write(json.dumps(result) + '\n')
+        else:
+            for task in tasks:
+                result = _solve_star(task)
+                failures += 'error' in result
+                output.write(json.dumps(result) + '\n')
+
+    if failures:
+        print(f"{failures} instance(s) failed, see the 'error' field in the output", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,572 @@
+# Headless timetable engine used by spreader.py and spreader_cli.py.
+# Importing it has no side effects; numpy and the process pool are only
+# imported once a timetable is actually built, to keep startup cheap.
+import hashlib
+import itertools
+import json
+import math
+import random
+import time
+
+def day_labels(num_days, short=False):
+    """Names for each working day, numbering the weeks once a week is exceeded"""
+    names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+    if short:
+        names = [name[:3] for name in names]
+    if num_days <= len(names):
+        return names[:num_days]
+    return [f"{names[d % len(names)]} (W{d // len(names) + 1})" for d in range(num_days)]
+
+EVENT_TYPES = ('lecture', 'practical')
+LECTURE, PRACTICAL = 0, 1
+
+# Scores within this distance of the lower bound count as optimal
+OPTIMALITY_TOLERANCE = 1e-9
+
+class TimetableModel:
+    """Compact timetable held as a (event types x days x subjects) count matrix.
+
+    Subjects and event types are integer coded: `subjects[i]` is the name of
+    subject code i and `EVENT_TYPES[t]` the name of type code t.
+    """
+
+    def __init__(self, subjects, num_days, counts=None):
+        import numpy as np
+        self.subjects = list(subjects)
+        self.num_days = num_days
+        if counts is None:
+            counts = np.zeros((len(EVENT_TYPES), num_days, len(self.subjects)), dtype=np.int32)
+        self.counts = counts
+        self.info = {}
+
+    @classmethod
+    def from_events(cls, timetable, subjects=None):
+        """Build a model from the list-of-days of event dicts form"""
+        if subjects is None:
+            subjects = list(dict.fromkeys(e['subject'] for day in timetable for e in day))
+        model = cls(subjects, len(timetable))
+        codes = {name: i for i, name in enumerate(model.subjects)}
+        for day, day_events in enumerate(timetable):
+            for event in day_events:
+                model.counts[EVENT_TYPES.index(event['type']), day, codes[event['subject']]] += 1
+        return model
+
+    def to_events(self):
+        """Export as a list of days, each a list of event dicts"""
+        import numpy as np
+        timetable = [[] for _ in range(self.num_days)]
+        for t, d, s in zip(*np.nonzero(self.counts)):
+            for _ in range(self.counts[t, d, s]):
+                timetable[d].append({
+                    'subject': self.subjects[s],
+                    'type': EVENT_TYPES[t],
+                    'day': int(d)
+                })
+        return timetable
+
+    def to_dict(self):
+        """JSON-friendly form, the inverse of from_dict"""
+        return {
+            'subjects': self.subjects,
+            'num_days': self.num_days,
+            'counts': self.counts.tolist(),
+            'info': self.info,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a model from to_dict output"""
+        import numpy as np
+        counts = np.array(data['counts'], dtype=np.int32).reshape(
+            len(EVENT_TYPES), data['num_days'], len(data['subjects']))
+        model = cls(data['subjects'], data['num_days'], counts)
+        model.info = dict(data.get('info', {}))
+        return model
+
+    def day_loads(self, event_type):
+        """Number of events of a type on each day"""
+        return self.counts[EVENT_TYPES.index(event_type)].sum(axis=1)
+
+    def subject_days(self, event_type):
+        """Boolean days x subjects matrix of where each subject has an event of a type"""
+        return self.counts[EVENT_TYPES.index(event_type)] > 0
+
+    def day_subjects(self, day, event_type):
+        """Subject names of the events of a type on a day, repeated per event"""
+        import numpy as np
+        row = self.counts[EVENT_TYPES.index(event_type), day]
+        return [self.subjects[s] for s in np.repeat(np.arange(len(self.subjects)), row)]
+
+    def score(self):
+        """Combined score favoring even distribution (lower is better)"""
+        return _score_from_loads(self.counts.sum(axis=2))
+
+def _score_from_loads(loads):
+    # loads is a (event types x days) matrix; lectures count double
+    if loads.shape[1] == 0:
+        return 0.0
+    variances = loads.var(axis=1)
+    return float(variances[LECTURE] * 2 + variances[PRACTICAL])
+
+def as_model(timetable):
+    """Accept either a TimetableModel or the list-of-days form"""
+    if isinstance(timetable, TimetableModel):
+        return timetable
+    return TimetableModel.from_events(timetable)
+
+def create_timetable(subjects_data, num_days, rng=None):
+    """Generate a timetable based on subject requirements"""
+    import numpy as np
+    rng = rng or random
+    subjects = list(dict.fromkeys(subj["name"] for subj in subjects_data))
+    codes = {name: i for i, name in enumerate(subjects)}
+    model = TimetableModel(subjects, num_days)
+    lectures = model.counts[LECTURE]
+    practicals = model.counts[PRACTICAL]
+    
+    # First, distribute practicals evenly
+    practical_subjects = [codes[subj["name"]] for subj in subjects_data if subj["has_practical"]]
+    
+    # Try to distribute practicals as evenly as possible
+    practical_days = list(range(num_days))
+    rng.shuffle(practical_days)
+    
+    for i, s in enumerate(practical_subjects):
+        practicals[practical_days[i % num_days], s] += 1
+    
+    # Now distribute lectures
+    day_loads = lectures.sum(axis=1)
+    for subject in subjects_data:
+        s = codes[subject["name"]]
+        
+        # For each lecture of this subject
+        for _ in range(subject["lectures"]):
+            # Choose the day with the fewest lectures of this subject, then the least loaded one.
+            # Entries sharing a name count together, so a subject never repeats a day before
+            # every day has it (the cap in _lecture_caps) however its lectures are listed
+            chosen_day = int(np.argmin(lectures[:, s].astype(np.int64) * (day_loads.sum() + 1) + day_loads))
+            
+            # Add the lecture and update the load count for this day
+            lectures[chosen_day, s] += 1
+            day_loads[chosen_day] += 1
+    
+    return model
+
+def calculate_spread(timetable, event_type):
+    """Calculate the distribution statistics for events in the timetable"""
+    counts = as_model(timetable).day_loads(event_type)
+    if len(counts) == 0:
+        return {'counts': [], 'variance': 0, 'average': 0}
+    return {'counts': counts.tolist(), 'variance': float(counts.var()), 'average': float(counts.mean())}
+
+def _balanced_variance(total, num_days):
+    """Smallest possible variance when `total` events are spread over `num_days`"""
+    if num_days == 0:
+        return 0
+    remainder = total % num_days
+    return remainder * (num_days - remainder) / (num_days * num_days)
+
+def lower_bound(subjects_data, num_days):
+    """Best score any timetable for these subjects could reach"""
+    lectures = sum(subj["lectures"] for subj in subjects_data)
+    practicals = sum(1 for subj in subjects_data if subj["has_practical"])
+    return _balanced_variance(lectures, num_days) * 2 + _balanced_variance(practicals, num_days)
+
+def optimize_timetable(subjects_data, num_days, iterations=50000, time_limit=None, seed=None, n_workers=1, solver="auto"):
+    """Find the most evenly spread timetable with one of the SOLVERS backends.
+
+    `solver="auto"` tries the exact backend first and only falls back to
+    local search when it cannot prove its result optimal. The returned
+    model's `info` holds the solver used, the score, the lower bound and
+    the optimality gap between them.
+    """
+    if solver == "auto":
+        model = _solve_exact(subjects_data, num_days, iterations, time_limit, seed, n_workers)
+        bound = lower_bound(subjects_data, num_days)
+        if model.score() - bound > OPTIMALITY_TOLERANCE:
+            model = _solve_local(subjects_data, num_days, iterations, time_limit, seed, n_workers)
+            solver = "local"
+        else:
+            solver = "exact"
+    else:
+        model = SOLVERS[solver](subjects_data, num_days, iterations, time_limit, seed, n_workers)
+        bound = lower_bound(subjects_data, num_days)
+
+    return _with_info(model, solver, bound)
+
+def _with_info(model, solver, bound):
+    # Record how the model was produced and how far it is from the lower bound
+    score = model.score()
+    model.info = {
+        'solver': solver,
+        'score': score,
+        'lower_bound': bound,
+        'gap': max(0.0, score - bound),
+        'optimal': score - bound <= OPTIMALITY_TOLERANCE,
+    }
+    return model
+
+def canonical_subjects(subjects_data):
+    """Subjects with only the fields the engine reads, in a fixed order"""
+    subjects = [
+        {"name": subj["name"], "lectures": int(subj["lectures"]), "has_practical": bool(subj["has_practical"])}
+        for subj in subjects_data
+    ]
+    return sorted(subjects, key=lambda subj: (subj["name"], subj["lectures"], subj["has_practical"]))
+
+def canonical_key(subjects_data, num_days, seed=None, **options):
+    """Hash identifying an optimization run, independent of subject order"""
+    payload = json.dumps({
+        'subjects': canonical_subjects(subjects_data),
+        'num_days': num_days,
+        'seed': seed,
+        'options': options,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cached_optimize_timetable(subjects_data, num_days, cache, seed=None, **options):
+    """optimize_timetable memoized in `cache` (see cache.LRUCache).
+
+    The optimizer always sees the canonical subject order, so the same
+    configuration entered in a different order hits the same entry. The
+    result is returned with its subjects in the caller's order.
+    """
+    key = canonical_key(subjects_data, num_days, seed, **options)
+    cached = cache.get(key)
+    if cached is not None:
+        model = TimetableModel.from_dict(cached)
+        model.info['cached'] = True
+    else:
+        model = optimize_timetable(canonical_subjects(subjects_data), num_days, seed=seed, **options)
+        cache.set(key, model.to_dict())
+        model.info['cached'] = False
+    return _in_subject_order(model, dict.fromkeys(subj["name"] for subj in subjects_data))
+
+def _in_subject_order(model, names):
+    # Same timetable with subject codes renumbered to follow `names`
+    names = list(names)
+    order = [model.subjects.index(name) for name in names]
+    reordered = TimetableModel(names, model.num_days, model.counts[:, :, order])
+    reordered.info = model.info
+    return reordered
+
+def _requirements(subjects_data):
+    # Subject name -> (lectures, practicals), merging entries that share a name
+    required = {}
+    for subj in subjects_data:
+        lectures, practicals = required.get(subj["name"], (0, 0))
+        required[subj["name"]] = (lectures + subj["lectures"], practicals + bool(subj["has_practical"]))
+    return required
+
+def subject_diff(previous, subjects_data):
+    """Names of the subjects added, removed and changed since a previous timetable"""
+    previous = as_model(previous)
+    lectures = previous.counts[LECTURE].sum(axis=0)
+    practicals = previous.counts[PRACTICAL].sum(axis=0)
+    old = {
+        name: (int(lectures[s]), int(practicals[s]))
+        for s, name in enumerate(previous.subjects)
+        if lectures[s] or practicals[s]
+    }
+    new = _requirements(subjects_data)
+    added = [name for name in new if name not in old]
+    removed = [name for name in old if name not in new]
+    changed = [name for name in new if name in old and new[name] != old[name]]
+    return added, removed, changed
+
+def reoptimize_timetable(previous, subjects_data, iterations=5000, time_limit=None, seed=None):
+    """Update a previous timetable for an edited subject list.
+
+    Placements of unchanged subjects are kept. Events of added and changed
+    subjects are added or removed on the least disruptive days, then a short
+    local search moves only those subjects' events. Days left unbalanced
+    (for example by a removed subject) are evened out with the fewest
+    single-event moves. The day count is the previous timetable's.
+    """
+    import numpy as np
+    previous = as_model(previous)
+    rng = random.Random(seed)
+    added, removed, changed = subject_diff(previous, subjects_data)
+    required = _requirements(subjects_data)
+
+    # Carry over the placements of every subject that still exists
+    model = TimetableModel(list(required), previous.num_days)
+    old_codes = {name: s for s, name in enumerate(previous.subjects)}
+    for s, name in enumerate(model.subjects):
+        if name in old_codes:
+            model.counts[:, :, s] = previous.counts[:, :, old_codes[name]]
+
+    affected = set(added) | set(changed)
+    movable = [name in affected for name in model.subjects]
+    for s, name in enumerate(model.subjects):
+        if movable[s]:
+            lectures, practicals = required[name]
+            _adjust_events(model, s, LECTURE, lectures)
+            _adjust_events(model, s, PRACTICAL, practicals)
+
+    model = _anneal(model, iterations, time_limit, rng, movable=movable)
+    _rebalance(model, LECTURE, movable)
+    _rebalance(model, PRACTICAL, movable)
+
+    _with_info(model, 'incremental', lower_bound(subjects_data, model.num_days))
+    model.info['added'] = added
+    model.info['removed'] = removed
+    model.info['changed'] = changed
+    return model
+
+def _lecture_caps(model):
+    # A subject may only repeat its lecture on a day once every day already has one
+    import numpy as np
+    num_days = max(1, model.num_days)
+    return np.maximum(1, -(-model.counts[LECTURE].sum(axis=0) // num_days))
+
+def _adjust_events(model, s, t, target):
+    # Add events of subject s and type t on the least loaded days it is not on yet,
+    # or remove them from the most loaded days, until it has `target` of them
+    import numpy as np
+    column = model.counts[t, :, s]
+    while column.sum() < target:
+        loads = model.counts[t].sum(axis=1)
+        column[int(np.argmin(column * (loads.sum() + 1) + loads))] += 1
+    while column.sum() > target:
+        loads = model.counts[t].sum(axis=1)
+        key = np.where(column > 0, column * (loads.sum() + 1) + loads, -1)
+        column[int(np.argmax(key))] -= 1
+
+def _rebalance(model, t, preferred):
+    # Move single events of type t from the busiest to the quietest days until
+    # loads differ by at most one, preferring events of `preferred` subjects
+    import numpy as np
+    preferred = np.asarray(preferred, dtype=bool)
+    if t == LECTURE:
+        caps = _lecture_caps(model)
+    else:
+        caps = np.full(len(model.subjects), np.iinfo(np.int32).max)
+    counts = model.counts[t]
+    while True:
+        loads = counts.sum(axis=1)
+        moved = False
+        for hi in np.argsort(-loads, kind='stable'):
+            for lo in np.argsort(loads, kind='stable'):
+                if loads[hi] - loads[lo] <= 1:
+                    break
+                candidates = np.flatnonzero((counts[hi] > 0) & (counts[lo] < caps))
+                if len(candidates) == 0:
+                    continue
+                first_choice = candidates[preferred[candidates]]
+                s = first_choice[0] if len(first_choice) else candidates[0]
+                counts[hi, s] -= 1
+                counts[lo, s] += 1
+                moved = True
+                break
+            if moved:
+                break
+        if not moved:
+            return
+
+def _solve_exact(subjects_data, num_days, iterations, time_limit, seed, n_workers):
+    """Lay events out round-robin over the days.
+
+    The score only depends on how many events of each type fall on each
+    day, and walking the days cyclically gives every day the floor or the
+    ceiling of the average, which is the lower bound. Consecutive lectures
+    of a subject land on consecutive days, so a subject never repeats a day
+    before every day has one of its lectures. The result is therefore
+    provably optimal and costs a single pass over the events.
+    """
+    import numpy as np
+    rng = random.Random(seed)
+    subjects = list(dict.fromkeys(subj["name"] for subj in subjects_data))
+    codes = {name: i for i, name in enumerate(subjects)}
+    model = TimetableModel(subjects, num_days)
+    if num_days == 0:
+        return model
+
+    # Shuffle the subject order and starting day so different seeds give different layouts
+    lecture_totals = np.zeros(len(subjects), dtype=np.int64)
+    for subj in subjects_data:
+        lecture_totals[codes[subj["name"]]] += subj["lectures"]
+    order = np.array(rng.sample(range(len(subjects)), len(subjects)), dtype=np.int64)
+    lecture_subjects = np.repeat(order, lecture_totals[order])
+    lecture_days = (np.arange(len(lecture_subjects)) + rng.randrange(num_days)) % num_days
+    np.add.at(model.counts[LECTURE], (lecture_days, lecture_subjects), 1)
+
+    practical_subjects = [codes[subj["name"]] for subj in subjects_data if subj["has_practical"]]
+    rng.shuffle(practical_subjects)
+    practical_days = (np.arange(len(practical_subjects)) + rng.randrange(num_days)) % num_days
+    np.add.at(model.counts[PRACTICAL], (practical_days, practical_subjects), 1)
+
+    return model
+
+def _solve_local(subjects_data, num_days, iterations, time_limit, seed, n_workers):
+    """Improve a greedy timetable by local search (simulated annealing).
+
+    Starts from a single create_timetable result and moves single events to
+    another day or swaps two events between days. Per-day counts are kept up
+    to date so every move is scored in O(1). Stops after `iterations` moves,
+    after `time_limit` seconds or as soon as the spread is perfectly even.
+
+    With `n_workers` > 1 the iteration budget is split over that many
+    independent runs in a process pool, each seeded from `seed`, and the best
+    scoring timetable wins (ties go to the lowest worker). The result only
+    depends on `seed` as long as no `time_limit` cuts the runs short.
+    """
+    if n_workers <= 1:
+        return _local_search(subjects_data, num_days, iterations, time_limit, seed)
+
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    seed_rng = random.Random(seed)
+    worker_seeds = [seed_rng.getrandbits(64) for _ in range(n_workers)]
+    worker_iterations = -(-iterations // n_workers)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        runs = list(pool.map(
+            _local_search,
+            itertools.repeat(subjects_data),
+            itertools.repeat(num_days),
+            itertools.repeat(worker_iterations),
+            itertools.repeat(time_limit),
+            worker_seeds,
+        ))
+
+    return min(runs, key=lambda model: model.score())
+
+# Solver backends by name; each takes
+# (subjects_data, num_days, iterations, time_limit, seed, n_workers)
+SOLVERS = {
+    'exact': _solve_exact,
+    'local': _solve_local,
+}
+
+def _local_search(subjects_data, num_days, iterations, time_limit, seed):
+    # Single simulated annealing run, see _solve_local
+    rng = random.Random(seed)
+    model = create_timetable(subjects_data, num_days, rng=rng)
+    return _anneal(model, iterations, time_limit, rng)
+
+def _anneal(model, iterations, time_limit, rng, movable=None):
+    """Simulated annealing over the events of an existing model.
+
+    `movable` is an optional sequence of flags per subject code; when given
+    only events of flagged subjects are moved or swapped.
+    """
+    import numpy as np
+    num_days = model.num_days
+    if num_days < 2:
+        return model
+
+    # Flatten the count matrix into parallel event lists: subject code, type code, day
+    event_index = np.nonzero(model.counts)
+    repeats = model.counts[event_index]
+    ev_type = np.repeat(event_index[0], repeats).tolist()
+    ev_day = np.repeat(event_index[1], repeats).tolist()
+    ev_subject = np.repeat(event_index[2], repeats).tolist()
+    num_events = len(ev_day)
+    if movable is None:
+        candidates = range(num_events)
+    else:
+        candidates = [i for i in range(num_events) if movable[ev_subject[i]]]
+    num_candidates = len(candidates)
+    if num_events < 2 or num_candidates == 0:
+        return model
+
+    subject_caps = _lecture_caps(model).tolist()
+
+    # Running per-day counts for each type and per-subject lecture counts per day
+    counts = model.counts.sum(axis=2).tolist()
+    lecture_days = model.counts[LECTURE].T.tolist()
+
+    # The mean never changes, so the variance only depends on the sum of squares
+    weights = (2.0, 1.0)
+    sums_sq = [sum(c * c for c in counts[0]), sum(c * c for c in counts[1])]
+    totals = [sum(counts[0]), sum(counts[1])]
+
+    def score_of(sq):
+        return sum(
+            weights[t] * (sq[t] / num_days - (totals[t] / num_days) ** 2)
+            for t in (0, 1)
+        )
+
+    score = score_of(sums_sq)
+    bound = sum(weights[t] * _balanced_variance(totals[t], num_days) for t in (0, 1))
+    best_score = score
+    best_days = ev_day[:]
+
+    def move_delta(t, src, dst):
+        # Change in weighted score when one event of type t goes from src to dst
+        return weights[t] * (2 * (counts[t][dst] - counts[t][src]) + 2) / num_days
+
+    def can_place(s, t, src, dst):
+        return t == 1 or lecture_days[s][dst] < subject_caps[s] or src == dst
+
+    def apply_move(i, dst):
+        s, t, src = ev_subject[i], ev_type[i], ev_day[i]
+        sums_sq[t] += 2 * (counts[t][dst] - counts[t][src]) + 2
+        counts[t][src] -= 1
+        counts[t][dst] += 1
+        if t == 0:
+            lecture_days[s][src] -= 1
+            lecture_days[s][dst] += 1
+        ev_day[i] = dst
+
+    # Simulated annealing with a geometric cooling schedule
+    temperature = start_temperature = 1.0
+    end_temperature = 1e-3
+    cooling = (end_temperature / start_temperature) ** (1.0 / max(1, iterations))
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    epsilon = 1e-12
+
+    for step in range(iterations):
+        if best_score <= bound + epsilon:
+            break
+        if deadline is not None and step % 256 == 0 and time.perf_counter() > deadline:
+            break
+        temperature *= cooling
+
+        i = candidates[rng.randrange(num_candidates)]
+        if rng.random() < 0.5:
+            # Move one event to another day
+            dst = rng.randrange(num_days - 1)
+            if dst >= ev_day[i]:
+                dst += 1
+            if not can_place(ev_subject[i], ev_type[i], ev_day[i], dst):
+                continue
+            delta = move_delta(ev_type[i], ev_day[i], dst)
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                apply_move(i, dst)
+                score += delta
+            else:
+                continue
+        else:
+            # Swap the days of two events
+            j = candidates[rng.randrange(num_candidates)]
+            a, b = ev_day[i], ev_day[j]
+            if a == b or (ev_subject[i] == ev_subject[j] and ev_type[i] == ev_type[j]):
+                continue
+            if not (can_place(ev_subject[i], ev_type[i], a, b) and can_place(ev_subject[j], ev_type[j], b, a)):
+                continue
+            if ev_type[i] == ev_type[j]:
+                delta = 0.0
+            else:
+                delta = move_delta(ev_type[i], a, b) + move_delta(ev_type[j], b, a)
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                apply_move(i, b)
+                apply_move(j, a)
+                score += delta
+            else:
+                continue
+
+        if score < best_score - epsilon:
+            # Recompute exactly to avoid drift from the accumulated deltas
+            score = score_of(sums_sq)
+            if score < best_score - epsilon:
+                best_score = score
+                best_days = ev_day[:]
+
+    # Rebuild the count matrix from the best assignment found
+    best = TimetableModel(model.subjects, num_days)
+    np.add.at(best.counts, (ev_type, best_days, ev_subject), 1)
+    return best
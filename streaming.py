@@ -0,0 +1,60 @@
+# Server-sent event helpers for streaming model output to the browser.
+import json
+
+import markdown
+from flask import Response, stream_with_context
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class MarkdownStream:
+    """Render markdown incrementally as text arrives.
+
+    Text is only rendered once a block is finished (followed by a blank
+    line), so every block is converted exactly once; the unfinished tail is
+    rendered separately as a preview that the next chunk replaces.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._rendered_upto = 0
+
+    def feed(self, chunk):
+        """Add a chunk; returns (html of newly finished blocks, html of the unfinished tail)"""
+        self.text += chunk
+        cut = self.text.rfind('\n\n', self._rendered_upto)
+        new_html = ''
+        if cut != -1:
+            new_html = markdown.markdown(self.text[self._rendered_upto:cut])
+            self._rendered_upto = cut + 2
+        return new_html, markdown.markdown(self.text[self._rendered_upto:])
+
+    def html(self):
+        """The whole text rendered in one go"""
+        return markdown.markdown(self.text)
+
+def stream_markdown(chunks, text_field):
+    """SSE response relaying text chunks with their incrementally rendered markdown.
+
+    Sends a `chunk` event per chunk, then a `done` event carrying the whole
+    text under `text_field` and its full rendering as `html_content`, or an
+    `error` event if the model call fails part way.
+    """
+    def events():
+        rendered = MarkdownStream()
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                new_html, tail_html = rendered.feed(chunk)
+                yield sse_event('chunk', {'text': chunk, 'html': new_html, 'tail_html': tail_html})
+            yield sse_event('done', {text_field: rendered.text, 'html_content': rendered.html()})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,92 @@
+# The timelith support assistant, shared by the voice bot (app2.py) and the
+# multi-session support server (support_server.py): the system prompt, the
+# fixed phrases, per-user chat histories and how a question is answered.
+from dotenv import load_dotenv
+from chat_history import sessions_from_env
+from faq_index import get_faq_index
+from llm_router import get_router
+
+# Load environment variables
+load_dotenv()
+
+# timelith knowledge base and system prompt
+timelith_SYSTEM_PROMPT = """
+**Prompt for AI (Timelith Support Assistant):**
+
+**Role:** You are the Timelith Support Assistant, a helpful AI designed to guide users of the Timelith online timetable generation suite. Your tone is friendly, clear, and professional.
+
+**Responsibilities:**
+1. Answer general questions about Timelith’s features, functionality, setup, and basic troubleshooting using your knowledge base (trained up to July 2024).
+2. If a question is complex, technical, or requires access to user-specific data (e.g., account details, payment issues, or bugs), respond with:
+   > *“I’ll need to escalate this to our support team. Please [raise a ticket](support.timelith.com) or email support@timelith.com for further assistance.”*
+3. Provide examples of common queries you can resolve (e.g., “How do I create a timetable?”, “Can I integrate Timelith with Google Calendar?”, “How do I reset my password?”).
+4. Politely redirect users for issues beyond your scope (e.g., billing, advanced customization, or feature requests).
+
+**Example Interaction:**
+- **User:** “How do I add holidays to my timetable?”
+- **AI:** “To add holidays, go to the ‘Calendar’ tab, select ‘Add Event,’ choose ‘Holiday,’ and set the dates. Let me know if you need more details!”
+
+- **User:** “I’m getting an error message when exporting my schedule.”
+- **AI:** “I’m sorry to hear that! Please [raise a ticket](support.timelith.com) or email support@timelith.com with the error details so our team can resolve this for you.”
+
+**Tone Guidelines:**
+- Use simple, non-technical language.
+- Keep answers concise but thorough.
+- If unsure, default to escalating rather than guessing.
+
+**Sign Off:**
+Always end with:
+> If you have more questions, feel free to ask! 
+---
+**Note:** Do not share links or resources outside Timelith’s official channels. Prioritize user privacy and security.
+"""
+
+# Configure the model; these apply to whichever backend the router picks
+generation_options = {
+    "temperature": 0.2,  # Lower temperature for more factual/precise responses
+    "top_p": 0.95,
+    "top_k": 64,  # Gemini only
+    "max_tokens": 1024,
+}
+
+safety_settings = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+]
+
+# One chat per user, started with the system prompt and kept within CHAT_MAX_TOKENS by
+# summarizing older turns; the router picks the fastest healthy backend (LLM_BACKENDS)
+# for every message and falls back to the next one when it fails
+chat_sessions = sessions_from_env(get_router(), timelith_SYSTEM_PROMPT,
+                                  safety_settings=safety_settings, **generation_options)
+
+# Fixed phrases; their audio is synthesized once and then played from the speech cache
+INITIAL_MESSAGE = "Welcome to timelith Support. I'm your specialized assistant for the timelith online timetable generation suite. How can I help you today with timelith?"
+FALLBACK_MESSAGE = "Sorry, I couldn't understand what you said. Could you please repeat your question about timelith?"
+SIGN_OFF = "If you have more questions, feel free to ask!"
+
+# Voice settings are part of the cache key
+VOICE = {"lang": "en", "slow": False}
+
+def faq_reply(text):
+    """(reply, None) when the FAQ index answers the question, else (None, context for the model)"""
+    answer, passages = get_faq_index().lookup(text)
+    if answer is not None:
+        return f"{answer} {SIGN_OFF}", None
+    return None, get_faq_index().context(passages)
+
+def respond(user_id, text):
+    """Answer from the FAQ index when it is confident, otherwise stream the model's answer.
+
+    The model gets the closest FAQ entries as context for the question.
+    """
+    chat = chat_sessions.get(user_id)
+    reply, context = faq_reply(text)
+    if reply is not None:
+        # Keep the exchange in the history so follow-up questions have it
+        chat.add_turn(text, reply)
+        yield reply
+        return
+    yield from chat.stream_message(text, context=context)
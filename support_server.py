@@ -0,0 +1,359 @@
+# Multi-session support server: the timelith assistant over HTTP.
+#
+# app2.py serves one person at one microphone; this serves many isolated
+# sessions from one process:
+#
+#   POST   /sessions                        start a session; returns the greeting text and audio
+#   POST   /sessions/<id>/messages          ask by text ({"text": ...}) or by voice (an "audio"
+#                                           WAV/AIFF/FLAC upload, or an audio/* request body)
+#          ?stream=1                        NDJSON events: heard, sentence (with audio_url), done
+#          Prefer: respond-async            202 with a status_url to poll instead of waiting
+#   GET    /sessions/<id>/turns/<turn_id>   result of an asynchronous turn
+#   DELETE /sessions/<id>                   forget the session
+#   GET    /audio/<key>                     a synthesized clip
+#   GET    /support-stats
+#
+# Each session has its own queue: its turns run one at a time and in order
+# (up to SUPPORT_SESSION_QUEUE waiting, beyond that 429) on a shared pool of
+# SUPPORT_WORKERS threads. Speech recognition and synthesis run in their own
+# bounded pools (STT_WORKERS, TTS_WORKERS), model calls in the shared
+# llm_pool, and every session shares the router's pooled clients, the FAQ
+# index and the speech cache. SUPPORT_BACKENDS=stub replaces recognition
+# and synthesis with local stubs for load testing (see bench_support.py).
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import Flask, Response, jsonify, request, url_for
+from cache import LRUCache
+from faq_index import get_faq_index
+from llm_pool import LLMPool, LLMTimeout, PoolFull, get_pool
+from llm_router import AllBackendsFailed, get_router
+from serving import run_app
+from speech_pipeline import SentenceSplitter, speakable
+from support_assistant import FALLBACK_MESSAGE, INITIAL_MESSAGE, VOICE, chat_sessions, faq_reply
+from tts_cache import TTSCache, get_tts_cache
+
+app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("SUPPORT_MAX_AUDIO_MB", 10)) * 1024 * 1024
+
+class SessionBusy(Exception):
+    """Raised when a session already has as many turns waiting as allowed"""
+
+class SessionQueues:
+    """Run each session's turns one at a time, in order, on a shared thread pool"""
+
+    def __init__(self, workers=64, max_pending=4):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='session')
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'rejected': 0}
+
+    def submit(self, session_id, fn, *args):
+        """Queue fn(*args) behind the session's earlier turns and return its Future, or raise SessionBusy"""
+        future = Future()
+        with self._lock:
+            pending = self._queues.setdefault(session_id, deque())
+            if len(pending) >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise SessionBusy("This session already has too many questions waiting, please retry shortly")
+            pending.append((future, fn, args))
+            self._counters['submitted'] += 1
+            first = len(pending) == 1
+        if first:
+            self._executor.submit(self._drain, session_id)
+        return future
+
+    def _drain(self, session_id):
+        while True:
+            with self._lock:
+                future, fn, args = self._queues[session_id][0]
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            with self._lock:
+                pending = self._queues[session_id]
+                pending.popleft()
+                if not pending:
+                    del self._queues[session_id]
+                    return
+
+    def stats(self):
+        """Sessions with turns in progress and how many turns are waiting"""
+        with self._lock:
+            return {
+                **self._counters,
+                'busy_sessions': len(self._queues),
+                'queued_turns': sum(len(pending) - 1 for pending in self._queues.values()),
+                'max_pending': self.max_pending,
+            }
+
+# Speech backends
+
+def google_recognize(audio):
+    """Text from a WAV, AIFF or FLAC recording, or None if nothing was understood"""
+    import speech_recognition as sr
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(io.BytesIO(audio)) as source:
+        recording = recognizer.record(source)
+    try:
+        return recognizer.recognize_google(recording)
+    except sr.UnknownValueError:
+        return None
+
+class FixtureRecognizer:
+    """Stub recognizer: the recorded transcript of known audio, matched by content hash"""
+
+    def __init__(self, transcripts=None):
+        self.transcripts = dict(transcripts or {})
+
+    @classmethod
+    def from_dir(cls, path):
+        """Load recordings listed in <path>/transcripts.json as {file name: transcript}"""
+        with open(os.path.join(path, 'transcripts.json'), encoding='utf-8') as f:
+            listing = json.load(f)
+        transcripts = {}
+        for name, text in listing.items():
+            with open(os.path.join(path, name), 'rb') as f:
+                transcripts[hashlib.sha256(f.read()).hexdigest()] = text
+        return cls(transcripts)
+
+    def __call__(self, audio):
+        return self.transcripts.get(hashlib.sha256(audio).hexdigest())
+
+def _stub_synthesize(text, lang='en', **voice):
+    return f"[{lang}] {text}".encode('utf-8')
+
+if os.getenv("SUPPORT_BACKENDS", "live") == "stub":
+    fixtures = os.getenv("SUPPORT_STUB_FIXTURES")
+    recognize = FixtureRecognizer.from_dir(fixtures) if fixtures else FixtureRecognizer()
+    tts_cache = TTSCache(_stub_synthesize)
+else:
+    recognize = google_recognize
+    tts_cache = get_tts_cache()
+
+stt_pool = LLMPool(max_concurrency=int(os.getenv("STT_WORKERS", 4)), max_queue=int(os.getenv("STT_MAX_QUEUE", 64)),
+                   timeout=float(os.getenv("STT_TIMEOUT", 30)), name='speech recognizer')
+tts_pool = LLMPool(max_concurrency=int(os.getenv("TTS_WORKERS", 4)), max_queue=int(os.getenv("TTS_MAX_QUEUE", 256)),
+                   timeout=float(os.getenv("TTS_TIMEOUT", 30)), name='speech synthesizer')
+session_queues = SessionQueues(workers=int(os.getenv("SUPPORT_WORKERS", 64)),
+                               max_pending=int(os.getenv("SUPPORT_SESSION_QUEUE", 4)))
+TURN_TIMEOUT = float(os.getenv("SUPPORT_TURN_TIMEOUT", 120))
+
+# Results of asynchronous turns, kept for an hour after they finish
+turn_results = LRUCache(maxsize=10000, ttl=60 * 60)
+_running_turns = {}
+_running_lock = threading.Lock()
+
+def _clip(sentence):
+    # (audio url, Future) for a sentence, or (None, None) if it has nothing to say or the pool is full
+    spoken = speakable(sentence)
+    if not spoken:
+        return None, None
+    try:
+        future = tts_pool.submit(tts_cache.audio, spoken, **VOICE)
+    except PoolFull:
+        return None, None
+    return f"/audio/{tts_cache.key(spoken, **VOICE)}", future
+
+def run_turn(session_id, turn_id, text, audio, speak, emit):
+    """Recognize, answer and synthesize one turn, emitting events as they happen; returns the result"""
+    start = time.perf_counter()
+    seconds = {}
+    heard = text
+    if audio is not None:
+        heard = stt_pool.call(recognize, audio)
+        seconds['recognize'] = time.perf_counter() - start
+        emit({'event': 'heard', 'text': heard})
+
+    chat = chat_sessions.get(session_id)
+    if heard is None:
+        source, pieces = 'fallback', [FALLBACK_MESSAGE]
+    else:
+        reply, context = faq_reply(heard)
+        if reply is not None:
+            chat.add_turn(heard, reply)
+            source, pieces = 'faq', [reply]
+        else:
+            source, pieces = 'model', get_pool().iterate(chat.stream_message, heard, context)
+
+    # Sentences are synthesized in the TTS pool as soon as they are complete and
+    # sent out in order once their audio is ready
+    splitter = SentenceSplitter()
+    pending = deque()
+    sentences = []
+    reply = ''
+
+    def send(wait):
+        while pending and (wait or pending[0][2] is None or pending[0][2].done()):
+            sentence, audio_url, future = pending.popleft()
+            if future is not None:
+                try:
+                    future.result(timeout=tts_pool.timeout)
+                except Exception:
+                    audio_url = None
+            if 'first_sentence' not in seconds:
+                seconds['first_sentence'] = time.perf_counter() - start
+            sentences.append({'text': sentence, 'audio_url': audio_url})
+            emit({'event': 'sentence', **sentences[-1]})
+
+    def add(sentence):
+        audio_url, future = _clip(sentence) if speak else (None, None)
+        pending.append((sentence, audio_url, future))
+        send(wait=False)
+
+    for piece in pieces:
+        reply += piece
+        for sentence in splitter.feed(piece):
+            add(sentence)
+    for sentence in splitter.flush():
+        add(sentence)
+    send(wait=True)
+    seconds['total'] = time.perf_counter() - start
+    result = {'turn_id': turn_id, 'session_id': session_id, 'heard': heard, 'reply': reply,
+              'source': source, 'sentences': sentences, 'seconds': seconds}
+    emit({'event': 'done', **result})
+    return result
+
+def _error_response(e):
+    if isinstance(e, SessionBusy):
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '2'}
+    if isinstance(e, PoolFull):
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    if isinstance(e, LLMTimeout):
+        return jsonify({'error': str(e)}), 504
+    if isinstance(e, AllBackendsFailed):
+        return jsonify({'error': str(e)}), 502
+    return jsonify({'error': str(e)}), 500
+
+@app.route('/')
+def index():
+    return "timelith support server is running"
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    session_id = uuid.uuid4().hex
+    chat_sessions.get(session_id)
+    audio_url, future = _clip(INITIAL_MESSAGE)
+    if future is not None:
+        try:
+            future.result(timeout=tts_pool.timeout)
+        except Exception:
+            audio_url = None
+    return jsonify({
+        'session_id': session_id,
+        'greeting': {'text': INITIAL_MESSAGE, 'audio_url': audio_url},
+        'messages_url': url_for('post_message', session_id=session_id),
+    }), 201
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    if session_id not in chat_sessions:
+        return jsonify({'error': 'Unknown session'}), 404
+    chat_sessions.reset(session_id)
+    return '', 204
+
+@app.route('/sessions/<session_id>/messages', methods=['POST'])
+def post_message(session_id):
+    if session_id not in chat_sessions:
+        return jsonify({'error': 'Unknown session'}), 404
+
+    text, audio, speak = None, None, request.args.get('speak', '1') != '0'
+    if 'audio' in request.files:
+        audio = request.files['audio'].read()
+    elif request.mimetype.startswith('audio/'):
+        audio = request.get_data()
+    else:
+        data = request.get_json(silent=True) or request.form.to_dict()
+        text = (data.get('text') or '').strip()
+        speak = speak and data.get('speak', True) not in (False, 'false', '0')
+    if not text and not audio:
+        return jsonify({'error': 'No text or audio provided'}), 400
+
+    turn_id = uuid.uuid4().hex
+    events = queue.Queue() if request.args.get('stream') == '1' else None
+    emit = events.put if events is not None else (lambda event: None)
+    try:
+        future = session_queues.submit(session_id, run_turn, session_id, turn_id, text, audio, speak, emit)
+    except SessionBusy as e:
+        return _error_response(e)
+
+    if events is not None:
+        future.add_done_callback(lambda f: events.put(None))
+
+        def lines():
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                yield json.dumps(event) + '\n'
+            if future.exception() is not None:
+                yield json.dumps({'event': 'error', 'error': str(future.exception())}) + '\n'
+
+        return Response(lines(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+    if 'respond-async' in request.headers.get('Prefer', ''):
+        with _running_lock:
+            _running_turns[turn_id] = future
+
+        def finished(f):
+            error = f.exception()
+            turn_results.set(turn_id, {'status': 'failed', 'error': str(error)} if error
+                             else {'status': 'done', **f.result()})
+            with _running_lock:
+                _running_turns.pop(turn_id, None)
+
+        future.add_done_callback(finished)
+        return jsonify({'turn_id': turn_id, 'status': 'queued',
+                        'status_url': url_for('get_turn', session_id=session_id, turn_id=turn_id)}), 202
+
+    try:
+        return jsonify(future.result(timeout=TURN_TIMEOUT))
+    except FutureTimeout:
+        return jsonify({'error': f"The turn did not finish within {TURN_TIMEOUT:g} seconds"}), 504
+    except Exception as e:
+        return _error_response(e)
+
+@app.route('/sessions/<session_id>/turns/<turn_id>')
+def get_turn(session_id, turn_id):
+    result = turn_results.get(turn_id)
+    if result is not None and result.get('session_id', session_id) == session_id:
+        return jsonify(result)
+    with _running_lock:
+        running = turn_id in _running_turns
+    if running:
+        return jsonify({'turn_id': turn_id, 'status': 'running'}), 202
+    return jsonify({'error': 'Unknown turn'}), 404
+
+@app.route('/audio/<key>')
+def get_audio(key):
+    audio = tts_cache.load(key)
+    if audio is None:
+        return jsonify({'error': 'Unknown or expired clip'}), 404
+    return Response(audio, mimetype='audio/mpeg', headers={'Cache-Control': 'public, max-age=86400'})
+
+@app.route('/support-stats')
+def support_stats():
+    return jsonify({
+        'sessions': chat_sessions.stats(),
+        'session_queues': session_queues.stats(),
+        'stt_pool': stt_pool.stats(),
+        'tts_pool': tts_pool.stats(),
+        'model_pool': get_pool().stats(),
+        'tts_cache': tts_cache.stats(),
+        'faq': get_faq_index().stats(),
+        'router': get_router().stats(),
+    })
+
+if __name__ == '__main__':
+    run_app(app)
@@ -0,0 +1,76 @@
+# Routing, hedging and failover against local fake providers (fake_provider.py).
+#
+#   python -m pytest -q test_llm_router.py
+import time
+
+import pytest
+
+from fake_provider import start_fake_provider
+from llm_router import AllBackendsFailed, LLMRouter, OpenAICompatibleProvider
+
+MESSAGES = [{'role': 'user', 'content': 'When is the next free slot?'}]
+
+@pytest.fixture
+def fake():
+    """Start fake providers with the given behaviour; returns (provider, behaviour)"""
+    servers = []
+
+    def start(name, **behaviour):
+        server, url, behaviour = start_fake_provider(reply=f"from {name}", **behaviour)
+        servers.append(server)
+        return OpenAICompatibleProvider(name, url), behaviour
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_fails_over_to_the_next_backend(fake):
+    broken, _ = fake('broken', error_rate=1.0)
+    healthy, _ = fake('healthy')
+    router = LLMRouter([broken, healthy], hedge_after=None)
+
+    assert router.generate(MESSAGES) == "from healthy"
+    stats = router.stats()
+    assert stats['backends'][broken.name]['errors'] == 1
+    assert stats['backends'][healthy.name]['calls'] == 1
+
+def test_streams_from_the_next_backend_when_the_first_fails(fake):
+    broken, _ = fake('broken', error_rate=1.0)
+    healthy, _ = fake('healthy')
+    router = LLMRouter([broken, healthy], hedge_after=None)
+
+    assert ''.join(router.stream(MESSAGES)) == "from healthy"
+
+def test_hedges_a_slow_backend(fake):
+    slow, _ = fake('slow', latency=2.0)
+    fast, _ = fake('fast')
+    router = LLMRouter([slow, fast], hedge_after=0.2)
+
+    start = time.perf_counter()
+    assert router.generate(MESSAGES) == "from fast"
+    assert time.perf_counter() - start < 1.5
+    assert router.hedges == 1
+    assert router.stats()['backends'][fast.name]['hedges_won'] == 1
+
+def test_benches_a_failing_backend_and_ranks_it_last(fake):
+    flaky, behaviour = fake('flaky', error_rate=1.0)
+    healthy, _ = fake('healthy')
+    router = LLMRouter([flaky, healthy], hedge_after=None, max_consecutive_failures=2, cooldown=60)
+
+    for _ in range(2):
+        router.generate(MESSAGES)
+    assert router.ranked() == [healthy, flaky]
+
+    # Benched: the next call goes straight to the healthy backend
+    requests = behaviour.requests
+    assert router.generate(MESSAGES) == "from healthy"
+    assert behaviour.requests == requests
+
+def test_raises_when_every_backend_fails(fake):
+    first, _ = fake('first', error_rate=1.0)
+    second, _ = fake('second', error_rate=1.0)
+    router = LLMRouter([first, second], hedge_after=None)
+
+    with pytest.raises(AllBackendsFailed):
+        router.generate(MESSAGES)
@@ -0,0 +1,63 @@
+# Rule checks that decide a schedule without the model (schedule_parser.py).
+#
+#   python -m pytest -q test_schedule_parser.py
+from schedule_parser import canonical_column, check_schedule
+
+def test_maps_qualified_headers():
+    assert canonical_column("Teacher Name") == 'teacher'
+    assert canonical_column("Room No") == 'room'
+    assert canonical_column("Class Teacher") == 'teacher'
+    assert canonical_column("Notes") is None
+
+def test_finds_clashes_under_qualified_headers():
+    checked = check_schedule(
+        "Day,Time,Subject,Teacher Name,Room No\n"
+        "Monday,9:00-10:00,Math,Smith,101\n"
+        "Monday,9:00-10:00,Physics,Smith,101\n"
+    )
+    assert checked.decided
+    assert checked.status == 'Unacceptable'
+    assert {issue.kind for issue in checked.critical} >= {'teacher_clash', 'room_clash'}
+
+def test_overlaps_without_a_group_column_are_clashes():
+    checked = check_schedule(
+        "Day,Time,Subject\n"
+        "Monday,9:00-10:00,Math\n"
+        "Monday,9:00-10:00,Physics\n"
+    )
+    assert checked.status == 'Unacceptable'
+    assert [issue.kind for issue in checked.critical] == ['overlap']
+
+def test_overlapping_grid_rows_are_clashes():
+    checked = check_schedule(
+        "Time|Monday|Tuesday\n"
+        "9:00-10:00|Math|History\n"
+        "9:30-10:30|Physics|\n"
+    )
+    assert checked.status == 'Unacceptable'
+    assert [issue.kind for issue in checked.critical] == ['overlap']
+
+def test_unrecognized_columns_go_to_the_model():
+    checked = check_schedule(
+        "Day,Time,Subject,Notes\n"
+        "Monday,9:00-10:00,Math,bring calculators\n"
+        "Tuesday,9:00-10:00,Physics,\n"
+        "Wednesday,9:00-10:00,Chemistry,\n"
+        "Thursday,9:00-10:00,Biology,\n"
+        "Friday,9:00-10:00,English,\n"
+    )
+    assert not checked.issues
+    assert checked.unmapped == ['Notes']
+    assert not checked.decided
+
+def test_clean_schedule_is_decided_acceptable():
+    checked = check_schedule(
+        "Day,Time,Subject,Teacher,Room\n"
+        "Monday,9:00-10:00,Math,Smith,101\n"
+        "Tuesday,9:00-10:00,Physics,Jones,102\n"
+        "Wednesday,9:00-10:00,Chemistry,Smith,101\n"
+        "Thursday,9:00-10:00,Biology,Jones,102\n"
+        "Friday,9:00-10:00,English,Smith,101\n"
+    )
+    assert checked.decided
+    assert checked.status == 'Acceptable'
@@ -0,0 +1,201 @@
+# Content-addressed cache of synthesized speech for the voice support bot.
+#
+# Clips are keyed by a hash of the normalized text, the language and the
+# voice settings, so the greeting, the "couldn't understand" fallback and
+# the sign-off that ends every answer are synthesized once and then played
+# from TTS_CACHE_DIR with no network round trip. The directory is trimmed
+# back to TTS_CACHE_MAX_MB, least recently used first; the most recently
+# played clips are also held in memory (TTS_MEMORY_MAX_MB) to skip the read.
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from cache import content_key, normalize_text
+
+def gtts_synthesize(text, lang='en', **voice):
+    """MP3 bytes for the text from Google Text-to-Speech"""
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, **voice).write_to_fp(buffer)
+    return buffer.getvalue()
+
+class TTSCache:
+    """Synthesize speech once per (text, language, voice), then serve it from memory or disk.
+
+    `synthesize(text, lang, **voice)` returns the audio bytes for a miss.
+    """
+
+    def __init__(self, synthesize=gtts_synthesize, cache_dir=None, max_bytes=100 * 1024 * 1024,
+                 memory_max_bytes=16 * 1024 * 1024, suffix='.mp3'):
+        self.synthesize = synthesize
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.suffix = suffix
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'lookups': 0, 'memory_hits': 0, 'disk_hits': 0, 'syntheses': 0,
+                          'synthesis_seconds': 0.0, 'bytes_saved': 0}
+
+    def key(self, text, lang='en', **voice):
+        return content_key(normalize_text(text), lang, sorted(voice.items()))
+
+    def _file(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def _remember(self, key, audio):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = audio
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self.memory_max_bytes and len(self._memory) > 1:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_bytes -= len(dropped)
+
+    def _count(self, hit, size):
+        with self._lock:
+            self._counters['lookups'] += 1
+            self._counters[hit] += 1
+            self._counters['bytes_saved'] += size
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._file(key)
+        try:
+            with open(path, 'rb') as f:
+                audio = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return audio
+
+    def _write_disk(self, key, audio):
+        # The directory is created with the first clip, not when the cache is set up
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._file(key)
+        # Write then rename, so a clip being played is never half written
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        self._trim(keep=path)
+        return path
+
+    def _trim(self, keep):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.suffix) and entry.path != keep:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries) + os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def audio(self, text, lang='en', **voice):
+        """Audio bytes for the text, synthesized only if never seen before"""
+        key = self.key(text, lang, **voice)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+        if audio is not None:
+            self._count('memory_hits', len(audio))
+            return audio
+
+        audio = self._read_disk(key)
+        if audio is not None:
+            self._count('disk_hits', len(audio))
+        else:
+            start = time.perf_counter()
+            audio = self.synthesize(text, lang, **voice)
+            with self._lock:
+                self._counters['lookups'] += 1
+                self._counters['syntheses'] += 1
+                self._counters['synthesis_seconds'] += time.perf_counter() - start
+            if self.cache_dir:
+                self._write_disk(key, audio)
+        self._remember(key, audio)
+        return audio
+
+    def load(self, key):
+        """Audio bytes for a key returned by key(), if still cached, else None"""
+        with self._lock:
+            audio = self._memory.get(key)
+        if audio is None and len(key) == 64 and all(c in '0123456789abcdef' for c in key):
+            audio = self._read_disk(key)
+        return audio
+
+    def path(self, text, lang='en', **voice):
+        """Path of a cached file holding the audio, for players that only take files"""
+        if not self.cache_dir:
+            raise ValueError("TTSCache.path needs a cache_dir")
+        key = self.key(text, lang, **voice)
+        path = self._file(key)
+        if os.path.exists(path):
+            os.utime(path)
+            size = os.path.getsize(path)
+            self._count('disk_hits', size)
+            return path
+        audio = self.audio(text, lang, **voice)
+        if not os.path.exists(path):
+            # Trimmed from disk but still in memory
+            self._write_disk(key, audio)
+        return path
+
+    def warm(self, phrases, lang='en', **voice):
+        """Synthesize fixed phrases in the background so their first use is a hit"""
+        def run():
+            for phrase in phrases:
+                try:
+                    self.audio(phrase, lang, **voice)
+                except Exception as e:
+                    print(f"Could not pre-synthesize {phrase[:40]!r}: {e}")
+        thread = threading.Thread(target=run, name='tts-warm', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """Hit rates, bytes served without synthesizing and the synthesis time that saved"""
+        with self._lock:
+            counters = dict(self._counters)
+            memory_items, memory_bytes = len(self._memory), self._memory_bytes
+        hits = counters['memory_hits'] + counters['disk_hits']
+        syntheses = counters['syntheses']
+        average = counters['synthesis_seconds'] / syntheses if syntheses else 0.0
+        return {
+            **counters,
+            'hit_rate': hits / counters['lookups'] if counters['lookups'] else 0.0,
+            'memory_hit_rate': counters['memory_hits'] / counters['lookups'] if counters['lookups'] else 0.0,
+            'average_synthesis_seconds': average,
+            'estimated_seconds_saved': average * hits,
+            'memory_items': memory_items,
+            'memory_bytes': memory_bytes,
+            'cache_dir': self.cache_dir,
+        }
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_tts_cache():
+    """The process-wide speech cache, configured from the TTS_* environment variables"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = TTSCache(
+                cache_dir=os.getenv("TTS_CACHE_DIR", "tts_cache") or None,
+                max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", 100)) * 1024 * 1024),
+                memory_max_bytes=int(float(os.getenv("TTS_MEMORY_MAX_MB", 16)) * 1024 * 1024),
+            )
+        return _shared_cache